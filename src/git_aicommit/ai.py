@@ -1,35 +1,146 @@
-from typing import Optional
+import os
+from collections.abc import Awaitable, Callable, Sequence
+from typing import Any, Literal, Optional
 from xml.sax.saxutils import escape as xml_escape
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import (
+    HumanMessage,
+    MessageLikeRepresentation,
+    SystemMessage,
+)
 from langchain_core.language_models import BaseChatModel
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from pydantic import BaseModel, Field
+from git_aicommit import tasks
+from git_aicommit.ratelimit import call_with_retry
 
 
 class Commit(BaseModel):
     message: str = Field(..., description="The commit message generated by the AI.")
 
 
+class Summary(BaseModel):
+    summary: str = Field(
+        ..., description="A concise summary of the changes in the diff."
+    )
+
+
+# Appended to the system prompt when streaming, which asks for the message
+# as plain text instead of structured output
+PLAIN_TEXT_OUTPUT = "\n<output-format>Reply with the commit message only, without code fences or any other text.</output-format>"
+
+# How the end of the stable prompt prefix is marked for provider-side caching:
+# `cache-control` for Anthropic, `cache-point` for Bedrock Converse. Providers
+# with automatic prefix caching need no marker.
+PromptCache = Literal["cache-control", "cache-point"]
+
+
 class AI:
-    def __init__(self, model: BaseChatModel):
+    def __init__(
+        self,
+        model: BaseChatModel,
+        prompt_cache: Optional[PromptCache] = None,
+        max_retries: int = 0,
+    ):
         self.model = model
+        self.prompt_cache = prompt_cache
+        # Retries of rate-limited requests
+        self.max_retries = max_retries
 
     def generate_commit_message(
         self,
         recent_logs: list[str],
         diff: str,
-        history: list[BaseMessage],
+        history: Sequence[MessageLikeRepresentation],
+        user_instructions: Optional[str] = None,
+        language: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        changes = f"<diff>{xml_escape(diff)}</diff>"
+        if context:
+            changes += f"\n<context>{xml_escape(context)}</context>"
+        return self._generate(
+            recent_logs=recent_logs,
+            changes=changes,
+            history=history,
+            user_instructions=user_instructions,
+            language=language,
+            on_token=on_token,
+        )
+
+    def generate_commit_message_from_summaries(
+        self,
+        recent_logs: list[str],
+        summaries: list[str],
+        history: Sequence[MessageLikeRepresentation],
+        user_instructions: Optional[str] = None,
+        language: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        return self._generate(
+            recent_logs=recent_logs,
+            changes="<change-summaries>"
+            + "\n".join(
+                f"<summary>{xml_escape(summary)}</summary>" for summary in summaries
+            )
+            + "</change-summaries>",
+            history=history,
+            user_instructions=user_instructions,
+            language=language,
+            on_token=on_token,
+        )
+
+    def summarize_diffs(self, diffs: list[str], max_concurrency: int) -> list[str]:
+        """
+        Summarize each diff independently, running up to `max_concurrency`
+        requests at once. Summaries are returned in the order of `diffs`.
+        """
+        prompt_template = ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    "<persona>You are a seasoned software engineer reviewing one part of a larger change.</persona>\n"
+                    "<objectives>\n"
+                    "  <objective>Summarize what changed in the provided diff and why, in a few short sentences.</objective>\n"
+                    "  <objective>Mention the affected files or components.</objective>\n"
+                    "</objectives>",
+                ),
+                ("human", "<diff>{diff}</diff>"),
+            ]
+        )
+        chain = prompt_template | self.model.with_structured_output(Summary)
+
+        # Retry each diff on its own so one rate-limited request does not
+        # repeat the whole batch
+        def summarize(input: dict[str, Any]) -> Summary:
+            return self._with_retry(lambda: chain.ainvoke(input))
+
+        summaries: list[Summary] = RunnableLambda(summarize).batch(
+            [{"diff": xml_escape(diff)} for diff in diffs],
+            config={"max_concurrency": max_concurrency},
+        )  # type: ignore
+        return [summary.summary for summary in summaries]
+
+    def _generate(
+        self,
+        recent_logs: list[str],
+        changes: str,
+        history: Sequence[MessageLikeRepresentation],
         user_instructions: Optional[str] = None,
         language: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None,
     ) -> str:
         system_prompt = (
             "<persona>You are a seasoned software engineer and Git expert who writes precise commit messages.</persona>\n"
             "<objectives>\n"
             "  <objective>Study the provided diff to understand what changed and why.</objective>\n"
+            "  <objective>Use the unchanged code in the context, if provided, only to understand the diff.</objective>\n"
             "  <objective>Return a single well-crafted commit message.</objective>\n"
             "</objectives>\n"
             "<guidelines>\n"
             "  <guideline>Mirror the style conventions observed in the recent logs. (e.g. tense, tags, emoji, prefixes)</guideline>\n"
+            "  <guideline>When given feedback, revise your latest message to satisfy every feedback item; later items take precedence over earlier ones.</guideline>\n"
             "  <guideline>Add one or two short follow-up lines when necessary to clarify scope or motivation; use bullet points for multiple discrete changes, or paragraph style for single coherent explanations. Each line should stay under 72 characters.</guideline>\n"
             "</guidelines>"
         )
@@ -42,22 +153,83 @@ class AI:
         if user_instructions:
             system_prompt += f"\n<user-instructions>{xml_escape(user_instructions)}</user-instructions>"
 
-        prompt_template = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_prompt),
-                ("human", "<recent-logs>{logs}</recent-logs><diff>{diff}</diff>"),
-                MessagesPlaceholder("history"),
-            ]
+        # The system prompt, logs and changes stay identical across regenerate
+        # rounds; only the history after them grows, so providers can serve
+        # the whole prefix from their prompt cache.
+        logs = "\n".join(f"<log>{xml_escape(log)}</log>" for log in recent_logs)
+        inputs = [
+            SystemMessage(system_prompt),
+            HumanMessage(
+                self._cacheable_content(f"<recent-logs>{logs}</recent-logs>", changes)
+            ),
+            *history,
+        ]
+
+        if on_token is None:
+            chain = self.model.with_structured_output(Commit)
+            result: Commit = self._with_retry(lambda: chain.ainvoke(inputs))
+            return result.message
+
+        # Structured output arrives as a single chunk with several
+        # integrations (e.g. OpenAI's default json_schema method), so the
+        # message is streamed as plain text instead
+        inputs[0] = SystemMessage(system_prompt + PLAIN_TEXT_OUTPUT)
+        return self._with_retry(lambda: self._stream(inputs, on_token))
+
+    async def _stream(self, inputs: list[Any], on_token: Callable[[str], None]) -> str:
+        # Models that cannot stream yield their whole reply as one chunk
+        text = ""
+        message = ""
+        async for chunk in self.model.astream(inputs):
+            text += chunk.text
+            partial = _plain_message(text)
+            if partial and partial != message:
+                message = partial
+                on_token(message)
+        if not message:
+            raise ValueError("The model returned an empty commit message.")
+        return message
+
+    def _with_retry(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run the request on the shared event loop, where cancelling the
+        surrounding `tasks.CancelScope` or Ctrl-C closes its connection.
+        """
+        return tasks.run(
+            lambda: call_with_retry(
+                call,
+                max_retries=self.max_retries,
+                rate_limiter=getattr(self.model, "rate_limiter", None),
+            )
         )
-        chain = prompt_template | self.model.with_structured_output(Commit)
 
-        commit: Commit = chain.invoke(
-            {
-                "logs": "\n".join(
-                    f"<log>{xml_escape(log)}</log>" for log in recent_logs
-                ),
-                "diff": xml_escape(diff),
-                "history": history,
-            }
-        )  # type: ignore
-        return commit.message
+    def _cacheable_content(self, *segments: str) -> Any:
+        """Join prompt segments, marking the end as a cache breakpoint."""
+        if self.prompt_cache is None:
+            return "".join(segments)
+
+        blocks: list[dict[str, Any]] = [
+            {"type": "text", "text": segment} for segment in segments
+        ]
+        if self.prompt_cache == "cache-control":
+            blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        else:
+            blocks.append({"cachePoint": {"type": "default"}})
+        return blocks
+
+
+def _plain_message(text: str) -> str:
+    """The commit message in a plain-text reply, without a surrounding code fence."""
+    text = text.strip()
+    if text.startswith("```"):
+        # Drop the opening fence with its language tag, and the closing one
+        text = text.partition("\n")[2].rstrip().removesuffix("```")
+    return text.strip()
+
+
+def tracing_context() -> Any:
+    """LangSmith tracing to the project in `GIT_AICOMMIT_LANGSMITH_PROJECT`, if set."""
+    from langsmith import tracing_context
+
+    project = os.getenv("GIT_AICOMMIT_LANGSMITH_PROJECT")
+    return tracing_context(enabled=project is not None, project_name=project)
@@ -0,0 +1,209 @@
+import os
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from time import time
+from typing import Any, Optional
+from git_aicommit.ai import AI
+from git_aicommit.cache import MessageCache
+from git_aicommit.config import Config
+from git_aicommit.git import Git
+from git_aicommit.pipeline import (
+    PreparedChanges,
+    collect_changes,
+    generate_message,
+    message_cache_key,
+    prepare_changes,
+)
+from git_aicommit.provider import FallbackProvider, Provider
+
+
+# Number of repositories whose git data is collected at the same time
+COLLECT_CONCURRENCY = 8
+
+
+@dataclass
+class RepositoryChanges:
+    path: Path
+    git: Git
+    prepared: PreparedChanges
+    recent_logs: list[str]
+    cache: Optional[MessageCache]
+    cache_key: str
+    # Most recent cached message for the staged tree, if any
+    cached_message: Optional[str]
+
+
+def discover_repositories(root: Path) -> list[Path]:
+    """Find every git repository (including nested ones) below `root`."""
+    repositories: list[Path] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if ".git" in dirnames or ".git" in filenames:
+            repositories.append(Path(dirpath))
+        # Never descend into git metadata
+        dirnames[:] = sorted(name for name in dirnames if name != ".git")
+    return repositories
+
+
+def run_batch(
+    paths: list[Path],
+    provider: Provider,
+    config: Config,
+    exclude_files: list[str],
+    user_instructions: Optional[str] = None,
+    language: Optional[str] = None,
+    use_cache: bool = True,
+    commit: bool = False,
+) -> Iterator[dict[str, Any]]:
+    """
+    Generate commit messages for the staged changes of many repositories.
+
+    Git data is collected concurrently, and generation runs on a worker pool
+    bounded by the provider's concurrency. Every repository shares the same
+    provider client. Results are yielded as soon as each repository finishes,
+    while others are still being collected.
+    """
+    # The same repository given twice, e.g. as `.` and by its absolute path,
+    # would otherwise be committed twice
+    unique: dict[Path, Path] = {}
+    for path in paths:
+        unique.setdefault(path.resolve(), path)
+    paths = list(unique.values())
+
+    ai = AI(
+        model=provider.chat_model,
+        prompt_cache=provider.prompt_cache,
+        max_retries=provider.max_retries,
+    )
+
+    def collect(path: Path) -> Optional[RepositoryChanges]:
+        git = Git(str(path))
+        staged = collect_changes(git, config, exclude_files, config.map_reduce)
+        if not staged.staged_files:
+            return None
+        cache = MessageCache(git.git_dir / "aicommit" / "cache") if use_cache else None
+        key = message_cache_key(
+            config,
+            tree=staged.tree,
+            exclude_files=exclude_files,
+            recent_logs=staged.logs,
+            user_instructions=user_instructions,
+            language=language,
+            map_reduce=config.map_reduce,
+        )
+        return RepositoryChanges(
+            path=path,
+            git=git,
+            prepared=prepare_changes(
+                git,
+                staged.diff_files,
+                staged.attributes,
+                config,
+                provider=provider.name,
+                map_reduce=config.map_reduce,
+            ),
+            recent_logs=staged.logs,
+            cache=cache,
+            cache_key=key,
+            cached_message=next(iter(cache.get(key)), None) if cache else None,
+        )
+
+    def generate(changes: RepositoryChanges) -> dict[str, Any]:
+        from langchain_core.callbacks import get_usage_metadata_callback
+        from git_aicommit.fallback import recording_decisions
+
+        start_time = time()
+        with (
+            get_usage_metadata_callback() as usage_callback,
+            recording_decisions() as decisions,
+        ):
+            message = generate_message(
+                ai,
+                changes.prepared,
+                changes.recent_logs,
+                user_instructions=user_instructions,
+                language=language,
+                # Every repository already runs on the bounded pool
+                max_concurrency=1,
+            )
+        latency = time() - start_time
+        decision = (
+            decisions[-1]
+            if decisions and isinstance(provider, FallbackProvider)
+            else None
+        )
+        if changes.cache is not None:
+            changes.cache.add(changes.cache_key, message)
+
+        if commit:
+            changes.git.commit(message)
+
+        usage = usage_callback.usage_metadata.values()
+        return {
+            "repo": str(changes.path),
+            "message": message,
+            "latency": round(latency, 3),
+            "usage": {
+                "input_tokens": sum(u.get("input_tokens", 0) for u in usage),
+                "output_tokens": sum(u.get("output_tokens", 0) for u in usage),
+                "cache_read_tokens": sum(
+                    u.get("input_token_details", {}).get("cache_read", 0) for u in usage
+                ),
+            },
+            "committed": commit,
+            "cached": False,
+            **(
+                {"backend": decision.backend, "fallback": decision.notes}
+                if decision is not None
+                else {}
+            ),
+        }
+
+    def cached_result(changes: RepositoryChanges, message: str) -> dict[str, Any]:
+        if commit:
+            changes.git.commit(message)
+        return {
+            "repo": str(changes.path),
+            "message": message,
+            "latency": 0.0,
+            "usage": {"input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0},
+            "committed": commit,
+            "cached": True,
+        }
+
+    with (
+        ThreadPoolExecutor(max_workers=COLLECT_CONCURRENCY) as collect_pool,
+        ThreadPoolExecutor(max_workers=provider.concurrency) as generate_pool,
+    ):
+        collect_futures = {collect_pool.submit(collect, path): path for path in paths}
+        generate_futures: dict[Future[dict[str, Any]], Path] = {}
+
+        while collect_futures or generate_futures:
+            pending: list[Future[Any]] = [*collect_futures, *generate_futures]
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for generated in generate_futures.keys() & done:
+                path = generate_futures.pop(generated)
+                try:
+                    yield generated.result()
+                except Exception as e:
+                    yield {"repo": str(path), "error": str(e)}
+
+            for collected in collect_futures.keys() & done:
+                path = collect_futures.pop(collected)
+                try:
+                    changes = collected.result()
+                except Exception as e:
+                    yield {"repo": str(path), "error": str(e)}
+                    continue
+                if changes is None:
+                    yield {"repo": str(path), "skipped": "No staged changes found."}
+                    continue
+                if changes.cached_message is not None:
+                    try:
+                        result = cached_result(changes, changes.cached_message)
+                    except Exception as e:
+                        result = {"repo": str(path), "error": str(e)}
+                    yield result
+                    continue
+                generate_futures[generate_pool.submit(generate, changes)] = path
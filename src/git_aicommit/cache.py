@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from time import time
+
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+def cache_key(**parts: object) -> str:
+    """Build a stable key from everything that influences the generated message."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    entries: int
+    size_bytes: int
+    oldest: float | None
+    newest: float | None
+
+
+class MessageCache:
+    """
+    On-disk cache of generated commit messages.
+
+    Every message is stored in its own file named `<key>.<uuid>.json` and
+    written via an atomic rename, so concurrent processes never observe
+    partially written entries and never overwrite each other's results.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+
+    def get(self, key: str) -> list[str]:
+        """Return cached messages for `key`, most recent first."""
+        if not self.directory.is_dir():
+            return []
+
+        now = time()
+        entries: list[tuple[float, str]] = []
+        for path in self.directory.glob(f"{key}.*.json"):
+            try:
+                mtime = path.stat().st_mtime
+                if now - mtime > self.max_age_seconds:
+                    continue
+                message = json.loads(path.read_text())["message"]
+            except (OSError, ValueError, KeyError, TypeError):
+                # Evicted by another process, unreadable or malformed; treat
+                # as a miss
+                continue
+            if isinstance(message, str):
+                entries.append((mtime, message))
+
+        return [message for _, message in sorted(entries, reverse=True)]
+
+    def add(self, key: str, message: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"message": message, "created_at": time()}, f)
+            os.replace(tmp_path, self.directory / f"{key}.{uuid.uuid4().hex}.json")
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove expired entries, then the oldest ones beyond `max_entries`."""
+        now = time()
+        entries: list[tuple[float, Path]] = []
+        for path in self._entries():
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            if now - mtime > self.max_age_seconds:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((mtime, path))
+
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries :]:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> CacheStats:
+        sizes: list[int] = []
+        mtimes: list[float] = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            sizes.append(stat.st_size)
+            mtimes.append(stat.st_mtime)
+
+        return CacheStats(
+            entries=len(sizes),
+            size_bytes=sum(sizes),
+            oldest=min(mtimes, default=None),
+            newest=max(mtimes, default=None),
+        )
+
+    def clear(self) -> int:
+        count = 0
+        for path in self._entries():
+            path.unlink(missing_ok=True)
+            count += 1
+        return count
+
+    def _entries(self) -> list[Path]:
+        if not self.directory.is_dir():
+            return []
+        return list(self.directory.glob("*.json"))
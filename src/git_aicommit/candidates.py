@@ -0,0 +1,82 @@
+import contextvars
+import queue
+import threading
+from collections.abc import Callable
+from time import time
+from git_aicommit.tasks import CancelScope
+
+
+class Candidates:
+    """
+    Generate commit message candidates in the background.
+
+    Generations run on daemon threads, at most `concurrency` at a time, so
+    abandoned ones never block the process from exiting. Their requests
+    belong to a `CancelScope`: cancelling the pool closes the connections of
+    those in flight, and the generations fail instead of finishing unseen.
+    """
+
+    def __init__(self, generate: Callable[[int], str], concurrency: int):
+        self._generate = generate
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._results: queue.Queue[tuple[str | None, BaseException | None, float]] = (
+            queue.Queue()
+        )
+        self._scope = CancelScope()
+        self._started_at = time()
+        self._submitted = 0
+        self._pending = 0
+        self.messages: list[str] = []
+        self.elapsed_seconds: list[float] = []
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, count: int = 1) -> None:
+        for _ in range(count):
+            variant = self._submitted
+            self._submitted += 1
+            self._pending += 1
+            # Copy the context so tracing settings reach the worker thread
+            context = contextvars.copy_context()
+            threading.Thread(
+                target=context.run, args=(self._run, variant), daemon=True
+            ).start()
+
+    def wait_next(self) -> str:
+        """
+        Block until the next candidate is ready and return it.
+
+        Failed generations are skipped as long as other candidates are still
+        pending; the last error is raised once nothing is left to wait for.
+        """
+        error: BaseException | None = None
+        while self._pending > 0:
+            message, error, finished_at = self._results.get()
+            self._pending -= 1
+            if message is not None:
+                self.messages.append(message)
+                self.elapsed_seconds.append(finished_at - self._started_at)
+                return message
+        if error is None:
+            raise RuntimeError("No pending candidates.")
+        raise error
+
+    def cancel(self) -> None:
+        """Cancel all in-flight generations."""
+        self._scope.cancel()
+        self._pending = 0
+
+    def _run(self, variant: int) -> None:
+        with self._semaphore, self._scope.active():
+            if self._scope.cancelled:
+                return
+            try:
+                message = self._generate(variant)
+            except Exception as e:
+                if not self._scope.cancelled:
+                    self._results.put((None, e, time()))
+                return
+        if not self._scope.cancelled:
+            self._results.put((message, None, time()))
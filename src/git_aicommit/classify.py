@@ -0,0 +1,90 @@
+from dataclasses import replace
+from pathlib import PurePosixPath
+from git_aicommit.config import GeneratedFilesConfig
+from git_aicommit.diff import FileDiff
+
+
+# gitattributes that mark files as generated, vendored or not diffable
+GENERATED_ATTRIBUTES = ["linguist-generated", "linguist-vendored", "diff"]
+
+# Files that are almost always produced by tools rather than written by hand
+DEFAULT_GENERATED_PATTERNS = [
+    "*.min.js",
+    "*.min.css",
+    "*.js.map",
+    "*.css.map",
+    "*_pb2.py",
+    "*_pb2.pyi",
+    "*_pb2_grpc.py",
+    "*.pb.go",
+    "*.pb.cc",
+    "*.pb.h",
+    "*.snap",
+    "**/__snapshots__/**",
+    "**/vendor/**",
+    "**/node_modules/**",
+]
+
+
+def matches(path: str, pattern: str) -> bool:
+    """Match like .gitignore: patterns without a slash match the file name."""
+    pure_path = PurePosixPath(path)
+    if "/" not in pattern:
+        return pure_path.match(pattern)
+    return pure_path.full_match(pattern) or pure_path.full_match(
+        pattern.removeprefix("**/")
+    )
+
+
+def _is_true(value: str | None) -> bool:
+    return value in ("set", "true")
+
+
+def is_generated(
+    file: FileDiff, attributes: dict[str, str], config: GeneratedFilesConfig
+) -> bool:
+    """
+    Tell whether a file should only be summarized.
+
+    Only cheap signals are used: gitattributes, path patterns, the numstat
+    line counts and the longest changed line seen while parsing.
+    """
+    if _is_true(attributes.get("linguist-generated")) or _is_true(
+        attributes.get("linguist-vendored")
+    ):
+        return True
+    # `-diff` (or `binary`) means git itself does not show a textual diff
+    if attributes.get("diff") == "unset":
+        return True
+    if attributes.get("linguist-generated") == "false":
+        return False
+    if any(
+        matches(file.path, pattern)
+        for pattern in [*DEFAULT_GENERATED_PATTERNS, *config.summarize]
+    ):
+        return True
+    if file.additions + file.deletions > config.max_lines:
+        return True
+    # Minified or machine-written data tends to have very long lines
+    return file.longest_line > config.max_line_length
+
+
+def classify_files(
+    files: list[FileDiff],
+    attributes: dict[str, dict[str, str]],
+    config: GeneratedFilesConfig,
+) -> list[FileDiff]:
+    """
+    Drop files matching `config.exclude` and mark generated files so that
+    they are reduced to a one-line summary.
+    """
+    classified: list[FileDiff] = []
+    for file in files:
+        if any(matches(file.path, pattern) for pattern in config.exclude):
+            continue
+        if not file.summary_only and is_generated(
+            file, attributes.get(file.path, {}), config
+        ):
+            file = replace(file, generated=True, header=[], hunks=[])
+        classified.append(file)
+    return classified
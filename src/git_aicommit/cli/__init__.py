@@ -0,0 +1,11 @@
+from git_aicommit.cli import batch, cache, daemon, hook, init, plan, stats
+from git_aicommit.cli.main import root
+
+root.add_command(init.init)
+root.add_command(batch.batch)
+root.add_command(plan.plan)
+root.add_command(stats.stats)
+root.add_command(daemon.daemon_group)
+root.add_command(cache.cache)
+root.add_command(hook.hook)
+root.add_command(hook.watch)
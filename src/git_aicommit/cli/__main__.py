@@ -0,0 +1,3 @@
+from git_aicommit.cli import root
+
+root()
@@ -0,0 +1,103 @@
+import json
+import sys
+from pathlib import Path
+from typing import Optional, TextIO
+import click
+from git_aicommit import DEFAULT_EXCLUDE_FILES
+from git_aicommit.cli.common import tracing_context
+from git_aicommit.config import load_config
+from git_aicommit.error import error_handle
+
+
+@click.command()
+@click.argument(
+    "paths",
+    nargs=-1,
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+)
+@click.option(
+    "--discover",
+    "discover_root",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=None,
+    help="Process every git repository found below this directory.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.File("w"),
+    default="-",
+    help="File to write JSONL results to (default: stdout).",
+)
+@click.option(
+    "--yes",
+    "-y",
+    is_flag=True,
+    default=False,
+    help="Commit the generated messages without confirmation.",
+)
+@click.option(
+    "--include-lockfiles", is_flag=True, default=False, help="Include lock files."
+)
+@click.option(
+    "--prompt",
+    "-p",
+    type=str,
+    default=None,
+    help="Custom instructions for commit message generation.",
+)
+@click.option(
+    "--language",
+    "-l",
+    type=str,
+    default=None,
+    help="Language for commit message generation (e.g., English, Japanese).",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="Always generate new messages instead of reusing cached ones.",
+)
+@error_handle
+def batch(
+    paths: tuple[Path, ...],
+    discover_root: Optional[Path],
+    output: TextIO,
+    yes: bool,
+    include_lockfiles: bool,
+    prompt: Optional[str],
+    language: Optional[str],
+    no_cache: bool,
+):
+    """Generate commit messages for many repositories non-interactively."""
+    from git_aicommit.batch import discover_repositories, run_batch
+    from git_aicommit.provider import provider_from_config
+
+    config = load_config()
+    provider = provider_from_config(config)
+
+    repositories = list(paths)
+    if discover_root is not None:
+        repositories += discover_repositories(discover_root)
+    if not repositories:
+        raise click.UsageError("Specify repository paths or --discover.")
+
+    failed = False
+    with tracing_context():
+        for result in run_batch(
+            repositories,
+            provider=provider,
+            config=config,
+            exclude_files=DEFAULT_EXCLUDE_FILES if not include_lockfiles else [],
+            user_instructions=prompt if prompt is not None else config.prompt,
+            language=language if language is not None else config.language,
+            use_cache=not no_cache,
+            commit=yes,
+        ):
+            failed = failed or "error" in result
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+
+    if failed:
+        sys.exit(1)
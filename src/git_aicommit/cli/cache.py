@@ -0,0 +1,40 @@
+from datetime import datetime
+import click
+from git_aicommit.cache import MessageCache
+from git_aicommit.cli.common import console
+from git_aicommit.error import error_handle
+
+
+@click.group()
+def cache():
+    """Manage the cache of generated commit messages."""
+
+
+def _message_cache() -> MessageCache:
+    from git_aicommit.git import Git
+
+    return MessageCache(Git(".").git_dir / "aicommit" / "cache")
+
+
+@cache.command("stats")
+@error_handle
+def cache_stats():
+    """Show cache statistics."""
+    stats = _message_cache().stats()
+    console.print(f"[bold]Entries:[/bold] {stats.entries}")
+    console.print(f"[bold]Size:[/bold] {stats.size_bytes / 1024:.1f} KiB")
+    if stats.oldest is not None and stats.newest is not None:
+        console.print(
+            f"[bold]Oldest:[/bold] {datetime.fromtimestamp(stats.oldest):%Y-%m-%d %H:%M:%S}"
+        )
+        console.print(
+            f"[bold]Newest:[/bold] {datetime.fromtimestamp(stats.newest):%Y-%m-%d %H:%M:%S}"
+        )
+
+
+@cache.command("clear")
+@error_handle
+def cache_clear():
+    """Remove all cached commit messages."""
+    count = _message_cache().clear()
+    console.print(f"[bold green]Removed {count} cached messages.[/bold green]")
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from collections.abc import Callable
+from typing import TYPE_CHECKING, TypeVar
+from rich.console import Console
+
+if TYPE_CHECKING:
+    from git_aicommit.ai import AI
+    from git_aicommit.config import Config
+    from git_aicommit.daemon import DaemonAI, ProviderInfo
+    from git_aicommit.git import Git
+    from git_aicommit.provider import Provider
+
+T = TypeVar("T")
+
+# NOTE: Heavy dependencies (LangChain, LangSmith, Halo, prompt_toolkit)
+# are imported inside the commands that use them to keep startup fast.
+
+
+console = Console(highlight=False)
+
+
+def in_background(fn: Callable[[], T]) -> "Future[T]":
+    """
+    Start `fn` on a daemon thread and return a future for its result.
+    Unlike an executor, the thread never delays exiting.
+    """
+    future: Future[T] = Future()
+
+    def run() -> None:
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def print_no_staged_changes(git: "Git") -> None:
+    console.print("No staged changes found.")
+    ignored_files = git.staged_files(exclude_files=[])
+    if ignored_files:
+        print()
+        console.print(
+            "[bold yellow]NOTE[/bold yellow]: The following files are staged but ignored:"
+        )
+        for file in ignored_files:
+            console.print(f" - {file}")
+
+        console.print(
+            "\nUse [bold green]--include-lockfiles[/bold green] to include them."
+        )
+
+
+def build_provider(
+    config: "Config", use_daemon: bool
+) -> "tuple[Provider | ProviderInfo, AI | DaemonAI]":
+    if use_daemon:
+        from git_aicommit.daemon import DaemonAI, DaemonClient, ProviderInfo
+
+        client = DaemonClient()
+        client.ensure_running()
+        return ProviderInfo(config), DaemonAI(client, cwd=Path.cwd())
+
+    from git_aicommit.provider import provider_from_config
+    from git_aicommit.ai import AI
+
+    provider = provider_from_config(config)
+    return provider, AI(
+        model=provider.chat_model,
+        prompt_cache=provider.prompt_cache,
+        max_retries=provider.max_retries,
+    )
+
+
+def tracing_context():
+    from git_aicommit.ai import tracing_context
+
+    return tracing_context()
@@ -0,0 +1,55 @@
+from typing import Optional
+import click
+from git_aicommit.cli.common import console
+from git_aicommit.error import error_handle
+
+
+@click.group("daemon")
+def daemon_group():
+    """Manage the background generation process."""
+
+
+@daemon_group.command("run")
+@click.option(
+    "--idle-timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Exit after this many seconds without requests (default: 900).",
+)
+@error_handle
+def daemon_run(idle_timeout: Optional[float]):
+    """Run the daemon in the foreground."""
+    from git_aicommit.daemon import DEFAULT_IDLE_TIMEOUT, serve
+
+    serve(idle_timeout=idle_timeout or DEFAULT_IDLE_TIMEOUT)
+
+
+@daemon_group.command("status")
+@error_handle
+def daemon_status():
+    """Show whether the daemon is running."""
+    from git_aicommit.daemon import DaemonClient
+
+    client = DaemonClient()
+    status = client.ping()
+    if status is None:
+        console.print("Daemon is not running.")
+        return
+    console.print(f"[bold]Socket:[/bold] {client.path}")
+    console.print(f"[bold]PID:[/bold] {status['pid']}")
+    console.print(f"[bold]Uptime:[/bold] {status['uptime']:.0f}s")
+    console.print(f"[bold]Loaded configs:[/bold] {status['configs']}")
+
+
+@daemon_group.command("stop")
+@error_handle
+def daemon_stop():
+    """Stop the daemon."""
+    from git_aicommit.daemon import DaemonClient
+
+    client = DaemonClient()
+    if client.ping() is None:
+        console.print("Daemon is not running.")
+        return
+    client.stop()
+    console.print("[bold green]Daemon stopped.[/bold green]")
@@ -0,0 +1,183 @@
+from pathlib import Path
+from time import time
+from typing import Optional
+import click
+from git_aicommit import DEFAULT_EXCLUDE_FILES
+from git_aicommit.cache import MessageCache
+from git_aicommit.cli.common import build_provider, console, in_background
+from git_aicommit.config import load_config
+from git_aicommit.error import error_handle, hook_error_handle
+from git_aicommit.pipeline import (
+    collect_changes,
+    generate_message,
+    message_cache_key,
+    prepare_changes,
+)
+
+
+@click.group()
+def hook():
+    """Fill in commit messages from a prepare-commit-msg hook."""
+
+
+@hook.command("install")
+@click.option(
+    "--force", is_flag=True, help="Replace an existing prepare-commit-msg hook."
+)
+@error_handle
+def hook_install(force: bool):
+    """Install the prepare-commit-msg hook in this repository."""
+    from git_aicommit.git import Git
+    from git_aicommit.hook import install_hook
+
+    path = install_hook(Git("."), force=force)
+    console.print(f"[bold green]Installed the hook:[/bold green] {path}")
+
+
+@hook.command("uninstall")
+@error_handle
+def hook_uninstall():
+    """Remove the prepare-commit-msg hook installed by git-aicommit."""
+    from git_aicommit.git import Git
+    from git_aicommit.hook import uninstall_hook
+
+    path = uninstall_hook(Git("."))
+    if path is None:
+        console.print("No hook installed by git-aicommit.")
+        return
+    console.print(f"[bold green]Removed the hook:[/bold green] {path}")
+
+
+@hook.command("run", hidden=True)
+@click.argument(
+    "message_file", type=click.Path(exists=True, dir_okay=False, path_type=Path)
+)
+@click.argument("source", required=False)
+@click.argument("commit", required=False)
+@hook_error_handle
+def hook_run(message_file: Path, source: Optional[str], commit: Optional[str]):
+    """
+    Write a generated message into the commit message file. The file is
+    left as it is when anything fails, so the commit can go on.
+    """
+    from git_aicommit.git import Git
+    from git_aicommit.hook import fill_message_file, should_fill, wait_pending
+
+    if not should_fill(source):
+        return
+    config = load_config()
+    git = Git(".")
+    changes = collect_changes(git, config, DEFAULT_EXCLUDE_FILES, config.map_reduce)
+    if not changes.staged_files:
+        return
+    message_cache = MessageCache(git.git_dir / "aicommit" / "cache")
+    key = message_cache_key(
+        config,
+        tree=changes.tree,
+        exclude_files=DEFAULT_EXCLUDE_FILES,
+        recent_logs=changes.logs,
+        user_instructions=config.prompt,
+        language=config.language,
+        map_reduce=config.map_reduce,
+    )
+    # A watcher already generating this message is faster to wait for, unless
+    # it takes more than a few seconds
+    wait_pending(git.git_dir / "aicommit" / "pending", changes.tree)
+    cached_messages = message_cache.get(key)
+    if cached_messages:
+        message = cached_messages[0]
+    else:
+        click.echo("git-aicommit: Generating commit message...", err=True)
+        provider, ai = build_provider(config, config.daemon)
+        message = generate_message(
+            ai,
+            prepare_changes(
+                git,
+                changes.diff_files,
+                changes.attributes,
+                config,
+                provider=provider.name,
+                map_reduce=config.map_reduce,
+            ),
+            changes.logs,
+            user_instructions=config.prompt,
+            language=config.language,
+            max_concurrency=provider.concurrency,
+        )
+        message_cache.add(key, message)
+    fill_message_file(message_file, message)
+
+
+@click.command()
+@click.option(
+    "--debounce",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    show_default=True,
+    help="Seconds the staged changes must stay unchanged before generating.",
+)
+@error_handle
+def watch(debounce: float):
+    """Generate messages into the cache whenever the staged changes settle."""
+    from git_aicommit.git import Git
+    from git_aicommit.hook import is_pending, pending, watch_index
+
+    config = load_config()
+    git = Git(".")
+    message_cache = MessageCache(git.git_dir / "aicommit" / "cache")
+    pending_directory = git.git_dir / "aicommit" / "pending"
+    provider_future = in_background(lambda: build_provider(config, config.daemon))
+
+    def pregenerate() -> None:
+        try:
+            changes = collect_changes(
+                git, config, DEFAULT_EXCLUDE_FILES, config.map_reduce
+            )
+            if not changes.staged_files:
+                return
+            key = message_cache_key(
+                config,
+                tree=changes.tree,
+                exclude_files=DEFAULT_EXCLUDE_FILES,
+                recent_logs=changes.logs,
+                user_instructions=config.prompt,
+                language=config.language,
+                map_reduce=config.map_reduce,
+            )
+            if message_cache.get(key) or is_pending(pending_directory, changes.tree):
+                return
+            provider, ai = provider_future.result()
+            start_time = time()
+            with pending(pending_directory, changes.tree):
+                message = generate_message(
+                    ai,
+                    prepare_changes(
+                        git,
+                        changes.diff_files,
+                        changes.attributes,
+                        config,
+                        provider=provider.name,
+                        map_reduce=config.map_reduce,
+                    ),
+                    changes.logs,
+                    user_instructions=config.prompt,
+                    language=config.language,
+                    max_concurrency=provider.concurrency,
+                )
+                # Staged again while generating; the next round takes over
+                if git.write_tree() != changes.tree:
+                    console.print(
+                        f"[dim]{changes.tree[:7]}: discarded, the staged changes "
+                        "changed meanwhile[/dim]"
+                    )
+                    return
+                message_cache.add(key, message)
+            console.print(
+                f"{changes.tree[:7]}: ready in {time() - start_time:.2f}s "
+                f"[dim]{message.splitlines()[0]}[/dim]"
+            )
+        except Exception as e:
+            console.print(f"[bold red]Error:[/bold red] {e}")
+
+    console.print("Watching the staged changes. Press Ctrl-C to stop.")
+    watch_index(git.git_path("index"), pregenerate, debounce=debounce)
@@ -0,0 +1,150 @@
+from pathlib import Path
+import click
+from git_aicommit.cli.common import console
+from git_aicommit.error import error_handle, ConfigurationAlreadyExistsError
+
+
+@click.command()
+@error_handle
+def init():
+    """Initialize configuration file."""
+    filenames = [
+        ".aicommit.yml",
+        "aicommit.yml",
+        ".aicommit.yaml",
+        "aicommit.yaml",
+    ]
+    for filename in filenames:
+        config_file = Path.cwd() / filename
+
+        if config_file.exists():
+            raise ConfigurationAlreadyExistsError(config_file)
+
+    # Sample configuration with all providers commented out
+    sample_config = """# Uncomment and configure one of the providers below
+
+# Custom instructions for commit message generation (optional)
+# prompt: "Follow Conventional Commits format (feat:, fix:, docs:, etc.)"
+
+# Language for commit message generation (optional)
+# language: "English"
+# language: "Japanese"
+
+# Token budget for the staged diff; larger diffs are compacted (optional)
+# max-diff-tokens: 30000
+
+# Files whose diff exceeds this many tokens are reduced to a one-line
+# summary (optional, default: max-diff-tokens)
+# max-file-tokens: 4000
+
+# Stop reading the staged diff after this many bytes (optional)
+# max-diff-bytes: 10000000
+
+# Token budget for past commit messages shown as style examples (optional)
+# max-log-tokens: 2000
+
+# Generated and vendored files (optional)
+# Files marked linguist-generated, linguist-vendored or -diff in
+# .gitattributes, common generated files (*.min.js, *_pb2.py, vendor/, ...),
+# very large changes and minified files are summarized in one line.
+# generated-files:
+#   exclude:
+#     - "docs/api/**"
+#   summarize:
+#     - "*.csv"
+#   max-lines: 5000
+#   max-line-length: 1000
+
+# Compact the diff before sending it (optional, default: false)
+# Drops formatting-only changes, collapses moved code, trims context and
+# lists the functions and classes that changed.
+# semantic-diff: true
+
+# Minimum similarity in percent for a staged file to count as a rename or
+# copy (optional, default: 50). Files renamed without changes take a single
+# line, and a whole moved directory takes one line in total.
+# rename-similarity: 50
+
+# Token budget for unchanged code sent along with the diff: signatures of
+# the functions and classes enclosing each change, definitions the change
+# uses and callers of changed definitions (optional, default: off)
+# context-tokens: 1000
+
+# Summarize diffs larger than max-diff-tokens in parallel groups (optional)
+# map-reduce: true
+
+# Show the commit message while it is being generated (optional)
+# stream: true
+
+# Providers to fall back to, in order, on errors or timeouts (optional)
+# Each one needs its own configuration section below.
+# fallback:
+#   providers: [anthropic]
+#   hedge-after: 5 # Also start the next provider after 5s without a response
+
+# Generate through a background process that keeps provider clients and
+# their connections warm; it starts on demand and exits when idle (optional)
+# daemon: true
+
+# Record timings and token usage for `git aicommit stats` (optional)
+# stats: false
+
+# Amazon Bedrock
+# provider: aws-bedrock
+# aws-bedrock:
+#   model: "<model>" # Required (e.g. "us.anthropic.claude-sonnet-4-20250514-v1:0")
+#   region: "<region>" # Required (e.g. "us-west-2", "us-east-1")
+#   temperature: 0.0 # Optional (default: 0.0)
+#   concurrency: 4 # Optional (default: 4)
+#   requests-per-minute: 60 # Optional (default: unlimited), shared by all runs
+#   max-retries: 3 # Optional (default: 3), retries when rate-limited
+#   timeout: 30 # Optional, seconds before falling back (default: none)
+
+# Anthropic
+# provider: anthropic
+# anthropic:
+#   model: "<model>" # Required (e.g. "claude-haiku-4-5-20251001", "claude-sonnet-4-5-20250929")
+#   api-key: "<api-key>" # Required
+#   temperature: 0.0 # Optional (default: 0.0)
+#   concurrency: 4 # Optional (default: 4)
+#   requests-per-minute: 60 # Optional (default: unlimited), shared by all runs
+#   max-retries: 3 # Optional (default: 3), retries when rate-limited
+#   timeout: 30 # Optional, seconds before falling back (default: none)
+
+# Google GenAI
+# provider: google-genai
+# google-genai:
+#   model: "<model>" # Required (e.g. "gemini-2.5-flash", "gemini-2.5-pro")
+#   api-key: "<api-key>" # Required
+#   temperature: 0.0 # Optional (default: 0.0)
+#   concurrency: 4 # Optional (default: 4)
+#   requests-per-minute: 60 # Optional (default: unlimited), shared by all runs
+#   max-retries: 3 # Optional (default: 3), retries when rate-limited
+#   timeout: 30 # Optional, seconds before falling back (default: none)
+
+# Ollama
+# provider: ollama
+# ollama:
+#   model: "<model>" # Required
+#   base-url: "http://localhost:11434" # Optional (default: http://localhost:11434)
+#   temperature: 0.0 # Optional (default: 0.0)
+#   concurrency: 4 # Optional (default: 4)
+#   requests-per-minute: 60 # Optional (default: unlimited), shared by all runs
+#   max-retries: 3 # Optional (default: 3), retries when rate-limited
+#   timeout: 30 # Optional, seconds before falling back (default: none)
+
+# OpenAI
+# provider: openai
+# openai:
+#   model: "<model>" # Required (e.g. "gpt-5", "gpt-4.1")
+#   api-key: "<api-key>" # Required
+#   temperature: 0.0 # Optional (default: 0.0)
+#   concurrency: 4 # Optional (default: 4)
+#   requests-per-minute: 60 # Optional (default: unlimited), shared by all runs
+#   max-retries: 3 # Optional (default: 3), retries when rate-limited
+#   timeout: 30 # Optional, seconds before falling back (default: none)
+"""
+
+    config_file = Path.cwd() / "aicommit.yml"
+    config_file.write_text(sample_config)
+    console.print(f"[bold green]Configuration file created:[/bold green] {config_file}")
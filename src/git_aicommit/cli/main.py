@@ -0,0 +1,596 @@
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING, Literal, Optional
+from xml.sax.saxutils import escape as xml_escape
+from importlib.metadata import version
+from time import time
+import readchar
+import click
+from rich.prompt import Confirm
+from rich.markdown import Markdown
+from rich.padding import Padding
+from git_aicommit import DEBUG_ENABLED, DEFAULT_EXCLUDE_FILES
+from git_aicommit.cache import MessageCache
+from git_aicommit.candidates import Candidates
+from git_aicommit.cli.common import (
+    build_provider,
+    console,
+    in_background,
+    print_no_staged_changes,
+    tracing_context,
+)
+from git_aicommit.config import load_config
+from git_aicommit.diff import CompactDiff
+from git_aicommit.error import error_handle, AbortCommitError
+from git_aicommit.pipeline import collect_changes, message_cache_key, prepare_changes
+from git_aicommit.stats import RunStats
+
+if TYPE_CHECKING:
+    from git_aicommit.ai import AI
+    from git_aicommit.daemon import DaemonAI
+
+
+# Conversation after the initial prompt as `(role, content)` pairs, which
+# LangChain accepts as messages and which can be sent to the daemon as is
+History = list[tuple[str, str]]
+
+# Feedback items sent in regenerate rounds; older ones are dropped
+MAX_FEEDBACK_ITEMS = 10
+# Longer feedback is cut
+MAX_FEEDBACK_CHARS = 500
+
+
+def _preview_message(
+    message: str,
+    elapsed_seconds: Optional[float],
+    first_token_seconds: Optional[float] = None,
+    notes: Sequence[str] = (),
+    position: Optional[tuple[int, int]] = None,
+) -> None:
+    if elapsed_seconds is None:
+        status = "cached"
+    elif first_token_seconds is not None:
+        status = (
+            f"first token {first_token_seconds:.2f}s / total {elapsed_seconds:.2f}s"
+        )
+    else:
+        status = f"{elapsed_seconds:.2f}s"
+    for note in notes:
+        status += f", {note}"
+    if position is not None:
+        status = f"candidate {position[0]}/{position[1]}, {status}"
+
+    actions = "`c`: Commit message / `r`: Regenerate / "
+    if position is not None:
+        actions += "`n`: Next candidate / "
+    actions += "`q`: Quit"
+
+    console.print(
+        f"[bold]Generated Commit Message:[/bold] [dim]({status})[/dim]",
+        Padding(
+            Markdown(f"```\n{message}\n```\n\n" + actions),
+            (1, 1, 0, 1),
+        ),
+    )
+
+
+def _generate_streaming(
+    generate: Callable[[Callable[[str], None]], str], label: str
+) -> tuple[str, Optional[float]]:
+    """
+    Render the message as it streams in; Ctrl-C cancels the request.
+
+    Returns the message and the time to the first token, or `None` when the
+    message arrived in one piece.
+    """
+    from rich.live import Live
+
+    start_time = time()
+    first_token_seconds: Optional[float] = None
+    updates = 0
+
+    with Live(
+        f"Generating commit message... [dim]({label})[/dim]",
+        console=console,
+        transient=True,
+        refresh_per_second=15,
+    ) as live:
+
+        def on_token(partial: str) -> None:
+            nonlocal first_token_seconds, updates
+            updates += 1
+            if first_token_seconds is None:
+                first_token_seconds = time() - start_time
+            live.update(
+                Padding(Markdown(f"```\n{partial}\n```"), (1, 1, 0, 1)),
+            )
+
+        with tracing_context():
+            pool = Candidates(lambda _: generate(on_token), concurrency=1)
+            pool.submit()
+        try:
+            message = pool.wait_next()
+        except KeyboardInterrupt:
+            pool.cancel()
+            raise
+
+    # A reply that arrived in one piece has no meaningful first token time
+    return message, first_token_seconds if updates > 1 else None
+
+
+def _print_elided_files(compacted: CompactDiff) -> None:
+    console.print(
+        "[bold yellow]NOTE[/bold yellow]: The staged diff was compacted to fit the token budget."
+    )
+    elided = [(file, "truncated") for file in compacted.truncated_files] + [
+        (file, "summarized") for file in compacted.summarized_files
+    ]
+    for file, reason in elided[:10]:
+        console.print(f" - {file} [dim]({reason})[/dim]")
+    if len(elided) > 10:
+        console.print(f" - ... and {len(elided) - 10} more files")
+    print()
+
+
+def _read_action(
+    can_cycle: bool = False,
+) -> Literal["commit", "regenerate", "next", "quit"]:
+    while True:
+        key = readchar.readkey()
+        if key == "c":
+            return "commit"
+        elif key == "r":
+            return "regenerate"
+        elif key == "n" and can_cycle:
+            return "next"
+        elif key == "q":
+            return "quit"
+
+
+def _variant_history(history: History, variant: int) -> History:
+    """Ask for a differently worded message for every candidate but the first."""
+    if variant == 0:
+        return history
+
+    return [
+        *history,
+        (
+            "human",
+            f"<variation>Write alternative #{variant}: keep it accurate, but vary the wording or emphasis.</variation>",
+        ),
+    ]
+
+
+def _feedback_history(message: str, feedback: list[str]) -> History:
+    """
+    Conversation for a regenerate round: the latest message and the latest
+    `MAX_FEEDBACK_ITEMS` distinct feedback items, so rounds do not grow.
+    """
+    items = list(
+        reversed(
+            dict.fromkeys(
+                item.strip()[:MAX_FEEDBACK_CHARS] for item in reversed(feedback)
+            )
+        )
+    )[-MAX_FEEDBACK_ITEMS:]
+    return [
+        ("ai", message),
+        (
+            "human",
+            "<feedback>"
+            + "".join(f"<item>{xml_escape(item)}</item>" for item in items)
+            + "</feedback>",
+        ),
+    ]
+
+
+@click.group("git-aicommit", invoke_without_command=True)
+@click.option(
+    "--include-lockfiles", is_flag=True, default=False, help="Include lock files."
+)
+@click.option(
+    "--prompt",
+    "-p",
+    type=str,
+    default=None,
+    help="Custom instructions for commit message generation.",
+)
+@click.option(
+    "--language",
+    "-l",
+    type=str,
+    default=None,
+    help="Language for commit message generation (e.g., English, Japanese).",
+)
+@click.option(
+    "--map-reduce/--no-map-reduce",
+    default=None,
+    help="Summarize large diffs in parallel groups before generating the message.",
+)
+@click.option(
+    "--stream/--no-stream",
+    default=None,
+    help="Show the commit message while it is being generated.",
+)
+@click.option(
+    "--candidates",
+    "-n",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of commit message candidates to generate in parallel.",
+)
+@click.option(
+    "--prefetch",
+    is_flag=True,
+    default=False,
+    help="Generate the next candidate in the background while you review.",
+)
+@click.option(
+    "--daemon/--no-daemon",
+    default=None,
+    help="Generate through a background process that keeps provider clients warm.",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="Always generate a new message instead of reusing a cached one.",
+)
+@click.version_option(version("git-aicommit"), prog_name="git-aicommit")
+@click.pass_context
+@error_handle
+def root(
+    ctx: click.Context,
+    include_lockfiles: bool,
+    prompt: Optional[str],
+    language: Optional[str],
+    map_reduce: Optional[bool],
+    stream: Optional[bool],
+    candidates: int,
+    prefetch: bool,
+    daemon: Optional[bool],
+    no_cache: bool,
+):
+    """Generate commit messages using AI."""
+    if ctx.invoked_subcommand is not None:
+        return
+
+    from git_aicommit.git import Git
+
+    run_stats = RunStats()
+    with run_stats.phase("config"):
+        config = load_config()
+
+    if config.stats:
+
+        def save_stats() -> None:
+            # Runs that never reached the model are not worth recording
+            if run_stats.provider is not None:
+                run_stats.save()
+
+        ctx.call_on_close(save_stats)
+
+    # Resolve user instructions: CLI option takes priority over config file
+    user_instructions = prompt if prompt is not None else config.prompt
+
+    # Resolve language: CLI option takes priority over config file
+    resolved_language = language if language is not None else config.language
+
+    from git_aicommit.daemon import DaemonAI, ProviderInfo
+    from git_aicommit.provider import FallbackProvider, Provider
+
+    # Resolve daemon mode: CLI option takes priority over config file
+    use_daemon = daemon if daemon is not None else config.daemon
+
+    git = Git(".")
+
+    exclude_files = DEFAULT_EXCLUDE_FILES if not include_lockfiles else []
+
+    with run_stats.phase("git"):
+        # Checked first, so that nothing is loaded (nor a daemon started)
+        # when there is nothing to commit
+        has_changes = git.has_staged_changes(exclude_files)
+    if not has_changes:
+        print_no_staged_changes(git)
+        return
+
+    # Importing LangChain and creating the client takes about as long as
+    # collecting the git data, so both happen at the same time
+    provider_future = in_background(lambda: build_provider(config, use_daemon))
+
+    # Resolve map-reduce mode: CLI option takes priority over config file
+    use_map_reduce = map_reduce if map_reduce is not None else config.map_reduce
+
+    with run_stats.phase("git"):
+        changes = collect_changes(git, config, exclude_files, use_map_reduce)
+    if DEBUG_ENABLED:
+        console.print(
+            "[dim]git: "
+            + ", ".join(f"{name} {sec:.3f}s" for name, sec in changes.timings.items())
+            + "[/dim]"
+        )
+
+    if not changes.staged_files:
+        # Unstaged in the meantime
+        print_no_staged_changes(git)
+        return
+
+    from halo import Halo
+
+    provider: Provider | ProviderInfo
+    ai: "AI | DaemonAI"
+    # Only the time not hidden behind the git phase is spent here
+    with run_stats.phase("provider"):
+        provider, ai = provider_future.result()
+    run_stats.provider = provider.name
+    run_stats.model = provider.model_name
+    run_stats.files = len(changes.files)
+    run_stats.diff_bytes = sum(file.size for file in changes.diff_files)
+
+    # Resolve streaming mode: CLI option takes priority over config file
+    use_stream = stream if stream is not None else config.stream
+
+    with run_stats.phase("prompt"):
+        prepared = prepare_changes(
+            git,
+            changes.diff_files,
+            changes.attributes,
+            config,
+            provider=provider.name,
+            map_reduce=use_map_reduce,
+        )
+    recent_logs = changes.logs
+    groups = prepared.groups
+    compacted = prepared.diff
+
+    message_cache = (
+        None if no_cache else MessageCache(git.git_dir / "aicommit" / "cache")
+    )
+    key = message_cache_key(
+        config,
+        tree=changes.tree,
+        exclude_files=exclude_files,
+        recent_logs=recent_logs,
+        user_instructions=user_instructions,
+        language=resolved_language,
+        map_reduce=use_map_reduce,
+    )
+    cached_messages = message_cache.get(key) if message_cache is not None else []
+
+    summaries: Optional[list[str]] = None
+    if compacted is None:
+
+        def generate_message(
+            history: History,
+            on_token: Optional[Callable[[str], None]] = None,
+        ) -> str:
+            assert summaries is not None
+            return ai.generate_commit_message_from_summaries(
+                recent_logs=recent_logs,
+                summaries=summaries,
+                history=history,
+                user_instructions=user_instructions,
+                language=resolved_language,
+                on_token=on_token,
+            )
+    else:
+        diff = compacted.text
+        if compacted.elided:
+            _print_elided_files(compacted)
+
+        def generate_message(
+            history: History,
+            on_token: Optional[Callable[[str], None]] = None,
+        ) -> str:
+            return ai.generate_commit_message(
+                recent_logs=recent_logs,
+                diff=diff,
+                history=history,
+                user_instructions=user_instructions,
+                language=resolved_language,
+                on_token=on_token,
+                context=prepared.context,
+            )
+
+    # Extra details shown in the preview for each generated message, such as
+    # prompt cache usage and the backend that answered
+    message_notes: dict[str, list[str]] = {}
+
+    def generate(
+        history: History,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        start_time = time()
+        if isinstance(ai, DaemonAI):
+            message = generate_message(history, on_token)
+            usage, decision = ai.last_details()
+        else:
+            from langchain_core.callbacks import get_usage_metadata_callback
+            from git_aicommit.fallback import recording_decisions
+
+            with (
+                get_usage_metadata_callback() as usage_callback,
+                recording_decisions() as decisions,
+            ):
+                message = generate_message(history, on_token)
+            usage = list(usage_callback.usage_metadata.values())
+            fallback = (
+                decisions[-1]
+                if decisions and isinstance(provider, FallbackProvider)
+                else None
+            )
+            decision = (
+                {"backend": fallback.backend, "notes": fallback.notes}
+                if fallback is not None
+                else None
+            )
+        # Cancelled generations raise before getting here, so only requests
+        # that completed are counted
+        run_stats.cached = False
+        run_stats.add_generation(time() - start_time, usage)
+        notes: list[str] = []
+        details = [u.get("input_token_details", {}) for u in usage]
+        if any("cache_read" in d or "cache_creation" in d for d in details):
+            cache_read = sum(d.get("cache_read", 0) for d in details)
+            input_tokens = sum(u.get("input_tokens", 0) for u in usage)
+            notes.append(f"prompt cache {cache_read}/{input_tokens} tokens")
+        if decision is not None and decision["notes"]:
+            notes.append(f"via {decision['backend']} ({'; '.join(decision['notes'])})")
+        message_notes[message] = notes
+        return message
+
+    use_candidates = candidates > 1 or prefetch
+
+    history: History = []
+    feedback: list[str] = []
+    # Messages of the round before the latest feedback, shown again when
+    # regenerating is cancelled
+    previous: Optional[tuple[list[str], Sequence[Optional[float]], int]] = None
+    while True:
+        pool: Optional[Candidates] = None
+        first_token_seconds: Optional[float] = None
+        restored = False
+        index = 0
+
+        # Only the first round is cacheable; later rounds depend on feedback
+        from_cache = not history and bool(cached_messages)
+        if from_cache:
+            run_stats.cached = True
+            messages = cached_messages
+            elapsed: Sequence[Optional[float]] = [None] * len(messages)
+        else:
+            if compacted is None and summaries is None:
+                with Halo(
+                    text=f"Summarizing {len(groups)} groups of changes... \033[90m({provider.name}/{provider.model_name})\033[0m",
+                    spinner="dots",
+                ):
+                    with tracing_context(), run_stats.phase("summarize"):
+                        summaries = ai.summarize_diffs(
+                            groups, max_concurrency=provider.concurrency
+                        )
+
+            # Generations run on worker threads, so Ctrl-C is handled right
+            # away instead of after the request returns, and cancels it
+            start_time = time()
+            try:
+                if use_stream and not use_candidates:
+                    message, first_token_seconds = _generate_streaming(
+                        lambda on_token: generate(history, on_token),
+                        label=f"{provider.name}/{provider.model_name}",
+                    )
+                    messages, elapsed = [message], [time() - start_time]
+                    if run_stats.first_token_seconds is None:
+                        run_stats.first_token_seconds = first_token_seconds
+                else:
+                    round_history = list(history)
+                    with tracing_context():
+                        pool = Candidates(
+                            lambda variant: generate(
+                                _variant_history(round_history, variant)
+                            ),
+                            concurrency=provider.concurrency,
+                        )
+                        pool.submit(candidates)
+                    with Halo(
+                        text=(
+                            f"Generating {candidates} commit message candidates..."
+                            if candidates > 1
+                            else "Generating commit message..."
+                        )
+                        + f" \033[90m({provider.name}/{provider.model_name})\033[0m",
+                        spinner="dots",
+                    ):
+                        pool.wait_next()
+                    messages = pool.messages
+                    elapsed = pool.elapsed_seconds
+            except KeyboardInterrupt:
+                if pool is not None:
+                    pool.cancel()
+                    pool = None
+                if previous is None:
+                    raise
+                # Drop the feedback; the history is rebuilt from the message
+                # picked next
+                feedback.pop()
+                messages, elapsed, index = previous
+                restored = True
+                console.print("[dim]Generation cancelled.[/dim]")
+                print()
+
+        while True:
+            if prefetch and pool is not None and not pool.pending:
+                if index == len(messages) - 1:
+                    pool.submit()
+            can_cycle = len(messages) > 1 or (pool is not None and pool.pending > 0)
+            _preview_message(
+                messages[index],
+                elapsed[index],
+                first_token_seconds,
+                notes=message_notes.get(messages[index], ()),
+                position=(
+                    (index + 1, len(messages) + (pool.pending if pool else 0))
+                    if can_cycle
+                    else None
+                ),
+            )
+
+            action = _read_action(can_cycle=can_cycle)
+            print()
+            if action != "next":
+                break
+
+            if index + 1 < len(messages):
+                index += 1
+            elif pool is not None and pool.pending:
+                with Halo(text="Waiting for the next candidate...", spinner="dots"):
+                    pool.wait_next()
+                index += 1
+            else:
+                index = 0
+
+        if pool is not None:
+            pool.cancel()
+        if (
+            not from_cache
+            and not restored
+            and not history
+            and message_cache is not None
+        ):
+            for candidate in reversed(messages):
+                message_cache.add(key, candidate)
+        previous = (list(messages), list(elapsed), index)
+
+        message = messages[index]
+
+        if action == "commit":
+            while True:
+                try:
+                    with (
+                        Halo(text="Committing changes...", spinner="dots"),
+                        run_stats.phase("commit"),
+                    ):
+                        git.commit(message)
+                    run_stats.outcome = "committed"
+                    console.print("[bold green]Committed successfully![/bold green]")
+                    break
+                except Exception as e:
+                    console.print(f"[bold red]Commit failed:[/bold red] {e}")
+                    print()
+                    if not Confirm.ask("Retry?"):
+                        raise
+            break
+
+        elif action == "regenerate":
+            from git_aicommit.prompt import prompt as prompt_input
+
+            answer = prompt_input("Provide feedback to refine the commit message")
+            if not answer.strip():
+                run_stats.outcome = "aborted"
+                raise AbortCommitError()
+            print()
+            feedback.append(answer)
+            history = _feedback_history(message, feedback)
+            continue
+
+        elif action == "quit":
+            run_stats.outcome = "aborted"
+            raise AbortCommitError()
@@ -0,0 +1,182 @@
+from time import time
+from typing import TYPE_CHECKING, Optional
+import click
+from rich.prompt import Confirm
+from rich.markdown import Markdown
+from rich.padding import Padding
+from git_aicommit import DEBUG_ENABLED, DEFAULT_EXCLUDE_FILES
+from git_aicommit.classify import GENERATED_ATTRIBUTES
+from git_aicommit.cli.common import console, in_background, tracing_context
+from git_aicommit.config import load_config
+from git_aicommit.diff import tokens_to_chars
+from git_aicommit.error import error_handle, AbortCommitError
+from git_aicommit.pipeline import PreparedChanges, generate_message, prepare_changes
+
+if TYPE_CHECKING:
+    from git_aicommit.ai import AI
+    from git_aicommit.provider import Provider
+
+
+@click.command()
+@click.option(
+    "--max-commits",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="Split the staged changes into at most this many commits.",
+)
+@click.option(
+    "--yes",
+    "-y",
+    is_flag=True,
+    default=False,
+    help="Create the commits without confirmation.",
+)
+@click.option(
+    "--include-lockfiles", is_flag=True, default=False, help="Include lock files."
+)
+@click.option(
+    "--prompt",
+    "-p",
+    type=str,
+    default=None,
+    help="Custom instructions for commit message generation.",
+)
+@click.option(
+    "--language",
+    "-l",
+    type=str,
+    default=None,
+    help="Language for commit message generation (e.g., English, Japanese).",
+)
+@error_handle
+def plan(
+    max_commits: int,
+    yes: bool,
+    include_lockfiles: bool,
+    prompt: Optional[str],
+    language: Optional[str],
+):
+    """Split the staged changes into several commits with generated messages."""
+    from concurrent.futures import ThreadPoolExecutor
+    from halo import Halo
+    from git_aicommit.diff import parse_diff
+    from git_aicommit.git import Git
+    from git_aicommit.history import HistoryIndex
+    from git_aicommit.context import ContextBuilder
+    from git_aicommit.plan import apply_plan, cluster_units, split_units
+
+    config = load_config()
+
+    def build_provider() -> "tuple[Provider, AI]":
+        from git_aicommit.ai import AI
+        from git_aicommit.provider import provider_from_config
+
+        provider = provider_from_config(config)
+        return provider, AI(
+            model=provider.chat_model,
+            prompt_cache=provider.prompt_cache,
+            max_retries=provider.max_retries,
+        )
+
+    git = Git(".")
+    exclude_files = DEFAULT_EXCLUDE_FILES if not include_lockfiles else []
+    if not git.has_staged_changes(exclude_files):
+        console.print("No staged changes found.")
+        return
+
+    provider_future = in_background(build_provider)
+
+    start_time = time()
+    units = split_units(
+        parse_diff(git.staged_patch(config.rename_similarity).split("\n")),
+        exclude_files=exclude_files,
+    )
+    if not units:
+        console.print("No staged changes found.")
+        return
+    groups = cluster_units(units, max_groups=max_commits)
+    if DEBUG_ENABLED:
+        console.print(
+            f"[dim]plan: {len(units)} hunks in {len(groups)} groups, "
+            f"{time() - start_time:.3f}s[/dim]"
+        )
+
+    provider, ai = provider_future.result()
+    history = HistoryIndex(git.git_dir / "aicommit" / "history.sqlite3")
+    max_log_chars = tokens_to_chars(config.max_log_tokens, provider.name)
+    recent_logs = [
+        git.relevant_logs(history, group.paths, max_count=10, max_chars=max_log_chars)
+        for group in groups
+    ]
+
+    attributes = git.check_attributes(
+        list(dict.fromkeys(path for group in groups for path in group.paths)),
+        GENERATED_ATTRIBUTES,
+    )
+    # Groups often touch the same files, which one builder reads once
+    builder = ContextBuilder(git) if config.context_tokens is not None else None
+    try:
+        prepared = [
+            prepare_changes(
+                git,
+                group.diff_files(),
+                attributes,
+                config,
+                provider=provider.name,
+                context_builder=builder,
+            )
+            for group in groups
+        ]
+    finally:
+        if builder is not None:
+            builder.close()
+
+    def generate(changes: PreparedChanges, logs: list[str]) -> str:
+        return generate_message(
+            ai,
+            changes,
+            logs,
+            user_instructions=prompt if prompt is not None else config.prompt,
+            language=language if language is not None else config.language,
+            max_concurrency=1,
+        )
+
+    # The groups are independent, so their messages are generated at once
+    with (
+        tracing_context(),
+        Halo(
+            text=(
+                f"Generating {len(groups)} commit messages..."
+                if len(groups) > 1
+                else "Generating commit message..."
+            )
+            + f" \033[90m({provider.name}/{provider.model_name})\033[0m",
+            spinner="dots",
+        ),
+        ThreadPoolExecutor(max_workers=provider.concurrency) as pool,
+    ):
+        messages = list(pool.map(generate, prepared, recent_logs))
+
+    for number, (group, message) in enumerate(zip(groups, messages), start=1):
+        console.print(f"[bold]Commit {number}/{len(groups)}:[/bold]")
+        console.print(Padding(Markdown(f"```\n{message}\n```"), (1, 1, 0, 1)))
+        files = group.diff_files()
+        for file in files[:10]:
+            stat = "binary" if file.binary else f"+{file.additions} -{file.deletions}"
+            console.print(f" - {file.path} [dim]({stat})[/dim]")
+        if len(files) > 10:
+            console.print(f" - ... and {len(files) - 10} more files")
+        print()
+
+    if not yes and not Confirm.ask(f"Create {len(groups)} commits?"):
+        raise AbortCommitError()
+
+    with Halo(text="Committing changes...", spinner="dots"):
+        complete = apply_plan(git, groups, messages)
+    console.print(f"[bold green]Created {len(groups)} commits.[/bold green]")
+    if not complete:
+        console.print(
+            "[bold yellow]NOTE[/bold yellow]: Some changes could not be split "
+            "and are still staged."
+        )
@@ -0,0 +1,54 @@
+import json
+from dataclasses import asdict
+from typing import Optional
+import click
+from git_aicommit.cli.common import console
+from git_aicommit.error import error_handle
+from git_aicommit.stats import load_runs, summarize_runs
+
+
+@click.command()
+@click.option("--json", "as_json", is_flag=True, help="Print the summary as JSON.")
+@error_handle
+def stats(as_json: bool):
+    """Show latency and token usage per provider and model."""
+    runs = load_runs()
+    summaries = summarize_runs(runs)
+    if as_json:
+        print(json.dumps([asdict(summary) for summary in summaries], indent=2))
+        return
+    if not summaries:
+        console.print("No runs recorded yet.")
+        return
+    cached_runs = sum(1 for run in runs if run.get("cached"))
+
+    from rich.table import Table
+
+    def seconds(value: Optional[float]) -> str:
+        return f"{value:.2f}s" if value is not None else "-"
+
+    table = Table()
+    table.add_column("Provider/Model")
+    table.add_column("Runs", justify="right")
+    table.add_column("LLM p50", justify="right")
+    table.add_column("LLM p95", justify="right")
+    table.add_column("First token p50", justify="right")
+    table.add_column("First token p95", justify="right")
+    table.add_column("Git p95", justify="right")
+    table.add_column("Tokens in/out (mean)", justify="right")
+    for summary in summaries:
+        table.add_row(
+            f"{summary.provider}/{summary.model}",
+            str(summary.runs),
+            seconds(summary.generation_p50),
+            seconds(summary.generation_p95),
+            seconds(summary.first_token_p50),
+            seconds(summary.first_token_p95),
+            seconds(summary.git_p95),
+            f"{summary.input_tokens_mean:.0f}/{summary.output_tokens_mean:.0f}",
+        )
+    console.print(table)
+    if cached_runs:
+        console.print(
+            f"[dim]Not included: runs served from the cache ({cached_runs}).[/dim]"
+        )
@@ -1,6 +1,10 @@
+import hashlib
+import json
+import os
+import tempfile
 from typing import Optional, Literal, Self
 from pathlib import Path
-from yaml import safe_load
+from time import time
 from pydantic import (
     BaseModel,
     SecretStr,
@@ -10,6 +14,7 @@ from pydantic import (
     ConfigDict,
 )
 from git_aicommit.error import InvalidConfigurationError
+from git_aicommit.paths import cache_directory
 
 
 class AWSBedrockConfig(BaseModel):
@@ -18,6 +23,13 @@ class AWSBedrockConfig(BaseModel):
     model: str
     region: str
     temperature: float = 0.0
+    concurrency: int = Field(default=4, gt=0)
+    requests_per_minute: Optional[float] = Field(
+        default=None, gt=0, alias="requests-per-minute"
+    )
+    max_retries: int = Field(default=3, ge=0, alias="max-retries")
+    # Seconds to wait for a response before falling back to the next provider
+    timeout: Optional[float] = Field(default=None, gt=0)
 
 
 class AnthropicConfig(BaseModel):
@@ -26,6 +38,13 @@ class AnthropicConfig(BaseModel):
     model: str
     api_key: SecretStr = Field(alias="api-key")
     temperature: float = 0.0
+    concurrency: int = Field(default=4, gt=0)
+    requests_per_minute: Optional[float] = Field(
+        default=None, gt=0, alias="requests-per-minute"
+    )
+    max_retries: int = Field(default=3, ge=0, alias="max-retries")
+    # Seconds to wait for a response before falling back to the next provider
+    timeout: Optional[float] = Field(default=None, gt=0)
 
 
 class GoogleGenAIConfig(BaseModel):
@@ -34,6 +53,13 @@ class GoogleGenAIConfig(BaseModel):
     model: str
     api_key: SecretStr = Field(alias="api-key")
     temperature: float = 0.0
+    concurrency: int = Field(default=4, gt=0)
+    requests_per_minute: Optional[float] = Field(
+        default=None, gt=0, alias="requests-per-minute"
+    )
+    max_retries: int = Field(default=3, ge=0, alias="max-retries")
+    # Seconds to wait for a response before falling back to the next provider
+    timeout: Optional[float] = Field(default=None, gt=0)
 
 
 class OllamaConfig(BaseModel):
@@ -45,6 +71,13 @@ class OllamaConfig(BaseModel):
         alias="base-url",
     )
     temperature: float = 0.0
+    concurrency: int = Field(default=4, gt=0)
+    requests_per_minute: Optional[float] = Field(
+        default=None, gt=0, alias="requests-per-minute"
+    )
+    max_retries: int = Field(default=3, ge=0, alias="max-retries")
+    # Seconds to wait for a response before falling back to the next provider
+    timeout: Optional[float] = Field(default=None, gt=0)
 
 
 class OpenAIConfig(BaseModel):
@@ -53,14 +86,62 @@ class OpenAIConfig(BaseModel):
     model: str
     api_key: SecretStr = Field(alias="api-key")
     temperature: float = 0.0
+    concurrency: int = Field(default=4, gt=0)
+    requests_per_minute: Optional[float] = Field(
+        default=None, gt=0, alias="requests-per-minute"
+    )
+    max_retries: int = Field(default=3, ge=0, alias="max-retries")
+    # Seconds to wait for a response before falling back to the next provider
+    timeout: Optional[float] = Field(default=None, gt=0)
+
+
+ProviderName = Literal["aws-bedrock", "anthropic", "google-genai", "ollama", "openai"]
+
+
+class FallbackConfig(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    # Providers tried in order after the primary `provider`
+    providers: list[ProviderName] = Field(min_length=1)
+    # Start the next provider in parallel if no response arrived in time
+    hedge_after: Optional[float] = Field(default=None, gt=0, alias="hedge-after")
+
+
+class GeneratedFilesConfig(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    # Glob patterns of files left out of the prompt entirely
+    exclude: list[str] = Field(default_factory=list)
+    # Glob patterns of files reduced to a one-line summary
+    summarize: list[str] = Field(default_factory=list)
+    max_lines: int = Field(default=5000, gt=0, alias="max-lines")
+    max_line_length: int = Field(default=1000, gt=0, alias="max-line-length")
 
 
 class Config(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
-    provider: Literal["aws-bedrock", "anthropic", "google-genai", "ollama", "openai"]
+    provider: ProviderName
     prompt: Optional[str] = None
     language: Optional[str] = None
+    max_diff_tokens: int = Field(default=30000, gt=0, alias="max-diff-tokens")
+    max_diff_bytes: int = Field(default=10_000_000, gt=0, alias="max-diff-bytes")
+    max_log_tokens: int = Field(default=2000, gt=0, alias="max-log-tokens")
+    # Files whose diff is larger are reduced to a one-line summary; defaults
+    # to max-diff-tokens
+    max_file_tokens: Optional[int] = Field(default=None, gt=0, alias="max-file-tokens")
+    rename_similarity: int = Field(default=50, ge=1, le=100, alias="rename-similarity")
+    # Budget for unchanged code around the changes; no context when unset
+    context_tokens: Optional[int] = Field(default=None, gt=0, alias="context-tokens")
+    map_reduce: bool = Field(default=False, alias="map-reduce")
+    semantic_diff: bool = Field(default=False, alias="semantic-diff")
+    stream: bool = False
+    stats: bool = True
+    daemon: bool = False
+    generated_files: GeneratedFilesConfig = Field(
+        default_factory=GeneratedFilesConfig, alias="generated-files"
+    )
+    fallback: Optional[FallbackConfig] = None
     aws_bedrock: Optional[AWSBedrockConfig] = Field(default=None, alias="aws-bedrock")
     anthropic: Optional[AnthropicConfig] = None
     google_genai: Optional[GoogleGenAIConfig] = Field(
@@ -69,6 +150,20 @@ class Config(BaseModel):
     ollama: Optional[OllamaConfig] = None
     openai: Optional[OpenAIConfig] = None
 
+    @property
+    def provider_config(
+        self,
+    ) -> (
+        AWSBedrockConfig
+        | AnthropicConfig
+        | GoogleGenAIConfig
+        | OllamaConfig
+        | OpenAIConfig
+    ):
+        provider_config = getattr(self, self.provider.replace("-", "_"))
+        assert provider_config is not None
+        return provider_config
+
     @model_validator(mode="after")
     def validate_provider_config(self) -> Self:
         if self.provider == "aws-bedrock" and self.aws_bedrock is None:
@@ -91,28 +186,66 @@ class Config(BaseModel):
             raise ValueError(
                 "openai configuration is required when provider is 'openai'"
             )
+        if self.fallback is not None:
+            for provider in self.fallback.providers:
+                if provider == self.provider:
+                    raise ValueError(
+                        f"fallback providers must differ from the primary provider '{provider}'"
+                    )
+                if getattr(self, provider.replace("-", "_")) is None:
+                    raise ValueError(
+                        f"{provider} configuration is required when it is a fallback provider"
+                    )
         return self
 
 
-def find_all_config_paths() -> list[Path]:
+CONFIG_FILENAMES = [
+    ".aicommit.yml",
+    "aicommit.yml",
+    ".aicommit.yaml",
+    "aicommit.yaml",
+]
+
+# Files modified this recently are not trusted to be cached, since another
+# change within the same timestamp granularity would go unnoticed
+RACY_SECONDS = 2.0
+
+
+def search_directories(start: Optional[Path] = None) -> list[Path]:
+    """
+    Directories searched for config files, from `start` (CWD by default)
+    upwards.
+
+    The search ends at the root directory, or at the first directory listed
+    in `GIT_AICOMMIT_CONFIG_CEILING` (separated like PATH), which is still
+    searched itself.
+    """
+    ceilings = {
+        Path(ceiling).resolve()
+        for ceiling in os.getenv("GIT_AICOMMIT_CONFIG_CEILING", "").split(os.pathsep)
+        if ceiling
+    }
+
+    current = start or Path.cwd()
+    directories: list[Path] = []
+    for parent in [current] + list(current.parents):
+        directories.append(parent)
+        if parent in ceilings:
+            break
+    return directories
+
+
+def find_all_config_paths(start: Optional[Path] = None) -> list[Path]:
     """
-    Search for all config files from CWD up to the root directory.
+    Search for all config files in `search_directories(start)`.
 
     Returns:
         List of config file paths. Index 0 has the highest priority (closest to CWD).
     """
-    filenames = [
-        ".aicommit.yml",
-        "aicommit.yml",
-        ".aicommit.yaml",
-        "aicommit.yaml",
-    ]
-
     config_paths: list[Path] = []
-    current = Path.cwd()
 
-    for parent in [current] + list(current.parents):
-        for filename in filenames:
+    for parent in search_directories(start):
+        for filename in CONFIG_FILENAMES:
             config_path = parent / filename
             if config_path.is_file():
                 config_paths.append(config_path)
@@ -121,7 +254,7 @@ def find_all_config_paths() -> list[Path]:
     return config_paths
 
 
-def merge_configs(config_dicts: list[dict]) -> dict:
+def merge_configs(config_dicts: list[Optional[dict]]) -> dict:
     """
     Merge multiple config dictionaries by priority.
 
@@ -147,33 +280,169 @@ def merge_configs(config_dicts: list[dict]) -> dict:
     return merged
 
 
-def load_config() -> Config:
-    config_paths = find_all_config_paths()
+def config_fingerprint(
+    start: Optional[Path] = None,
+) -> tuple[tuple[str, int, int, int], ...]:
+    """
+    Identify the config files that apply to `start` and their versions.
 
-    if not config_paths:
-        raise FileNotFoundError("Configuration file not found.")
+    Directories are included too, since creating or removing a config file
+    changes the modification time of its directory.
+    """
+    directories = [_directory_key(path) for path in search_directories(start)]
+    return (*directories, *(_stat_key(path) for path in find_all_config_paths(start)))
 
-    # Load all config files as dictionaries
-    config_dicts: list[dict] = []
-    for config_path in config_paths:
+
+def _stat_key(path: Path) -> tuple[str, int, int, int]:
+    stat = path.stat()
+    return (str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _directory_key(path: Path) -> tuple[str, int, int, int]:
+    """`_stat_key` of a searched directory, with -1s if it cannot be stat'ed."""
+    try:
+        return _stat_key(path)
+    except OSError:
+        return (str(path), -1, -1, -1)
+
+
+def _load_yaml(config_path: Path) -> Optional[dict]:
+    from yaml import load
+
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+
+    try:
+        with open(config_path, "r") as f:
+            return load(f, Loader=SafeLoader)
+    except Exception as e:
+        raise InvalidConfigurationError(
+            f"YAML parsing error in {config_path}: {str(e)}"
+        ) from e
+
+
+def _config_cache_path(start: Path) -> Path:
+    digest = hashlib.sha256(str(start).encode("utf-8")).hexdigest()[:32]
+    return cache_directory() / "configs" / f"{digest}.json"
+
+
+def _read_config_cache(cache_path: Path, start: Path) -> Optional[dict]:
+    """
+    Return the cached config data if no searched directory and no config
+    file changed, with the API keys read from their config files.
+    """
+    try:
+        entry = json.loads(cache_path.read_text())
+        if entry["start"] != str(start):
+            return None
+        directories = [str(path) for path in search_directories(start)]
+        if [key[0] for key in entry["directories"]] != directories:
+            # The search ceiling changed
+            return None
+        for key in entry["directories"]:
+            if list(_directory_key(Path(key[0]))) != key:
+                return None
+        for key in entry["files"]:
+            if list(_stat_key(Path(key[0]))) != key:
+                return None
+        data = entry["config"]
+        for path, sections in entry["secrets"].items():
+            source = _load_yaml(Path(path)) or {}
+            for section in sections:
+                data[section]["api-key"] = source[section]["api-key"]
+        return data
+    except (OSError, ValueError, KeyError, TypeError, InvalidConfigurationError):
+        return None
+
+
+def _write_config_cache(
+    cache_path: Path,
+    start: Path,
+    directories: list[tuple[str, int, int, int]],
+    files: list[tuple[str, int, int, int]],
+    config_dicts: list[Optional[dict]],
+    config: Config,
+) -> None:
+    try:
+        newest = max(key[2] for key in [*directories, *files]) / 1e9
+        if time() - newest < RACY_SECONDS:
+            return
+
+        # API keys stay in their config files, which are parsed again for
+        # them on every run
+        secrets: dict[str, list[str]] = {}
+        exclude: dict[str, set[str]] = {}
+        for name, field in Config.model_fields.items():
+            if getattr(getattr(config, name), "api_key", None) is None:
+                continue
+            section = field.alias or name
+            # Sections are merged whole, so each comes from a single file
+            source = next(
+                key[0]
+                for key, data in zip(files, config_dicts)
+                if data and data.get(section) is not None
+            )
+            secrets.setdefault(source, []).append(section)
+            exclude[name] = {"api_key"}
+
+        entry = {
+            "start": str(start),
+            "directories": directories,
+            "files": files,
+            "config": config.model_dump(mode="json", by_alias=True, exclude=exclude),
+            "secrets": secrets,
+        }
+        cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
         try:
-            with open(config_path, "r") as f:
-                data = safe_load(f)
-                if data is not None:
-                    config_dicts.append(data)
-        except Exception as e:
-            raise InvalidConfigurationError(
-                f"YAML parsing error in {config_path}: {str(e)}"
-            ) from e
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+    except (OSError, ValueError):
+        pass
 
-    if not config_dicts:
-        raise InvalidConfigurationError("All configuration files are empty.")
 
-    # Merge configs
-    merged_data = merge_configs(config_dicts)
+def load_config(start: Optional[Path] = None) -> Config:
+    """
+    Load and merge every config file that applies to `start` (CWD by default).
+
+    The merged and validated config is cached per directory and reused as
+    long as none of the searched directories and config files changed. API
+    keys are not cached: the config files they come from are still parsed
+    on every run, the others are not.
+    """
+    start = start or Path.cwd()
+    cache_path = _config_cache_path(start)
+
+    cached = _read_config_cache(cache_path, start)
+    if cached is not None:
+        try:
+            return Config.model_validate(cached)
+        except ValidationError:
+            pass
+
+    # Directories and files are stat'ed before they are read, so that a
+    # change in the meantime invalidates the cache entry
+    directories = [_directory_key(path) for path in search_directories(start)]
+    config_paths = find_all_config_paths(start)
+    if not config_paths:
+        raise FileNotFoundError("Configuration file not found.")
+    files = [_stat_key(path) for path in config_paths]
+    config_dicts = [_load_yaml(path) for path in config_paths]
+
+    if all(data is None for data in config_dicts):
+        raise InvalidConfigurationError("All configuration files are empty.")
 
     # Validate with Pydantic
     try:
-        return Config(**merged_data)
+        config = Config(**merge_configs(config_dicts))
     except ValidationError as e:
         raise InvalidConfigurationError(str(e)) from e
+
+    _write_config_cache(cache_path, start, directories, files, config_dicts, config)
+    return config
@@ -0,0 +1,382 @@
+import re
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from git_aicommit.diff import FileDiff, tokens_to_chars
+from git_aicommit.git import Git
+from git_aicommit.semantic import symbol_name, symbol_patterns
+
+
+# Parsed blobs kept between calls, e.g. for the groups of `plan`
+MAX_CACHED_BLOBS = 256
+# Files read from the index at once
+READ_CHUNK = 16
+# Larger blobs (e.g. generated sources) are skipped
+MAX_BLOB_BYTES = 1024 * 1024
+# Bytes of source searched for definitions and call sites per call. The
+# search is the only costly step, so this bounds the time spent.
+MAX_SEARCHED_BYTES = 512 * 1024
+# Lines walked up from a change looking for the definitions enclosing it
+MAX_SCOPE_LINES = 2000
+# Lines shown of a signature spanning several lines
+MAX_SIGNATURE_LINES = 4
+# Call sites shown per changed definition
+MAX_CALLERS = 3
+# Changed definitions whose call sites are looked up
+MAX_CALLED_NAMES = 20
+# Longer lines are cut
+MAX_LINE_CHARS = 160
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# `@@ -1,2 +3,4 @@`; the start and length on the new side
+_HUNK_RANGE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))?")
+
+
+class _Blob:
+    """A file in the index, split into lines, with its definitions."""
+
+    def __init__(self, text: str, patterns: list[re.Pattern[str]]):
+        self.text = text
+        self.lines = text.split("\n")
+        self.patterns = patterns
+        self._definitions: dict[str, list[int]] | None = None
+        self._line_starts: list[int] | None = None
+
+    @property
+    def searched(self) -> bool:
+        return self._definitions is not None
+
+    def definitions(self) -> dict[str, list[int]]:
+        """Line numbers of the definitions of each name."""
+        if self._definitions is None:
+            self._definitions = {}
+            for number, line in enumerate(self.lines, start=1):
+                name = symbol_name(self.patterns, line)
+                if name is not None:
+                    self._definitions.setdefault(name, []).append(number)
+        return self._definitions
+
+    def line_number(self, offset: int) -> int:
+        if self._line_starts is None:
+            self._line_starts = [0]
+            self._line_starts.extend(
+                match.end() for match in re.finditer("\n", self.text)
+            )
+        return bisect_right(self._line_starts, offset)
+
+
+@dataclass
+class _Source:
+    """A staged file and where the diff changes it."""
+
+    path: str
+    blob: _Blob
+    # Line numbers of added lines, which the diff already shows
+    added: set[int] = field(default_factory=set)
+    # Line number and text of the first line of each run of changes
+    changes: list[tuple[int, str]] = field(default_factory=list)
+    # Names defined on changed lines
+    changed_names: list[str] = field(default_factory=list)
+    # Identifiers on added lines
+    used_names: list[str] = field(default_factory=list)
+
+
+# A snippet of unchanged code: path, first line number and lines
+_Snippet = tuple[str, int, list[str]]
+
+
+class ContextBuilder:
+    """
+    Describe the unchanged code around the staged changes.
+
+    Files are read from the index through a single `git cat-file --batch`
+    process, and parsed blobs are kept in an LRU cache so that building
+    context for several diffs of the same files (as `plan` does) reads and
+    parses each blob once.
+    """
+
+    def __init__(self, git: Git, max_cached_blobs: int = MAX_CACHED_BLOBS):
+        self.cat_file = git.cat_file()
+        self.max_cached_blobs = max_cached_blobs
+        self._blobs: OrderedDict[str, _Blob | None] = OrderedDict()
+
+    def build(
+        self,
+        files: Iterable[FileDiff],
+        max_tokens: int,
+        provider: str | None = None,
+    ) -> str:
+        """
+        Context for the given per-file diffs, within `max_tokens`: signatures
+        enclosing each change, definitions the added lines use and call sites of
+        changed definitions, in that order of priority.
+        """
+        max_chars = tokens_to_chars(max_tokens, provider)
+        files = [file for file in files if _has_context(file)]
+        sources: list[_Source] = []
+        enclosing: list[_Snippet] = []
+        enclosing_chars = 0
+        for start in range(0, len(files), READ_CHUNK):
+            if enclosing_chars >= max_chars:
+                break
+            chunk = files[start : start + READ_CHUNK]
+            self._read_blobs(chunk)
+            for file in chunk:
+                source = self._source(file)
+                if source is None:
+                    continue
+                sources.append(source)
+                snippets = _enclosing(source)
+                enclosing.extend(snippets)
+                enclosing_chars += sum(
+                    len(source.path) + len(line)
+                    for _, _, lines in snippets
+                    for line in lines
+                )
+        if not sources:
+            return ""
+
+        searched: list[_Source] = []
+        budget = MAX_SEARCHED_BYTES
+        for source in sources:
+            if not source.blob.searched:
+                if len(source.blob.text) > budget:
+                    continue
+                budget -= len(source.blob.text)
+            searched.append(source)
+
+        locations: dict[str, list[tuple[_Source, int]]] = {}
+        for source in searched:
+            for name, numbers in source.blob.definitions().items():
+                locations.setdefault(name, []).extend(
+                    (source, number) for number in numbers
+                )
+        sections = [
+            ("Definitions enclosing the changes", enclosing),
+            ("Definitions used by the changes", _used_definitions(sources, locations)),
+            ("Callers of changed definitions", _callers(sources, searched, locations)),
+        ]
+        return _render(sections, max_chars)
+
+    def close(self) -> None:
+        self.cat_file.close()
+
+    def __enter__(self) -> "ContextBuilder":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _source(self, file: FileDiff) -> _Source | None:
+        assert file.new_blob is not None
+        blob = self._blobs.get(file.new_blob)
+        if blob is None:
+            return None
+        patterns = blob.patterns
+
+        source = _Source(path=file.path, blob=blob)
+        for hunk in file.hunks:
+            match = _HUNK_RANGE.match(hunk[0])
+            if match is None:
+                continue
+            number = int(match.group(1))
+            # A hunk without new lines starts after the given line
+            if match.group(2) == "0":
+                number += 1
+            in_change = False
+            for line in hunk[1:]:
+                kind, text = line[:1], line[1:]
+                if kind == "\\":
+                    # `\ No newline at end of file`
+                    continue
+                if kind not in ("+", "-"):
+                    in_change = False
+                    number += 1
+                    continue
+                if not in_change:
+                    source.changes.append((number, text))
+                    in_change = True
+                name = symbol_name(patterns, text)
+                if name is not None:
+                    source.changed_names.append(name)
+                if kind == "+":
+                    source.added.add(number)
+                    source.used_names.extend(_IDENTIFIER.findall(text))
+                    number += 1
+        return source
+
+    def _read_blobs(self, files: list[FileDiff]) -> None:
+        """Read and parse the blobs not cached yet, all at once."""
+        patterns = {
+            file.new_blob: symbol_patterns(file.path)
+            for file in files
+            if file.new_blob is not None and file.new_blob not in self._blobs
+        }
+        names = list(patterns)
+        for name, content in zip(names, self.cat_file.read_many(names)):
+            self._blobs[name] = (
+                _Blob(content.decode("utf-8", errors="replace"), patterns[name])
+                if content is not None
+                and len(content) <= MAX_BLOB_BYTES
+                and b"\0" not in content[:8000]
+                else None
+            )
+        for file in files:
+            if file.new_blob in self._blobs:
+                self._blobs.move_to_end(file.new_blob)
+        while len(self._blobs) > self.max_cached_blobs:
+            self._blobs.popitem(last=False)
+
+
+def _has_context(file: FileDiff) -> bool:
+    # Added files are shown whole by the diff already
+    return (
+        bool(symbol_patterns(file.path))
+        and not file.summary_only
+        and bool(file.hunks)
+        and file.old_blob is not None
+        and file.new_blob is not None
+    )
+
+
+def _enclosing(source: _Source) -> list[_Snippet]:
+    lines = source.blob.lines
+    scopes: dict[int, None] = {}
+    for number, text in source.changes:
+        indent = _indent(text) if text.strip() else len(text) + 1
+        if indent == 0:
+            # Top-level lines have nothing enclosing them
+            continue
+        found: list[int] = []
+        for scope in range(number - 1, max(number - MAX_SCOPE_LINES, 1) - 1, -1):
+            line = lines[scope - 1] if scope <= len(lines) else ""
+            # Braces on a line of their own belong to the line above
+            if line.strip() in ("", "{"):
+                continue
+            if _indent(line) >= indent:
+                continue
+            indent = _indent(line)
+            if symbol_name(source.blob.patterns, line) is not None:
+                found.append(scope)
+            if indent == 0:
+                break
+        scopes.update((scope, None) for scope in reversed(found))
+    return [_signature(source, scope) for scope in scopes if scope not in source.added]
+
+
+def _used_definitions(
+    sources: list[_Source], locations: dict[str, list[tuple[_Source, int]]]
+) -> list[_Snippet]:
+    changed = {name for source in sources for name in source.changed_names}
+    snippets: list[_Snippet] = []
+    for source in sources:
+        for name in dict.fromkeys(source.used_names):
+            definitions = locations.get(name, [])
+            # Names defined more than once (e.g. methods of several classes)
+            # cannot be resolved without parsing
+            if name in changed or len(definitions) != 1:
+                continue
+            ((defined_in, number),) = definitions
+            if number not in defined_in.added:
+                snippets.append(_signature(defined_in, number))
+    return snippets
+
+
+def _callers(
+    sources: list[_Source],
+    searched: list[_Source],
+    locations: dict[str, list[tuple[_Source, int]]],
+) -> list[_Snippet]:
+    # Calls of names defined more than once may be calls of the others.
+    # Calls of a method through other objects (`items.append(...)`) are
+    # mostly calls of other types, so only calls on `self` or `this` next to
+    # the method count.
+    callers_in: dict[str, _Source | None] = {}
+    for source in sources:
+        for name in source.changed_names:
+            definitions = locations.get(name, [])
+            if name in callers_in or len(definitions) > 1:
+                continue
+            callers_in[name] = None
+            if definitions:
+                defined_in, number = definitions[0]
+                if _indent(defined_in.blob.lines[number - 1]) > 0:
+                    callers_in[name] = defined_in
+    names = list(callers_in)[:MAX_CALLED_NAMES]
+    if not names:
+        return []
+    call = re.compile(r"\b(%s)\s*\(" % "|".join(map(re.escape, names)))
+
+    snippets: list[_Snippet] = []
+    found: dict[str, int] = {}
+    for source in searched:
+        seen: set[int] = set()
+        for match in call.finditer(source.blob.text):
+            name = match.group(1)
+            number = source.blob.line_number(match.start())
+            method_of = callers_in[name]
+            receiver = source.blob.text[max(match.start() - 5, 0) : match.start()]
+            if method_of is not None and (
+                method_of is not source
+                or (
+                    receiver.endswith(".") and not receiver.endswith(("self.", "this."))
+                )
+            ):
+                continue
+            if (
+                found.get(name, 0) >= MAX_CALLERS
+                or number in seen
+                or number in source.added
+            ):
+                continue
+            line = source.blob.lines[number - 1]
+            if symbol_name(source.blob.patterns, line) == name:
+                continue
+            seen.add(number)
+            found[name] = found.get(name, 0) + 1
+            snippets.append((source.path, number, [line]))
+    return snippets
+
+
+def _signature(source: _Source, number: int) -> _Snippet:
+    """The definition on line `number`, up to where its parameters close."""
+    lines: list[str] = []
+    depth = 0
+    for line in source.blob.lines[number - 1 : number - 1 + MAX_SIGNATURE_LINES]:
+        lines.append(line)
+        depth += line.count("(") - line.count(")")
+        if depth <= 0:
+            break
+    return source.path, number, lines
+
+
+def _render(sections: list[tuple[str, list[_Snippet]]], max_chars: int) -> str:
+    """Render the snippets in order of priority until `max_chars` is used."""
+    output: list[str] = []
+    shown: set[tuple[str, int]] = set()
+    remaining = max_chars
+    for title, snippets in sections:
+        heading = f"# {title}"
+        section: list[str] = []
+        for path, number, lines in snippets:
+            if (path, number) in shown:
+                continue
+            text = "\n".join(
+                f"{path}:{number + offset}: {line.rstrip()[:MAX_LINE_CHARS]}"
+                for offset, line in enumerate(lines)
+            )
+            cost = len(text) + 1 + (0 if section else len(heading) + 1)
+            if cost > remaining:
+                continue
+            if not section:
+                section.append(heading)
+            section.append(text)
+            shown.add((path, number))
+            remaining -= cost
+        output.extend(section)
+    return "\n".join(output)
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
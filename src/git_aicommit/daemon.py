@@ -0,0 +1,535 @@
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from time import sleep, time
+from typing import TYPE_CHECKING, Any, Optional
+from git_aicommit.config import Config, config_fingerprint, load_config
+from git_aicommit.error import DaemonError
+
+if TYPE_CHECKING:
+    from git_aicommit.tasks import CancelScope
+
+
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+# How long the client waits for an auto-started daemon to accept connections
+STARTUP_TIMEOUT = 15.0
+# sizeof(struct xucred), returned for LOCAL_PEERCRED
+XUCRED_SIZE = 76
+# Longest response line the client reads, e.g. a batch of summaries
+MAX_RESPONSE_BYTES = 16 * 1024 * 1024
+# How often a running call checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.1
+
+# AI methods that may be called through the daemon
+METHODS = {
+    "generate_commit_message",
+    "generate_commit_message_from_summaries",
+    "summarize_diffs",
+}
+
+
+# Environment variables that change what providers do or where requests
+# go. A daemon started with other values is replaced, since the SDK clients
+# it keeps read them only once.
+ENVIRONMENT_PREFIXES = (
+    "OPENAI_",
+    "ANTHROPIC_",
+    "AWS_",
+    "GOOGLE_",
+    "GEMINI_",
+    "OLLAMA_",
+    "LANGSMITH_",
+    "LANGCHAIN_",
+    "GIT_AICOMMIT_",
+)
+ENVIRONMENT_NAMES = {
+    "HTTP_PROXY",
+    "HTTPS_PROXY",
+    "ALL_PROXY",
+    "NO_PROXY",
+    "SSL_CERT_FILE",
+    "SSL_CERT_DIR",
+    "REQUESTS_CA_BUNDLE",
+    "XDG_CONFIG_HOME",
+    "XDG_STATE_HOME",
+}
+
+
+def socket_path() -> Path:
+    """Per-user socket path, in XDG_RUNTIME_DIR when available."""
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        directory = Path(runtime_dir) / "git-aicommit"
+    else:
+        directory = Path(tempfile.gettempdir()) / f"git-aicommit-{os.getuid()}"
+    return directory / "daemon.sock"
+
+
+def secure_directory(directory: Path) -> None:
+    """
+    Create the socket directory, and refuse one that another user could
+    have prepared, e.g. in a shared /tmp.
+    """
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = directory.lstat()
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or stat.S_IMODE(info.st_mode) != 0o700
+    ):
+        raise DaemonError(
+            f"{directory} must be a directory owned by you with mode 0700"
+        )
+
+
+def environment_fingerprint() -> str:
+    """Hash of the relevant environment; values themselves are never sent."""
+    relevant = sorted(
+        (name, value)
+        for name, value in os.environ.items()
+        if name.upper().startswith(ENVIRONMENT_PREFIXES)
+        or name.upper() in ENVIRONMENT_NAMES
+    )
+    return hashlib.sha256(json.dumps(relevant).encode("utf-8")).hexdigest()[:16]
+
+
+def peer_uid(sock: socket.socket) -> Optional[int]:
+    """
+    User id of the process on the other end of a Unix socket, or `None`
+    where the platform does not tell (the directory permissions still apply).
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        # struct ucred { pid_t pid; uid_t uid; gid_t gid; }
+        credentials = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        return struct.unpack("3i", credentials)[1]
+    local_peercred = getattr(socket, "LOCAL_PEERCRED", None)
+    if local_peercred is not None:
+        # struct xucred { u_int cr_version; uid_t cr_uid; ... } on macOS/BSD
+        credentials = sock.getsockopt(0, local_peercred, XUCRED_SIZE)
+        return struct.unpack_from("2I", credentials)[1]
+    return None
+
+
+class DaemonClient:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or socket_path()
+
+    def request(
+        self,
+        payload: dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> dict[str, Any]:
+        secure_directory(self.path.parent)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(self.path))
+            if peer_uid(sock) not in (None, os.getuid()):
+                raise DaemonError(f"{self.path} is served by another user")
+            sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+            with sock.makefile("r", encoding="utf-8") as stream:
+                for line in stream:
+                    response = _response(line, on_token)
+                    if response is not None:
+                        return response
+        raise DaemonError("connection closed without a response")
+
+    async def arequest(
+        self,
+        payload: dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> dict[str, Any]:
+        """
+        `request` on an event loop. Cancelling it closes the connection,
+        which makes the daemon cancel the call it was running.
+        """
+        import asyncio
+
+        secure_directory(self.path.parent)
+        reader, writer = await asyncio.open_unix_connection(
+            str(self.path), limit=MAX_RESPONSE_BYTES
+        )
+        try:
+            if peer_uid(writer.get_extra_info("socket")) not in (None, os.getuid()):
+                raise DaemonError(f"{self.path} is served by another user")
+            writer.write(json.dumps(payload).encode("utf-8") + b"\n")
+            await writer.drain()
+            while line := await reader.readline():
+                response = _response(line.decode("utf-8"), on_token)
+                if response is not None:
+                    return response
+        finally:
+            writer.close()
+        raise DaemonError("connection closed without a response")
+
+    def ping(self) -> Optional[dict[str, Any]]:
+        try:
+            return self.request({"op": "ping"})
+        except (OSError, DaemonError):
+            return None
+
+    def ensure_running(self) -> None:
+        """
+        Start the daemon in the background unless it is already running with
+        the same environment, replacing one started from another.
+        """
+        secure_directory(self.path.parent)
+        status = self.ping()
+        if status is not None:
+            if status.get("environment") == environment_fingerprint():
+                return
+            self.stop()
+
+        subprocess.Popen(
+            [sys.executable, "-m", "git_aicommit.daemon"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            # Detach so the daemon outlives this process and its terminal
+            start_new_session=True,
+        )
+        deadline = time() + STARTUP_TIMEOUT
+        while time() < deadline:
+            if self.ping() is not None:
+                return
+            sleep(0.05)
+        raise DaemonError(f"did not start within {STARTUP_TIMEOUT:g}s")
+
+    def stop(self) -> None:
+        """Ask the daemon to exit and wait until it has released the socket."""
+        try:
+            self.request({"op": "shutdown"})
+        except (OSError, DaemonError):
+            return
+        deadline = time() + STARTUP_TIMEOUT
+        while self.path.exists() and time() < deadline:
+            sleep(0.05)
+
+
+def _response(
+    line: str, on_token: Optional[Callable[[str], None]]
+) -> Optional[dict[str, Any]]:
+    """The final response in a line from the daemon, or `None` for a token."""
+    response = json.loads(line)
+    if "token" in response:
+        if on_token is not None:
+            on_token(response["token"])
+        return None
+    if "error" in response:
+        raise DaemonError(response["error"])
+    return response
+
+
+class DaemonAI:
+    """
+    Drop-in replacement for `AI` that runs generations in the daemon.
+
+    Token usage and fallback decisions of the latest call on each thread are
+    available from `last_details`.
+    """
+
+    def __init__(self, client: DaemonClient, cwd: Path):
+        self.client = client
+        self.cwd = cwd
+        self._local = threading.local()
+
+    def generate_commit_message(
+        self,
+        recent_logs: list[str],
+        diff: str,
+        history: Sequence[tuple[str, str]],
+        user_instructions: Optional[str] = None,
+        language: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        return self._call(
+            "generate_commit_message",
+            {
+                "recent_logs": recent_logs,
+                "diff": diff,
+                "history": list(history),
+                "user_instructions": user_instructions,
+                "language": language,
+                # Left out unless set, for daemons started by older versions
+                **({"context": context} if context else {}),
+            },
+            on_token,
+        )
+
+    def generate_commit_message_from_summaries(
+        self,
+        recent_logs: list[str],
+        summaries: list[str],
+        history: Sequence[tuple[str, str]],
+        user_instructions: Optional[str] = None,
+        language: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        return self._call(
+            "generate_commit_message_from_summaries",
+            {
+                "recent_logs": recent_logs,
+                "summaries": summaries,
+                "history": list(history),
+                "user_instructions": user_instructions,
+                "language": language,
+            },
+            on_token,
+        )
+
+    def summarize_diffs(self, diffs: list[str], max_concurrency: int) -> list[str]:
+        return self._call(
+            "summarize_diffs", {"diffs": diffs, "max_concurrency": max_concurrency}
+        )
+
+    def last_details(self) -> tuple[list[dict[str, Any]], Optional[dict[str, Any]]]:
+        """Usage metadata and fallback decision of the latest call."""
+        return getattr(self._local, "details", ([], None))
+
+    def _call(
+        self,
+        method: str,
+        args: dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> Any:
+        from git_aicommit import tasks
+
+        payload = {
+            "op": "call",
+            "cwd": str(self.cwd),
+            "method": method,
+            "args": args,
+            "stream": on_token is not None,
+        }
+        response = tasks.run(lambda: self.client.arequest(payload, on_token))
+        self._local.details = (response["usage"], response.get("decision"))
+        return response["result"]
+
+
+class ProviderInfo:
+    """What the client needs to know about the provider the daemon uses."""
+
+    def __init__(self, config: Config):
+        self.name: str = config.provider
+        self.model_name: str = config.provider_config.model
+        self.concurrency: int = config.provider_config.concurrency
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, idle_timeout: float):
+        # Owner-only from the moment it exists, rather than after a chmod
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), _Handler)
+        finally:
+            os.umask(umask)
+        self.inode = path.stat().st_ino
+        self.environment = environment_fingerprint()
+        self.idle_timeout = idle_timeout
+        self.started_at = time()
+        self.last_activity = time()
+        self.active = 0
+        self.lock = threading.Lock()
+        self.entries_lock = threading.Lock()
+        # Loaded configs and providers, keyed by the config files they came from
+        self.entries: dict[tuple[tuple[str, int, int, int], ...], Any] = {}
+
+    def entry(self, cwd: Path) -> tuple[Config, Any, Any]:
+        from git_aicommit.ai import AI
+        from git_aicommit.provider import provider_from_config
+
+        fingerprint = config_fingerprint(cwd)
+        with self.entries_lock:
+            entry = self.entries.get(fingerprint)
+            if entry is None:
+                # Edited config files get a new fingerprint; drop stale entries
+                # for the same directory so their clients can be released
+                for key in [k for k in self.entries if k[0][0] == fingerprint[0][0]]:
+                    del self.entries[key]
+                config = load_config(cwd)
+                provider = provider_from_config(config)
+                entry = (
+                    config,
+                    provider,
+                    AI(
+                        model=provider.chat_model,
+                        prompt_cache=provider.prompt_cache,
+                        max_retries=provider.max_retries,
+                    ),
+                )
+                self.entries[fingerprint] = entry
+        return entry
+
+    def watch_idle(self) -> None:
+        while True:
+            sleep(min(self.idle_timeout, 5.0))
+            with self.lock:
+                idle = (
+                    self.active == 0 and time() - self.last_activity > self.idle_timeout
+                )
+            if idle:
+                self.shutdown()
+                return
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _Server  # type: ignore
+
+    def handle(self) -> None:
+        if peer_uid(self.connection) not in (None, os.getuid()):
+            return
+        with self.server.lock:
+            self.server.active += 1
+        try:
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                self.dispatch(json.loads(line))
+            except Exception as e:
+                self.send({"error": str(e) or type(e).__name__})
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+                self.server.last_activity = time()
+
+    def send(self, message: dict[str, Any]) -> None:
+        self.wfile.write(
+            json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        )
+        self.wfile.flush()
+
+    def dispatch(self, request: dict[str, Any]) -> None:
+        op = request.get("op")
+        if op == "ping":
+            self.send(
+                {
+                    "pid": os.getpid(),
+                    "uptime": time() - self.server.started_at,
+                    "configs": len(self.server.entries),
+                    "environment": self.server.environment,
+                }
+            )
+        elif op == "shutdown":
+            self.send({"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif op == "call":
+            self.call(request)
+        else:
+            raise ValueError(f"unknown operation: {op}")
+
+    def call(self, request: dict[str, Any]) -> None:
+        from langchain_core.callbacks import get_usage_metadata_callback
+        from git_aicommit.ai import tracing_context
+        from git_aicommit.fallback import recording_decisions
+        from git_aicommit.provider import FallbackProvider
+        from git_aicommit.tasks import CancelScope
+
+        method = request["method"]
+        if method not in METHODS:
+            raise ValueError(f"unknown method: {method}")
+        _, provider, ai = self.server.entry(Path(request["cwd"]))
+
+        args = dict(request["args"])
+        if "history" in args:
+            args["history"] = [tuple(message) for message in args["history"]]
+        if request.get("stream"):
+            args["on_token"] = lambda partial: self.send({"token": partial})
+
+        # A client that hung up, e.g. after Ctrl-C or a cancelled candidate,
+        # no longer wants the result; stop its requests instead of paying
+        # for them
+        scope = CancelScope()
+        finished = threading.Event()
+        threading.Thread(
+            target=self.watch_disconnect, args=(scope, finished), daemon=True
+        ).start()
+        try:
+            with (
+                scope.active(),
+                tracing_context(),
+                get_usage_metadata_callback() as usage_callback,
+                recording_decisions() as decisions,
+            ):
+                result = getattr(ai, method)(**args)
+        finally:
+            finished.set()
+
+        decision = (
+            decisions[-1]
+            if decisions and isinstance(provider, FallbackProvider)
+            else None
+        )
+        self.send(
+            {
+                "result": result,
+                "usage": list(usage_callback.usage_metadata.values()),
+                "decision": (
+                    {"backend": decision.backend, "notes": decision.notes}
+                    if decision is not None
+                    else None
+                ),
+            }
+        )
+
+    def watch_disconnect(self, scope: "CancelScope", finished: threading.Event) -> None:
+        """Cancel `scope` once the client closes the connection."""
+        import select
+
+        while not finished.is_set():
+            try:
+                readable, _, _ = select.select(
+                    [self.connection], [], [], DISCONNECT_POLL_SECONDS
+                )
+                # Clients send nothing after their request, so readable
+                # means the connection was closed
+                closed = bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+            except (OSError, ValueError):
+                # Reset by the client, or closed after the call finished
+                closed = True
+            if closed:
+                scope.cancel()
+                return
+
+
+def serve(
+    path: Optional[Path] = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT
+) -> None:
+    """Serve generation requests until idle for `idle_timeout` seconds."""
+    path = path or socket_path()
+    secure_directory(path.parent)
+    if path.exists():
+        if DaemonClient(path).ping() is not None:
+            # Another daemon won the race to start
+            return
+        path.unlink()
+
+    server = _Server(path, idle_timeout=idle_timeout)
+    try:
+        threading.Thread(target=server.watch_idle, daemon=True).start()
+        server.serve_forever()
+    finally:
+        server.server_close()
+        # A replacement may already be listening on the same path
+        try:
+            if path.stat().st_ino == server.inode:
+                path.unlink()
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,440 @@
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+
+# Rough characters-per-token ratios used to estimate prompt size without
+# loading a tokenizer for each provider.
+CHARS_PER_TOKEN: dict[str, float] = {
+    "aws-bedrock": 3.5,
+    "anthropic": 3.5,
+    "google-genai": 4.0,
+    "ollama": 3.5,
+    "openai": 4.0,
+}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+# Number of changed lines kept per hunk when a file has to be truncated.
+TRUNCATED_HUNK_LINES = 20
+
+
+@dataclass
+class FileDiff:
+    path: str
+    header: list[str] = field(default_factory=list)
+    hunks: list[list[str]] = field(default_factory=list)
+    additions: int = 0
+    deletions: int = 0
+    binary: bool = False
+    # Set when the hunks were dropped while parsing because the file alone
+    # exceeds the size limit.
+    oversized: bool = False
+    # Set for generated or vendored files that should only be summarized.
+    generated: bool = False
+    size: int = 0
+    # Length of the longest changed line, used to spot minified files.
+    longest_line: int = 0
+    # Source path of a rename or copy, and how similar the two files are
+    # in percent.
+    old_path: str | None = None
+    copied: bool = False
+    similarity: int | None = None
+    # Set by `old mode`/`new mode` lines, e.g. when a file became executable.
+    mode_changed: bool = False
+    # Abbreviated blob ids from the `index` line; `None` for added or
+    # deleted files on the respective side.
+    old_blob: str | None = None
+    new_blob: str | None = None
+    # Blob sizes in bytes, looked up for binary files only.
+    old_size: int | None = None
+    new_size: int | None = None
+
+    @property
+    def summary_only(self) -> bool:
+        return self.binary or self.oversized or self.generated
+
+    @property
+    def pure_rename(self) -> bool:
+        """Renamed or copied without any content or mode change."""
+        return (
+            self.old_path is not None
+            and self.similarity == 100
+            and not self.hunks
+            and not self.mode_changed
+        )
+
+    def render(self) -> str:
+        lines = list(self.header)
+        for hunk in self.hunks:
+            lines.extend(hunk)
+        return "\n".join(lines)
+
+    def render_truncated(self) -> str:
+        """Render the file with context lines removed and long hunks cut short."""
+        lines = list(self.header)
+        for hunk in self.hunks:
+            changed = [line for line in hunk[1:] if line[:1] in ("+", "-")]
+            lines.append(hunk[0])
+            lines.extend(changed[:TRUNCATED_HUNK_LINES])
+            if len(changed) > TRUNCATED_HUNK_LINES:
+                lines.append(
+                    f"... ({len(changed) - TRUNCATED_HUNK_LINES} more changed lines)"
+                )
+        return "\n".join(lines)
+
+    def render_summary(self) -> str:
+        if self.binary:
+            if self.old_size is not None and self.new_size is not None:
+                change = self.new_size - self.old_size
+                return (
+                    f"# {self.path}: binary file changed, {format_size(self.old_size)}"
+                    f" -> {format_size(self.new_size)} ({'+' if change >= 0 else '-'}"
+                    f"{format_size(abs(change))})"
+                )
+            if self.new_size is not None:
+                return f"# {self.path}: binary file added, {format_size(self.new_size)}"
+            if self.old_size is not None:
+                return (
+                    f"# {self.path}: binary file deleted, {format_size(self.old_size)}"
+                )
+            return f"# {self.path}: binary file changed (diff omitted)"
+        if self.generated:
+            return f"# {self.path}: generated file, +{self.additions} -{self.deletions} (diff omitted)"
+        return f"# {self.path}: +{self.additions} -{self.deletions} (diff omitted)"
+
+
+@dataclass
+class CompactDiff:
+    text: str
+    truncated_files: list[str]
+    summarized_files: list[str]
+
+    @property
+    def elided(self) -> bool:
+        return bool(self.truncated_files or self.summarized_files)
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+
+def estimate_tokens(text: str, provider: str | None = None) -> int:
+    ratio = CHARS_PER_TOKEN.get(provider or "", DEFAULT_CHARS_PER_TOKEN)
+    return int(len(text) / ratio) + 1
+
+
+def tokens_to_chars(tokens: int, provider: str | None = None) -> int:
+    ratio = CHARS_PER_TOKEN.get(provider or "", DEFAULT_CHARS_PER_TOKEN)
+    return int(tokens * ratio)
+
+
+def parse_diff(
+    lines: Iterable[str], max_file_chars: int | None = None
+) -> Iterator[FileDiff]:
+    """
+    Parse unified diff output into per-file diffs.
+
+    Args:
+        lines: Lines of `git diff` output without trailing newlines.
+        max_file_chars: Once a file grows past this size its hunks are dropped
+            and only the line counts are kept, bounding memory per file.
+
+    Yields:
+        FileDiff for each file in the order they appear in the diff.
+    """
+    current: FileDiff | None = None
+    hunk: list[str] | None = None
+
+    for line in lines:
+        if line.startswith("diff --git "):
+            if current is not None:
+                yield current
+            path = _header_path(line[len("diff --git ") :])
+            current = FileDiff(path=path, header=[line], size=len(line) + 1)
+            hunk = None
+            continue
+
+        if current is None:
+            continue
+
+        if line.startswith("@@"):
+            hunk = [line]
+            if not current.oversized:
+                current.hunks.append(hunk)
+        elif hunk is None:
+            if line.startswith("Binary files ") or line == "GIT binary patch":
+                current.binary = True
+            elif line.startswith(("rename from ", "copy from ")):
+                current.old_path = _unquote_path(line.split(" ", 2)[2])
+                current.copied = line.startswith("copy")
+            elif line.startswith(("rename to ", "copy to ")):
+                current.path = _unquote_path(line.split(" ", 2)[2])
+            elif line.startswith("+++ ") and line != "+++ /dev/null":
+                # git appends a tab to names that contain spaces
+                current.path = _unquote_path(line[4:].rstrip("\t"))[2:]
+            elif line.startswith(("old mode ", "new mode ")):
+                current.mode_changed = True
+            elif line.startswith("similarity index "):
+                current.similarity = int(line[len("similarity index ") :].rstrip("%"))
+            elif line.startswith("index "):
+                # `index <old>..<new> [<mode>]`
+                old_blob, _, new_blob = line.split(" ")[1].partition("..")
+                current.old_blob = old_blob if old_blob.strip("0") else None
+                current.new_blob = new_blob if new_blob.strip("0") else None
+            current.header.append(line)
+        else:
+            if line.startswith("+"):
+                current.additions += 1
+                current.longest_line = max(current.longest_line, len(line) - 1)
+            elif line.startswith("-"):
+                current.deletions += 1
+                current.longest_line = max(current.longest_line, len(line) - 1)
+            if not current.oversized:
+                hunk.append(line)
+
+        current.size += len(line) + 1
+        if (
+            max_file_chars is not None
+            and not current.oversized
+            and current.size > max_file_chars
+        ):
+            current.oversized = True
+            current.hunks = []
+
+    if current is not None:
+        yield current
+
+
+def _header_path(names: str) -> str:
+    """
+    The new path from the `a/<old> b/<new>` part of a `diff --git` line.
+
+    Both names are equal unless the file was renamed or copied, in which case
+    the `rename to`/`copy to` line that follows is used instead.
+    """
+    if names.endswith('"'):
+        return _unquote_path(names[names.rfind(' "b/') + 1 :])[2:]
+    length = (len(names) - len("a/ b/")) // 2
+    if names[2 : length + 2] == names[length + 5 :]:
+        return names[length + 5 :]
+    return names.split(" b/", 1)[-1]
+
+
+# Escapes git uses in quoted path names, besides octal bytes
+_PATH_ESCAPES = {
+    "a": 7,
+    "b": 8,
+    "t": 9,
+    "n": 10,
+    "v": 11,
+    "f": 12,
+    "r": 13,
+    '"': 34,
+    "\\": 92,
+}
+
+
+def _unquote_path(path: str) -> str:
+    """Undo the C-style quoting git applies to names with unusual characters."""
+    if not (len(path) >= 2 and path.startswith('"') and path.endswith('"')):
+        return path
+    name = bytearray()
+    index = 1
+    while index < len(path) - 1:
+        char = path[index]
+        if char != "\\":
+            name += char.encode("utf-8")
+            index += 1
+        elif path[index + 1] in _PATH_ESCAPES:
+            name.append(_PATH_ESCAPES[path[index + 1]])
+            index += 2
+        else:
+            name.append(int(path[index + 1 : index + 4], 8))
+            index += 4
+    return name.decode("utf-8", errors="replace")
+
+
+def compact_diff(
+    files: Iterable[FileDiff],
+    max_tokens: int,
+    provider: str | None = None,
+) -> CompactDiff:
+    """
+    Fit per-file diffs into a token budget.
+
+    Small files are kept in full, larger ones lose their context lines, and
+    whatever still does not fit (including binary files) is reduced to a
+    one-line summary. The original file order is preserved.
+    """
+    files = list(files)
+    rendered: list[str] = []
+    costs: list[int] = []
+    for file in files:
+        if file.summary_only:
+            text = file.render_summary()
+        else:
+            text = file.render()
+        rendered.append(text)
+        costs.append(estimate_tokens(text, provider))
+
+    if sum(costs) <= max_tokens:
+        return CompactDiff(
+            text="\n".join(rendered),
+            truncated_files=[],
+            summarized_files=[file.path for file in files if file.summary_only],
+        )
+
+    # Every file is guaranteed at least its summary line; spend the remaining
+    # budget upgrading the cheapest files first.
+    summaries = [file.render_summary() for file in files]
+    summary_costs = [estimate_tokens(text, provider) for text in summaries]
+    remaining = max_tokens - sum(summary_costs)
+
+    if remaining < 0:
+        # Too many files even for one line each: list as many as fit and
+        # fold the rest into a single aggregate line.
+        output: list[str] = []
+        budget = max_tokens - estimate_tokens("# ... and 000000 more files", provider)
+        for index, text in enumerate(summaries):
+            if summary_costs[index] > budget:
+                rest = files[index:]
+                output.append(
+                    f"# ... and {len(rest)} more files "
+                    f"(+{sum(f.additions for f in rest)} -{sum(f.deletions for f in rest)})"
+                )
+                break
+            output.append(text)
+            budget -= summary_costs[index]
+        return CompactDiff(
+            text="\n".join(output),
+            truncated_files=[],
+            summarized_files=[file.path for file in files],
+        )
+
+    output = list(summaries)
+    truncated: set[int] = set()
+    upgraded: set[int] = set()
+    for index in sorted(range(len(files)), key=lambda i: costs[i]):
+        file = files[index]
+        if file.summary_only:
+            continue
+        extra = costs[index] - summary_costs[index]
+        if extra <= remaining:
+            output[index] = rendered[index]
+            remaining -= extra
+            upgraded.add(index)
+            continue
+        text = file.render_truncated()
+        extra = estimate_tokens(text, provider) - summary_costs[index]
+        if extra <= remaining:
+            output[index] = text
+            remaining -= extra
+            upgraded.add(index)
+            truncated.add(index)
+
+    return CompactDiff(
+        text="\n".join(output),
+        truncated_files=[files[i].path for i in sorted(truncated)],
+        summarized_files=[
+            files[i].path for i in range(len(files)) if i not in upgraded
+        ],
+    )
+
+
+def group_files(
+    files: Iterable[FileDiff],
+    max_tokens: int,
+    provider: str | None = None,
+) -> list[str]:
+    """
+    Pack per-file diffs into groups that each fit the token budget.
+
+    Files are kept whole and in diff order; a single file larger than the
+    budget is truncated, and binary, generated or oversized files are
+    summarized.
+    """
+    groups: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for file in files:
+        if file.summary_only:
+            text = file.render_summary()
+        else:
+            text = file.render()
+            if estimate_tokens(text, provider) > max_tokens:
+                text = file.render_truncated()
+            if estimate_tokens(text, provider) > max_tokens:
+                text = file.render_summary()
+        tokens = estimate_tokens(text, provider)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append("\n".join(current))
+    return groups
+
+
+def collapse_renames(files: Iterable[FileDiff]) -> list[FileDiff]:
+    """
+    Replace files renamed or copied without changes by one line per moved
+    directory. Files that were also edited or changed mode keep their entry.
+    """
+    files = list(files)
+    groups: dict[tuple[bool, str, str], list[FileDiff]] = {}
+    for file in files:
+        if file.pure_rename:
+            assert file.old_path is not None
+            old_prefix, new_prefix = _moved_prefixes(file.old_path, file.path)
+            groups.setdefault((file.copied, old_prefix, new_prefix), []).append(file)
+
+    result: list[FileDiff] = []
+    for file in files:
+        if not file.pure_rename:
+            result.append(file)
+            continue
+        assert file.old_path is not None
+        old_prefix, new_prefix = _moved_prefixes(file.old_path, file.path)
+        group = groups.get((file.copied, old_prefix, new_prefix))
+        if group is None or group[0] is not file:
+            continue
+        verb = "copied" if file.copied else "renamed"
+        if len(group) == 1:
+            line = f"# {file.old_path} -> {file.path}: {verb} without changes"
+            path = file.path
+        else:
+            path = f"{new_prefix or '.'}/"
+            line = (
+                f"# {old_prefix or '.'}/ -> {path}: "
+                f"{len(group)} files {verb} without changes"
+            )
+        result.append(
+            FileDiff(
+                path=path,
+                header=[line],
+                old_path=file.old_path,
+                copied=file.copied,
+                similarity=100,
+                size=len(line) + 1,
+            )
+        )
+    return result
+
+
+def _moved_prefixes(old_path: str, new_path: str) -> tuple[str, str]:
+    """Directories left over once the common trailing components are removed."""
+    old_parts, new_parts = old_path.split("/"), new_path.split("/")
+    common = 0
+    while (
+        common < min(len(old_parts), len(new_parts)) - 1
+        and old_parts[-1 - common] == new_parts[-1 - common]
+    ):
+        common += 1
+    if common == 0:
+        # The file name itself changed; the file forms its own group
+        return old_path, new_path
+    return "/".join(old_parts[:-common]), "/".join(new_parts[:-common])
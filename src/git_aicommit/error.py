@@ -23,6 +23,26 @@ def error_handle(func):
     return wrapper
 
 
+def hook_error_handle(func):
+    """
+    `error_handle` for commands run by git hooks: errors and interrupts are
+    reported, but never fail the git command that ran the hook.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except KeyboardInterrupt:
+            print("git-aicommit: Interrupted.", file=sys.stderr)
+            sys.exit(0)
+        except Exception as e:
+            print(f"git-aicommit: {e}", file=sys.stderr)
+            sys.exit(0)
+
+    return wrapper
+
+
 class AbortCommitError(Exception):
     def __init__(self):
         super().__init__("Aborted commit.")
@@ -34,6 +54,26 @@ class ConfigurationAlreadyExistsError(Exception):
         super().__init__(f"Configuration file already exists: {self.filepath}")
 
 
+class HookAlreadyExistsError(Exception):
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        super().__init__(
+            f"A hook not installed by git-aicommit already exists: {self.filepath}"
+        )
+
+
 class InvalidConfigurationError(Exception):
     def __init__(self, error_message: str):
         super().__init__(f"Invalid configuration: {error_message}")
+
+
+class GitCommandError(Exception):
+    def __init__(self, command: list[str], stderr: str):
+        self.command = command
+        self.stderr = stderr
+        super().__init__(f"`{' '.join(command)}` failed: {stderr.strip()}")
+
+
+class DaemonError(Exception):
+    def __init__(self, error_message: str):
+        super().__init__(f"Daemon: {error_message}")
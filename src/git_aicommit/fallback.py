@@ -0,0 +1,255 @@
+import asyncio
+import math
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    Sequence,
+)
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional, TypeVar, cast
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from git_aicommit import tasks
+
+
+T = TypeVar("T")
+
+# The first chunk of a streamed reply, if any, and the stream of the rest
+_Stream = tuple[Optional[AIMessageChunk], AsyncGenerator[AIMessageChunk, None]]
+
+
+@dataclass
+class Decision:
+    # Name of the backend whose response was used
+    backend: str
+    # What happened to the other backends, e.g. "openai timed out after 10s"
+    notes: list[str] = field(default_factory=list)
+    hedged: bool = False
+
+
+# Decisions of the requests made within `recording_decisions`. Requests run
+# as tasks on the event loop with a copy of the caller's context, so they
+# report into a shared list rather than setting a variable.
+_decisions: ContextVar[Optional[list[Decision]]] = ContextVar(
+    "fallback_decisions", default=None
+)
+
+
+@contextmanager
+def recording_decisions() -> Iterator[list[Decision]]:
+    """Collect the decisions of the requests made within, in order."""
+    decisions: list[Decision] = []
+    token = _decisions.set(decisions)
+    try:
+        yield decisions
+    finally:
+        _decisions.reset(token)
+
+
+async def race(
+    calls: Sequence[tuple[str, Callable[[], Awaitable[T]], Optional[float]]],
+    hedge_after: Optional[float] = None,
+    discard: Optional[Callable[[T], Awaitable[None]]] = None,
+) -> T:
+    """
+    Run `(name, call, timeout)` backends in order until one succeeds,
+    starting the next one on failure, timeout or after `hedge_after` seconds.
+    Losing backends are cancelled; results that tie with the winner go to
+    `discard`.
+    """
+    loop = asyncio.get_running_loop()
+    # Backends whose result is still awaited, with their index and deadline
+    running: dict[asyncio.Future[T], tuple[int, float]] = {}
+    notes: list[str] = []
+    hedged = False
+    launched_at = 0.0
+    next_index = 0
+    error: Optional[BaseException] = None
+
+    def launch() -> None:
+        nonlocal next_index, launched_at
+        index = next_index
+        next_index += 1
+        _, call, timeout = calls[index]
+        launched_at = loop.time()
+        deadline = launched_at + timeout if timeout is not None else math.inf
+        running[asyncio.ensure_future(call())] = (index, deadline)
+
+    try:
+        launch()
+        while running:
+            hedge_at = (
+                launched_at + hedge_after
+                if hedge_after is not None and next_index < len(calls)
+                else math.inf
+            )
+            deadline = min(*(deadline for _, deadline in running.values()), hedge_at)
+            done, _ = await asyncio.wait(
+                running,
+                timeout=max(deadline - loop.time(), 0)
+                if deadline != math.inf
+                else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                now = loop.time()
+                for task, (index, backend_deadline) in list(running.items()):
+                    if backend_deadline <= now:
+                        del running[task]
+                        task.cancel()
+                        name, _, timeout = calls[index]
+                        error = TimeoutError(f"{name} timed out after {timeout:g}s")
+                        notes.append(str(error))
+                if next_index < len(calls) and (not running or hedge_at <= now):
+                    if running:
+                        hedged = True
+                        notes.append(
+                            f"{calls[next_index - 1][0]} slower than {hedge_after:g}s, "
+                            f"hedged with {calls[next_index][0]}"
+                        )
+                    launch()
+                continue
+
+            # Successes first, should several backends finish together
+            for task in sorted(done, key=lambda task: task.exception() is not None):
+                index, _ = running.pop(task)
+                name = calls[index][0]
+                failure = task.exception()
+                if failure is None:
+                    decisions = _decisions.get()
+                    if decisions is not None:
+                        decisions.append(
+                            Decision(backend=name, notes=notes, hedged=hedged)
+                        )
+                    return task.result()
+                error = failure
+                notes.append(f"{name} failed: {failure}")
+            if not running and next_index < len(calls):
+                launch()
+    finally:
+        # The losers of a hedge, and everything when cancelled
+        for task in running:
+            task.cancel()
+            if (
+                discard is not None
+                and task.done()
+                and not task.cancelled()
+                and task.exception() is None
+            ):
+                await discard(task.result())
+
+    assert error is not None
+    raise error
+
+
+class FallbackChatModel(BaseChatModel):
+    """
+    Chat model that fails over between several backends, optionally hedging
+    slow requests by racing the next backend.
+    """
+
+    backends: list[BaseChatModel]
+    names: list[str]
+    timeouts: list[Optional[float]]
+    hedge_after: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fallback"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return tasks.run(lambda: self._agenerate(messages, stop, **kwargs))
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = await self._race(
+            lambda backend: lambda: backend.ainvoke(messages, stop=stop, **kwargs),
+            self.backends,
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        # Backends race to their first chunk; the rest of the reply then
+        # comes from the winner alone
+        def start(backend: BaseChatModel) -> Callable[[], Awaitable[_Stream]]:
+            async def first_chunk() -> _Stream:
+                stream = cast(
+                    AsyncGenerator[AIMessageChunk, None],
+                    backend.astream(messages, stop=stop, **kwargs),
+                )
+                try:
+                    return await anext(stream, None), stream
+                except BaseException:
+                    await stream.aclose()
+                    raise
+
+            return first_chunk
+
+        async def close(result: _Stream) -> None:
+            await result[1].aclose()
+
+        chunk, stream = await self._race(start, self.backends, discard=close)
+        try:
+            if chunk is not None:
+                yield ChatGenerationChunk(message=chunk)
+            async for chunk in stream:
+                yield ChatGenerationChunk(message=chunk)
+        finally:
+            await stream.aclose()
+
+    def with_structured_output(  # type: ignore[override]
+        self, schema: Any, *, include_raw: bool = False, **kwargs: Any
+    ) -> Runnable[LanguageModelInput, Any]:
+        runnables = [
+            backend.with_structured_output(schema, include_raw=include_raw, **kwargs)
+            for backend in self.backends
+        ]
+
+        async def ainvoke(input: LanguageModelInput, config: RunnableConfig) -> Any:
+            return await self._race(
+                lambda runnable: lambda: runnable.ainvoke(input, config), runnables
+            )
+
+        return RunnableLambda(
+            lambda input, config: tasks.run(lambda: ainvoke(input, config)),
+            afunc=ainvoke,
+        )
+
+    def _race(
+        self,
+        bind: Callable[[Any], Callable[[], Awaitable[T]]],
+        targets: list[Any],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> Awaitable[T]:
+        return race(
+            [
+                (name, bind(target), timeout)
+                for name, target, timeout in zip(self.names, targets, self.timeouts)
+            ],
+            hedge_after=self.hedge_after,
+            discard=discard,
+        )
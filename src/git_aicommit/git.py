@@ -1,47 +1,673 @@
-from git import Repo
+import subprocess
+import threading
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import time
+from typing import TYPE_CHECKING
+from git_aicommit.diff import FileDiff, collapse_renames, parse_diff
+from git_aicommit.error import GitCommandError
+
+if TYPE_CHECKING:
+    from git_aicommit.history import HistoryIndex
+
+
+# Lines longer than this (e.g. minified files) are cut while reading the diff
+MAX_DIFF_LINE_BYTES = 64 * 1024
+# Object names sent to `git cat-file --batch` at once; well below the 64 KiB
+# pipe buffer
+CAT_FILE_CHUNK = 256
+
+
+@dataclass
+class FileStat:
+    path: str
+    # `None` for binary files
+    additions: int | None
+    deletions: int | None
+
+
+@dataclass
+class LogEntry:
+    hash: str
+    # Committer timestamp
+    time: int
+    message: str
+    paths: list[str] = field(default_factory=list)
+
+
+class DiffStream:
+    """
+    Lines of a running `git diff` process, read incrementally.
+
+    Reading stops once `max_bytes` of output has been consumed, at which
+    point the process is killed and `truncated` is set.
+    """
+
+    def __init__(self, process: subprocess.Popen[bytes], max_bytes: int | None):
+        self.process = process
+        self.max_bytes = max_bytes
+        self.truncated = False
+
+    def __iter__(self) -> Generator[str, None, None]:
+        assert self.process.stdout is not None
+        stdout = self.process.stdout
+        read_bytes = 0
+        try:
+            while True:
+                line = stdout.readline(MAX_DIFF_LINE_BYTES)
+                if not line:
+                    break
+                read_bytes += len(line)
+                if not line.endswith(b"\n"):
+                    # Skip the rest of an overlong line
+                    while (rest := stdout.readline(MAX_DIFF_LINE_BYTES)) and (
+                        not rest.endswith(b"\n")
+                    ):
+                        read_bytes += len(rest)
+                    read_bytes += len(rest)
+                if self.max_bytes is not None and read_bytes > self.max_bytes:
+                    self.truncated = True
+                    break
+                yield line.rstrip(b"\n").decode("utf-8", errors="replace")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+        _, stderr = self.process.communicate()
+        if not self.truncated and self.process.returncode not in (0, -9):
+            raise GitCommandError(
+                [str(arg) for arg in self.process.args],  # type: ignore
+                stderr.decode("utf-8", errors="replace"),
+            )
+
+
+class CatFile:
+    """
+    A long-running `git cat-file --batch` process.
+
+    Objects are requested over its stdin, so reading many blobs costs one
+    process instead of one per blob.
+    """
+
+    def __init__(self, path: Path):
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._lock = threading.Lock()
+
+    def read(self, name: str) -> bytes | None:
+        """Contents of the named object, or `None` if it does not exist."""
+        return self.read_many([name])[0]
+
+    def read_many(self, names: list[str]) -> list[bytes | None]:
+        """
+        Contents of the named objects, in order.
+
+        Requests are written in chunks ahead of the replies, which saves a
+        round trip per object. Chunks stay small enough for the pipe buffer,
+        so writing never waits for git to be read from.
+        """
+        contents: list[bytes | None] = []
+        with self._lock:
+            for start in range(0, len(names), CAT_FILE_CHUNK):
+                chunk = names[start : start + CAT_FILE_CHUNK]
+                self._write("".join(f"{name}\n" for name in chunk))
+                contents.extend(self._read_object() for _ in chunk)
+        return contents
+
+    def close(self) -> None:
+        if self.process.stdin is not None:
+            self.process.stdin.close()
+        self.process.wait()
+
+    def __enter__(self) -> "CatFile":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _write(self, requests: str) -> None:
+        assert self.process.stdin is not None
+        try:
+            self.process.stdin.write(requests.encode("utf-8"))
+            self.process.stdin.flush()
+        except OSError as e:
+            raise GitCommandError(["git", "cat-file", "--batch"], str(e))
+
+    def _read_object(self) -> bytes | None:
+        assert self.process.stdout is not None
+        # `<oid> <type> <size>`, or `<name> missing` / `<name> ambiguous`
+        header = self.process.stdout.readline().split()
+        if not header:
+            raise GitCommandError(
+                ["git", "cat-file", "--batch"], "unexpected end of output"
+            )
+        if len(header) != 3 or not header[2].isdigit():
+            return None
+        content = self.process.stdout.read(int(header[2]))
+        # Each object is followed by a newline
+        self.process.stdout.read(1)
+        return content
+
+
+@dataclass
+class StagedChanges:
+    files: list[FileStat]
+    diff_files: list[FileDiff]
+    # Whether the diff was cut short by the size or character limit
+    diff_truncated: bool
+    logs: list[str]
+    # Values of the requested gitattributes for each staged file
+    attributes: dict[str, dict[str, str]]
+    # Hash of the index written as a tree object
+    tree: str
+    # Wall-clock seconds spent on each git command
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def staged_files(self) -> list[str]:
+        return [file.path for file in self.files]
 
 
 class Git:
+    # Pin the diff format `parse_diff` relies on, whatever `core.quotePath`,
+    # `diff.noprefix`, `diff.mnemonicPrefix`, color or diff driver settings
+    # the user has
+    _DIFF_CONFIG = ["-c", "core.quotePath=false"]
+    _DIFF_FORMAT = ["--no-color", "--no-ext-diff", "--src-prefix=a/", "--dst-prefix=b/"]
+
     def __init__(self, path: str):
-        self.repo = Repo(path, search_parent_directories=True)
+        # A single call resolves both the work tree and the git directory
+        toplevel, git_dir = self._run(
+            ["rev-parse", "--show-toplevel", "--absolute-git-dir"], cwd=path
+        ).splitlines()
+        self.path = Path(toplevel)
+        self._git_dir = Path(git_dir)
+
+    @property
+    def git_dir(self) -> Path:
+        return self._git_dir
+
+    def collect(
+        self,
+        exclude_files: list[str],
+        max_log_count: int,
+        max_diff_bytes: int | None = None,
+        max_diff_chars: int | None = None,
+        max_file_chars: int | None = None,
+        attributes: list[str] | None = None,
+        history: "HistoryIndex | None" = None,
+        max_log_chars: int | None = None,
+        rename_similarity: int | None = None,
+    ) -> StagedChanges:
+        """
+        Collect everything needed to generate a commit message, running the
+        git commands concurrently and parsing the diff while it is read.
+
+        Args:
+            exclude_files: Pathspecs excluded from the diff.
+            max_log_count: Number of recent commit messages to read.
+            max_diff_bytes: Stop reading the diff after this many bytes.
+            max_diff_chars: Stop reading the diff once the files shown in full
+                add up to this many characters.
+            max_file_chars: Drop the hunks of files larger than this.
+            attributes: gitattributes to look up for every staged file.
+            history: Index to pick relevant commit messages from.
+            max_log_chars: Character budget for the messages from `history`.
+            rename_similarity: Minimum similarity in percent for renames.
+        """
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            numstat = pool.submit(
+                self._timed, self._numstat_args(exclude_files, rename_similarity)
+            )
+            diff = pool.submit(
+                self._timed_diff,
+                exclude_files,
+                max_diff_bytes,
+                max_diff_chars,
+                max_file_chars,
+                rename_similarity,
+            )
+            # Relevant logs depend on the staged paths and start after numstat
+            logs = (
+                pool.submit(self._timed_logs, max_log_count)
+                if history is None
+                else None
+            )
+            tree = pool.submit(self._timed, ["write-tree"])
+
+            numstat_output, numstat_seconds = numstat.result()
+            files = self._parse_numstat(numstat_output)
+            # Needs the staged paths, but can still overlap with the diff
+            check_attr = pool.submit(
+                self._timed_attributes,
+                [file.path for file in files],
+                attributes or [],
+            )
+            if logs is None:
+                assert history is not None
+                logs = pool.submit(
+                    self._timed_relevant_logs,
+                    history,
+                    [file.path for file in files],
+                    max_log_count,
+                    max_log_chars,
+                )
+
+            (diff_files, diff_truncated), diff_seconds = diff.result()
+            log_output, log_seconds = logs.result()
+            tree_output, tree_seconds = tree.result()
+            file_attributes, attributes_seconds = check_attr.result()
+
+        if diff_truncated:
+            # Files the diff never reached are summarized from numstat instead
+            seen = {file.path for file in diff_files}
+            diff_files += [
+                FileDiff(
+                    path=file.path,
+                    additions=file.additions or 0,
+                    deletions=file.deletions or 0,
+                    binary=file.additions is None,
+                    oversized=True,
+                )
+                for file in files
+                if file.path not in seen
+            ]
+
+        diff_files = collapse_renames(diff_files)
+
+        return StagedChanges(
+            files=files,
+            diff_files=diff_files,
+            diff_truncated=diff_truncated,
+            logs=log_output,
+            attributes=file_attributes,
+            tree=tree_output.strip(),
+            timings={
+                "numstat": numstat_seconds,
+                "diff": diff_seconds,
+                "logs": log_seconds,
+                "write-tree": tree_seconds,
+                "check-attr": attributes_seconds,
+            },
+        )
+
+    def git_path(self, path: str) -> Path:
+        """
+        Location of `path` in the git directory, following settings such as
+        `core.hooksPath` and `GIT_INDEX_FILE`.
+        """
+        return self.path / self._run(["rev-parse", "--git-path", path]).strip()
+
+    def write_tree(self) -> str:
+        """Write the index as a tree object and return its hash."""
+        return self._run(["write-tree"]).strip()
 
     def logs(self, max_count: int) -> list[str]:
-        return [
-            (
-                commit.message.strip()
-                if isinstance(commit.message, str)
-                else bytes(commit.message).decode("utf-8").strip()
+        try:
+            output = self._run(["log", "-z", "--format=%B", f"--max-count={max_count}"])
+        except GitCommandError:
+            # A repository without commits has no HEAD to read logs from
+            if self._run(["rev-parse", "-q", "--verify", "HEAD"], check=False):
+                raise
+            return []
+        return [log.strip() for log in output.split("\0") if log.strip()]
+
+    def head(self) -> str | None:
+        """Hash of HEAD, or `None` in a repository without commits."""
+        return (
+            self._run(["rev-parse", "-q", "--verify", "HEAD"], check=False).strip()
+            or None
+        )
+
+    def is_commit(self, revision: str) -> bool:
+        return bool(
+            self._run(
+                ["rev-parse", "-q", "--verify", f"{revision}^{{commit}}"], check=False
             )
-            for commit in self.repo.iter_commits("HEAD", max_count=max_count)
-        ]
+        )
 
-    def staged_files(self, exclude_files: list[str]) -> list[str]:
-        return self.repo.git.execute(
+    def rev_list(self, revisions: list[str], max_count: int) -> list[str]:
+        return self._run(["rev-list", f"--max-count={max_count}", *revisions]).split()
+
+    def log_entries(self, revisions: list[str], max_count: int) -> list[LogEntry]:
+        """Messages and touched paths of non-merge commits, newest first."""
+        output = self._run(
             [
-                "git",
-                "diff",
-                "--staged",
+                "log",
+                "-z",
+                "--no-merges",
                 "--name-only",
-                *(f":(exclude){file}" for file in exclude_files),
-            ],
-            with_extended_output=False,
-            as_process=False,
-            stdout_as_string=True,
-        ).splitlines()
+                "--format=%x1e%H%x00%ct%x00%B",
+                f"--max-count={max_count}",
+                *revisions,
+            ]
+        )
+        # Each record is `<hash>\0<time>\0<message>\0\n<path>\0<path>\0...`
+        entries: list[LogEntry] = []
+        for record in output.split("\x1e"):
+            fields = record.split("\0")
+            if len(fields) < 3:
+                continue
+            entries.append(
+                LogEntry(
+                    hash=fields[0],
+                    time=int(fields[1]),
+                    message=fields[2].strip(),
+                    paths=[path.strip("\n") for path in fields[3:] if path.strip("\n")],
+                )
+            )
+        return entries
+
+    def relevant_logs(
+        self,
+        history: "HistoryIndex",
+        paths: list[str],
+        max_count: int,
+        max_chars: int | None = None,
+    ) -> list[str]:
+        """Commit messages from `history` relevant to `paths`."""
+        import sqlite3
 
-    def diff(self, exclude_files: list[str]) -> str:
-        return self.repo.git.execute(
+        try:
+            history.update(self)
+            return history.select(paths, max_count=max_count, max_chars=max_chars)
+        except (sqlite3.Error, OSError):
+            # An unusable index (e.g. a read-only git directory) only costs
+            # relevance
+            return self.logs(max_count=max_count)
+
+    def staged_patch(self, rename_similarity: int | None = None) -> str:
+        """
+        The staged changes as a patch that `apply_to_index` accepts,
+        including binary files.
+        """
+        return self._run(
             [
-                "git",
+                *self._DIFF_CONFIG,
                 "diff",
                 "--staged",
-                *(f":(exclude){file}" for file in exclude_files),
+                "--binary",
+                *self._DIFF_FORMAT,
+                *self._rename_args(rename_similarity),
             ],
-            with_extended_output=False,
-            as_process=False,
-            stdout_as_string=True,
+            # Keep non-UTF-8 content intact so the patch still applies
+            errors="surrogateescape",
         )
 
+    def apply_to_index(self, patch: str) -> None:
+        """Apply a patch to the index only, leaving the work tree alone."""
+        self._run(
+            ["apply", "--cached", "--whitespace=nowarn", "-"],
+            input=patch,
+            errors="surrogateescape",
+        )
+
+    def read_tree(self, tree: str | None) -> None:
+        """
+        Replace the index with `tree`, or empty it when `tree` is `None`.
+
+        The work tree is left alone; only stat information is refreshed.
+        """
+        self._run(["read-tree", tree] if tree is not None else ["read-tree", "--empty"])
+        self._run(["update-index", "-q", "--refresh"], check=False)
+
+    def staged_files(self, exclude_files: list[str]) -> list[str]:
+        return [
+            file.path
+            for file in self._parse_numstat(
+                self._run(self._numstat_args(exclude_files))
+            )
+        ]
+
+    def has_staged_changes(self, exclude_files: list[str]) -> bool:
+        """
+        Whether anything outside `exclude_files` is staged. Cheaper than
+        `staged_files`, since git stops at the first difference and skips
+        rename detection.
+        """
+        args = [
+            "diff",
+            "--staged",
+            "--quiet",
+            "--no-renames",
+            "--no-ext-diff",
+            *(f":(exclude){file}" for file in exclude_files),
+        ]
+        process = subprocess.run(["git", *args], cwd=self.path, capture_output=True)
+        if process.returncode not in (0, 1):
+            raise GitCommandError(
+                ["git", *args], process.stderr.decode("utf-8", errors="replace")
+            )
+        return process.returncode == 1
+
+    def iter_diff(
+        self,
+        exclude_files: list[str],
+        max_bytes: int | None = None,
+        rename_similarity: int | None = None,
+    ) -> DiffStream:
+        process = subprocess.Popen(
+            ["git", *self._diff_args(exclude_files, rename_similarity)],
+            cwd=self.path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        return DiffStream(process, max_bytes=max_bytes)
+
+    def check_attributes(
+        self, paths: list[str], attributes: list[str]
+    ) -> dict[str, dict[str, str]]:
+        """
+        Look up gitattributes as recorded in the index.
+
+        Values are `set`, `unset`, `unspecified` or the assigned string.
+        """
+        if not paths or not attributes:
+            return {}
+        process = subprocess.run(
+            ["git", "check-attr", "--cached", "-z", "--stdin", *attributes],
+            cwd=self.path,
+            input="\0".join(paths).encode("utf-8"),
+            capture_output=True,
+        )
+        if process.returncode != 0:
+            raise GitCommandError(
+                ["git", "check-attr", *attributes],
+                process.stderr.decode("utf-8", errors="replace"),
+            )
+        # Output is a sequence of `<path>\0<attribute>\0<value>\0` triples
+        fields = process.stdout.decode("utf-8", errors="replace").split("\0")
+        result: dict[str, dict[str, str]] = {}
+        for index in range(0, len(fields) - 2, 3):
+            path, attribute, value = fields[index : index + 3]
+            result.setdefault(path, {})[attribute] = value
+        return result
+
     def commit(self, message: str) -> None:
-        # NOTE: `self.repo.index.commit` does not support commit signing
-        self.repo.git.execute(["git", "commit", "-m", message], as_process=False)
+        # NOTE: Delegate to `git commit` so that hooks and commit signing apply
+        self._run(["commit", "-m", message])
+
+    def cat_file(self) -> CatFile:
+        return CatFile(self.path)
+
+    def blob_sizes(self, blobs: list[str]) -> dict[str, int]:
+        """Sizes in bytes of the given blobs; unknown ones are left out."""
+        if not blobs:
+            return {}
+        output = self._run(
+            ["cat-file", "--batch-check=%(objectsize) %(rest)"],
+            # `%(rest)` echoes the requested name, so abbreviated ids map back
+            input="".join(f"{blob} {blob}\n" for blob in blobs),
+        )
+        sizes: dict[str, int] = {}
+        for line in output.splitlines():
+            # Unknown objects are reported as `<name> missing` instead
+            size, _, blob = line.partition(" ")
+            if size.isdigit() and blob in blobs:
+                sizes[blob] = int(size)
+        return sizes
+
+    def _run(
+        self,
+        args: list[str],
+        cwd: str | Path | None = None,
+        check: bool = True,
+        input: str | None = None,
+        errors: str = "replace",
+    ) -> str:
+        process = subprocess.run(
+            ["git", *args],
+            cwd=cwd if cwd is not None else self.path,
+            capture_output=True,
+            input=input.encode("utf-8", errors=errors) if input is not None else None,
+        )
+        if check and process.returncode != 0:
+            raise GitCommandError(
+                ["git", *args], process.stderr.decode("utf-8", errors="replace")
+            )
+        return process.stdout.decode("utf-8", errors=errors)
+
+    def _timed(self, args: list[str]) -> tuple[str, float]:
+        start_time = time()
+        output = self._run(args)
+        return output, time() - start_time
+
+    def _timed_diff(
+        self,
+        exclude_files: list[str],
+        max_bytes: int | None,
+        max_chars: int | None,
+        max_file_chars: int | None,
+        rename_similarity: int | None,
+    ) -> tuple[tuple[list[FileDiff], bool], float]:
+        start_time = time()
+        stream = self.iter_diff(
+            exclude_files, max_bytes=max_bytes, rename_similarity=rename_similarity
+        )
+        lines = iter(stream)
+        files: list[FileDiff] = []
+        truncated = False
+        chars = 0
+        for file in parse_diff(lines, max_file_chars=max_file_chars):
+            files.append(file)
+            # Summaries and renames without changes take a line at most
+            if not file.summary_only and not file.pure_rename:
+                chars += file.size
+            if max_chars is not None and chars > max_chars:
+                # Stops `git diff`; the rest can only be summarized anyway
+                lines.close()
+                truncated = True
+                break
+        if stream.truncated:
+            # The last file was cut off midway
+            files = files[:-1]
+            truncated = True
+        # Binary files are summarized by how much their size changed
+        binaries = [file for file in files if file.binary]
+        sizes = self.blob_sizes(
+            [
+                blob
+                for file in binaries
+                for blob in (file.old_blob, file.new_blob)
+                if blob is not None
+            ]
+        )
+        for file in binaries:
+            if file.old_blob is not None:
+                file.old_size = sizes.get(file.old_blob)
+            if file.new_blob is not None:
+                file.new_size = sizes.get(file.new_blob)
+        return (files, truncated), time() - start_time
+
+    def _timed_attributes(
+        self, paths: list[str], attributes: list[str]
+    ) -> tuple[dict[str, dict[str, str]], float]:
+        start_time = time()
+        result = self.check_attributes(paths, attributes)
+        return result, time() - start_time
+
+    def _timed_logs(self, max_count: int) -> tuple[list[str], float]:
+        start_time = time()
+        logs = self.logs(max_count=max_count)
+        return logs, time() - start_time
+
+    def _timed_relevant_logs(
+        self,
+        history: "HistoryIndex",
+        paths: list[str],
+        max_count: int,
+        max_chars: int | None,
+    ) -> tuple[list[str], float]:
+        start_time = time()
+        logs = self.relevant_logs(history, paths, max_count, max_chars)
+        return logs, time() - start_time
+
+    @staticmethod
+    def _numstat_args(
+        exclude_files: list[str], rename_similarity: int | None = None
+    ) -> list[str]:
+        return [
+            "diff",
+            "--staged",
+            "--numstat",
+            "-z",
+            *Git._rename_args(rename_similarity),
+            *(f":(exclude){file}" for file in exclude_files),
+        ]
+
+    @staticmethod
+    def _diff_args(
+        exclude_files: list[str], rename_similarity: int | None = None
+    ) -> list[str]:
+        return [
+            *Git._DIFF_CONFIG,
+            "diff",
+            "--staged",
+            *Git._DIFF_FORMAT,
+            *Git._rename_args(rename_similarity),
+            *(f":(exclude){file}" for file in exclude_files),
+        ]
+
+    @staticmethod
+    def _rename_args(rename_similarity: int | None) -> list[str]:
+        # Without a threshold, git's own `diff.renames` setting applies
+        if rename_similarity is None:
+            return []
+        return [
+            f"--find-renames={rename_similarity}%",
+            f"--find-copies={rename_similarity}%",
+        ]
+
+    @staticmethod
+    def _parse_numstat(output: str) -> list[FileStat]:
+        # Each entry is `<added>\t<deleted>\t<path>\0`, or for renames and
+        # copies `<added>\t<deleted>\t\0<old path>\0<new path>\0`.
+        files: list[FileStat] = []
+        fields = output.split("\0")
+        index = 0
+        while index < len(fields):
+            entry = fields[index]
+            index += 1
+            if not entry:
+                continue
+            added, deleted, path = entry.split("\t", 2)
+            if not path:
+                path = fields[index + 1]
+                index += 2
+            files.append(
+                FileStat(
+                    path=path,
+                    additions=int(added) if added != "-" else None,
+                    deletions=int(deleted) if deleted != "-" else None,
+                )
+            )
+        return files
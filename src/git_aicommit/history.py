@@ -0,0 +1,214 @@
+import math
+import sqlite3
+from collections.abc import Iterable, Iterator
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Optional
+from git_aicommit.git import Git, LogEntry
+
+
+# Bump when the schema changes; older indexes are rebuilt from scratch
+SCHEMA_VERSION = 1
+# Most commits read per update. The first run on a large repository, and a
+# run after HEAD moved further than this, index the most recent ones only,
+# so no run ever walks the whole history.
+INDEX_BATCH = 5000
+# Longer messages are cut when stored
+MAX_MESSAGE_CHARS = 2000
+# Commits touching more files only record the directories they touched
+MAX_PATHS_PER_COMMIT = 100
+# Candidate commits looked up per staged path or directory
+MAX_MATCHES_PER_TERM = 500
+
+
+def path_terms(paths: Iterable[str]) -> dict[str, float]:
+    """
+    Terms to look up for the given paths, with their weights.
+
+    A path matches commits that touched the same file most strongly, then
+    commits in the same directory, then commits in any parent directory.
+    Directories carry a trailing slash so they never collide with files.
+    """
+    terms: dict[str, float] = {}
+    for path in paths:
+        terms[path] = max(terms.get(path, 0.0), 3.0)
+        parts = path.split("/")[:-1]
+        for depth in range(len(parts), 0, -1):
+            directory = "/".join(parts[:depth]) + "/"
+            weight = 2.0 if depth == len(parts) else 1.0
+            terms[directory] = max(terms.get(directory, 0.0), weight)
+    return terms
+
+
+class HistoryIndex:
+    """
+    On-disk index of commit messages and the paths each commit touched.
+
+    The index lives in a SQLite database inside the git directory and is
+    updated incrementally from the last indexed HEAD, so selecting style
+    samples never has to walk the history of large repositories.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def head(self) -> Optional[str]:
+        """HEAD at the time of the latest update."""
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'head'").fetchone()
+        return row[0] if row is not None else None
+
+    def update(self, git: Git) -> int:
+        """Index the commits added since the latest update."""
+        head = git.head()
+        if head is None or head == (last := self.head()):
+            return 0
+        if last is not None and git.is_commit(last):
+            # Commits since the latest update, and those left behind by an
+            # amend, rebase or branch switch. One more than a batch is read
+            # to tell whether either goes beyond it.
+            entries = git.log_entries([head, "--not", last], max_count=INDEX_BATCH + 1)
+            if len(entries) <= INDEX_BATCH:
+                removed = git.rev_list([last, "--not", head], max_count=INDEX_BATCH + 1)
+                if len(removed) <= INDEX_BATCH:
+                    return self.add(entries, head, removed=removed)
+        # The history was never indexed, rewritten, or moved too far (e.g. to
+        # a diverged or orphan branch): only the most recent commits, and
+        # those already known are skipped while adding
+        return self.add(git.log_entries([head], max_count=INDEX_BATCH), head)
+
+    def add(
+        self, entries: Iterable[LogEntry], head: str, removed: Iterable[str] = ()
+    ) -> int:
+        """
+        Add commits, newest first, drop the `removed` ones and record `head`
+        as indexed.
+
+        Returns the number of commits that were not indexed yet.
+        """
+        rows = list(entries)
+        added = 0
+        with self._connect() as db:
+            for hash in removed:
+                db.execute(
+                    "DELETE FROM touches WHERE commit_id IN "
+                    "(SELECT id FROM commits WHERE hash = ?)",
+                    (hash,),
+                )
+                db.execute("DELETE FROM commits WHERE hash = ?", (hash,))
+            # Oldest first, so that row ids follow commit order
+            for entry in reversed(rows):
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO commits (hash, time, message) VALUES (?, ?, ?)",
+                    (entry.hash, entry.time, entry.message[:MAX_MESSAGE_CHARS]),
+                )
+                if cursor.rowcount == 0:
+                    continue
+                added += 1
+                db.executemany(
+                    "INSERT OR IGNORE INTO touches (path, commit_id) VALUES (?, ?)",
+                    [(term, cursor.lastrowid) for term in self._terms(entry.paths)],
+                )
+            db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('head', ?)", (head,)
+            )
+        return added
+
+    def select(
+        self, paths: list[str], max_count: int, max_chars: Optional[int] = None
+    ) -> list[str]:
+        """
+        Pick commit messages relevant to `paths` within a character budget.
+
+        Commits are ranked by how specifically they touched the same files
+        and directories, rarer paths counting more, with newer commits first
+        among equals. The most recent commits fill any remaining room, and
+        messages that do not fit are reduced to their subject line.
+        """
+        with self._connect() as db:
+            total = db.execute("SELECT COUNT(*) FROM commits").fetchone()[0]
+            if total == 0:
+                return []
+
+            scores: dict[int, float] = {}
+            for term, weight in path_terms(paths).items():
+                frequency = db.execute(
+                    "SELECT COUNT(*) FROM touches WHERE path = ?", (term,)
+                ).fetchone()[0]
+                if frequency == 0:
+                    continue
+                idf = math.log(1 + total / frequency)
+                for (commit_id,) in db.execute(
+                    "SELECT commit_id FROM touches WHERE path = ? "
+                    "ORDER BY commit_id DESC LIMIT ?",
+                    (term, MAX_MATCHES_PER_TERM),
+                ):
+                    scores[commit_id] = scores.get(commit_id, 0.0) + weight * idf
+
+            ranked = sorted(scores, key=lambda id: (scores[id], id), reverse=True)
+            recent = [
+                id
+                for (id,) in db.execute(
+                    "SELECT id FROM commits ORDER BY id DESC LIMIT ?", (max_count,)
+                )
+            ]
+
+            selected: dict[int, str] = {}
+            remaining = max_chars if max_chars is not None else math.inf
+            for commit_id in dict.fromkeys([*ranked, *recent]):
+                if len(selected) >= max_count:
+                    break
+                (message,) = db.execute(
+                    "SELECT message FROM commits WHERE id = ?", (commit_id,)
+                ).fetchone()
+                message = message.strip()
+                if len(message) > remaining:
+                    message = message.splitlines()[0] if message else ""
+                if not message or len(message) > remaining:
+                    continue
+                selected[commit_id] = message
+                remaining -= len(message)
+
+        # Newest first, like `git log`
+        return [selected[id] for id in sorted(selected, reverse=True)]
+
+    @staticmethod
+    def _terms(paths: list[str]) -> list[str]:
+        if len(paths) > MAX_PATHS_PER_COMMIT:
+            return [term for term in path_terms(paths) if term.endswith("/")]
+        return list(path_terms(paths))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.path, timeout=10)) as db:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._create(db)
+            # Commits on success, rolls back on errors
+            with db:
+                yield db
+
+    @staticmethod
+    def _create(db: sqlite3.Connection) -> None:
+        db.executescript(
+            f"""
+            DROP TABLE IF EXISTS meta;
+            DROP TABLE IF EXISTS commits;
+            DROP TABLE IF EXISTS touches;
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE commits (
+                id INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL UNIQUE,
+                time INTEGER NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE TABLE touches (
+                path TEXT NOT NULL,
+                commit_id INTEGER NOT NULL,
+                PRIMARY KEY (path, commit_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX touches_commit ON touches (commit_id);
+            PRAGMA user_version = {SCHEMA_VERSION};
+            """
+        )
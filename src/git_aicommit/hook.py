@@ -0,0 +1,172 @@
+import os
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic, sleep, time
+from git_aicommit.error import HookAlreadyExistsError
+from git_aicommit.git import Git
+
+
+# Identifies hooks written by `git aicommit hook install`
+HOOK_MARKER = "# Installed by git-aicommit"
+HOOK_SCRIPT = f"""#!/bin/sh
+{HOOK_MARKER}
+exec git aicommit hook run "$@"
+"""
+# Line below which `git commit -v` shows the diff
+SCISSORS = "# ------------------------ >8 ------------------------"
+# Seconds the index must stay unchanged before a message is generated
+DEBOUNCE_SECONDS = 1.0
+POLL_INTERVAL_SECONDS = 0.2
+# Longest time the hook waits for a message the watcher is generating
+# before it generates one itself
+MAX_PENDING_WAIT_SECONDS = 3.0
+# Older markers are left over, even if their process id has been reused
+MAX_PENDING_AGE_SECONDS = 600.0
+
+
+def hook_path(git: Git) -> Path:
+    return git.git_path("hooks/prepare-commit-msg")
+
+
+def install_hook(git: Git, force: bool = False) -> Path:
+    """Install the `prepare-commit-msg` hook, replacing only our own."""
+    path = hook_path(git)
+    if path.exists() and not force and not _is_ours(path):
+        raise HookAlreadyExistsError(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(HOOK_SCRIPT)
+    path.chmod(0o755)
+    return path
+
+
+def uninstall_hook(git: Git) -> Path | None:
+    """Remove the hook if we installed it, and return its path."""
+    path = hook_path(git)
+    if not path.exists() or not _is_ours(path):
+        return None
+    path.unlink()
+    return path
+
+
+def should_fill(source: str | None) -> bool:
+    """
+    Whether a commit with this message source needs a message.
+
+    Messages given with `-m`/`-F` and those of merges, squashes and amended
+    or reused commits are left alone.
+    """
+    return source in (None, "", "template")
+
+
+def fill_message_file(path: Path, message: str) -> bool:
+    """
+    Put `message` above the comments in the commit message file, unless the
+    file already holds a message (e.g. from a template). Returns whether the
+    file was written.
+    """
+    content = path.read_text(encoding="utf-8")
+    # With `git commit -v`, the diff follows a scissors line
+    head = content.split(SCISSORS, 1)[0]
+    if any(line.strip() and not line.startswith("#") for line in head.splitlines()):
+        return False
+    # Replaced in one step, so an interrupted hook never leaves it half written
+    temporary = path.with_name(f"{path.name}.aicommit-{os.getpid()}")
+    try:
+        temporary.write_text(f"{message}\n{content}", encoding="utf-8")
+        os.replace(temporary, path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+    return True
+
+
+@contextmanager
+def pending(directory: Path, tree: str) -> Iterator[None]:
+    """Mark that a message for `tree` is being generated."""
+    directory.mkdir(parents=True, exist_ok=True)
+    marker = directory / tree
+    marker.write_text(str(os.getpid()))
+    try:
+        yield
+    finally:
+        marker.unlink(missing_ok=True)
+
+
+def is_pending(directory: Path, tree: str) -> bool:
+    """Whether a running process is generating a message for `tree`."""
+    marker = directory / tree
+    try:
+        if time() - marker.stat().st_mtime >= MAX_PENDING_AGE_SECONDS:
+            return False
+        pid = int(marker.read_text())
+    except (OSError, ValueError):
+        return False
+    return _is_running(pid)
+
+
+def wait_pending(directory: Path, tree: str) -> None:
+    """
+    Wait until no message for `tree` is being generated anymore, or for
+    `MAX_PENDING_WAIT_SECONDS` at most.
+    """
+    deadline = monotonic() + MAX_PENDING_WAIT_SECONDS
+    while is_pending(directory, tree) and monotonic() < deadline:
+        sleep(POLL_INTERVAL_SECONDS)
+
+
+def watch_index(
+    index_path: Path,
+    on_settled: Callable[[], None],
+    debounce: float = DEBOUNCE_SECONDS,
+    poll_interval: float = POLL_INTERVAL_SECONDS,
+    stop: threading.Event | None = None,
+) -> None:
+    """
+    Call `on_settled` once at start and then whenever the index file has
+    stayed unchanged for `debounce` seconds after changing.
+
+    Every call runs on its own thread, so a slow generation never delays
+    noticing the next change; the callback is expected to check that its
+    result is still current before using it. Runs until `stop` is set.
+    """
+    stop = stop or threading.Event()
+    state = _stat(index_path)
+    changed_at = monotonic() - debounce
+    unhandled = True
+    while not stop.is_set():
+        current = _stat(index_path)
+        if current != state:
+            state, changed_at, unhandled = current, monotonic(), True
+        elif unhandled and monotonic() - changed_at >= debounce:
+            unhandled = False
+            threading.Thread(target=on_settled, daemon=True).start()
+        stop.wait(poll_interval)
+
+
+def _stat(path: Path) -> tuple[int, int, int] | None:
+    # git replaces the index by renaming a new file over it
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, but owned by another user
+        return True
+    return True
+
+
+def _is_ours(path: Path) -> bool:
+    try:
+        return HOOK_MARKER in path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return False
@@ -0,0 +1,14 @@
+import os
+from pathlib import Path
+
+
+def state_directory() -> Path:
+    """Per-user directory for data kept across runs, following the XDG spec."""
+    state_home = os.getenv("XDG_STATE_HOME") or Path.home() / ".local" / "state"
+    return Path(state_home) / "git-aicommit"
+
+
+def cache_directory() -> Path:
+    """Per-user directory for data that can be rebuilt, following the XDG spec."""
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "git-aicommit"
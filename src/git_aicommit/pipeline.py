@@ -0,0 +1,181 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+from git_aicommit.cache import cache_key
+from git_aicommit.classify import GENERATED_ATTRIBUTES, classify_files
+from git_aicommit.config import Config
+from git_aicommit.diff import (
+    CompactDiff,
+    FileDiff,
+    compact_diff,
+    group_files,
+    tokens_to_chars,
+)
+from git_aicommit.semantic import simplify_files
+
+if TYPE_CHECKING:
+    from git_aicommit.ai import AI
+    from git_aicommit.context import ContextBuilder
+    from git_aicommit.daemon import DaemonAI
+    from git_aicommit.git import Git, StagedChanges
+
+
+# How much more diff than `max-diff-tokens` is read, leaving room for what
+# simplifying and truncating files saves
+DIFF_READ_AHEAD = 4
+
+
+@dataclass
+class PreparedChanges:
+    """The staged changes in the form they are sent to the model."""
+
+    # Compacted diff, or `None` when the changes are summarized in groups
+    diff: Optional[CompactDiff]
+    # Diffs summarized one by one before the message is written; at least
+    # two when set
+    groups: list[str]
+    # Unchanged code around the changes, when `context-tokens` is set
+    context: Optional[str]
+
+
+def collect_changes(
+    git: "Git", config: Config, exclude_files: list[str], map_reduce: bool = False
+) -> "StagedChanges":
+    """
+    Read the staged changes. Unless they are summarized in groups, files
+    past what the diff budget could show are summarized from numstat
+    without reading their diff.
+    """
+    from git_aicommit.history import HistoryIndex
+
+    return git.collect(
+        exclude_files=exclude_files,
+        max_log_count=10,
+        max_diff_bytes=config.max_diff_bytes,
+        max_diff_chars=None
+        if map_reduce
+        else tokens_to_chars(config.max_diff_tokens, config.provider) * DIFF_READ_AHEAD,
+        max_file_chars=tokens_to_chars(
+            config.max_file_tokens or config.max_diff_tokens, config.provider
+        ),
+        attributes=GENERATED_ATTRIBUTES,
+        history=HistoryIndex(git.git_dir / "aicommit" / "history.sqlite3"),
+        max_log_chars=tokens_to_chars(config.max_log_tokens, config.provider),
+        rename_similarity=config.rename_similarity,
+    )
+
+
+def prepare_changes(
+    git: "Git",
+    files: list[FileDiff],
+    attributes: dict[str, dict[str, str]],
+    config: Config,
+    provider: str,
+    map_reduce: bool = False,
+    context_builder: "Optional[ContextBuilder]" = None,
+) -> PreparedChanges:
+    """
+    Turn parsed diffs into what the prompt holds: generated files are
+    summarized, the context is looked up, the diff is simplified and then
+    either compacted to the token budget or split into groups.
+
+    Pass `context_builder` to share its blob cache between several calls.
+    """
+    files = classify_files(files, attributes, config.generated_files)
+    context: Optional[str] = None
+    if config.context_tokens is not None:
+        from git_aicommit.context import ContextBuilder
+
+        # Built from the files before simplifying, which still have line
+        # numbers
+        if context_builder is not None:
+            context = context_builder.build(
+                files, max_tokens=config.context_tokens, provider=provider
+            )
+        else:
+            with ContextBuilder(git) as builder:
+                context = builder.build(
+                    files, max_tokens=config.context_tokens, provider=provider
+                )
+    if config.semantic_diff:
+        files = simplify_files(files)
+
+    groups = (
+        group_files(files, max_tokens=config.max_diff_tokens, provider=provider)
+        if map_reduce
+        else []
+    )
+    if len(groups) > 1:
+        return PreparedChanges(diff=None, groups=groups, context=context)
+    return PreparedChanges(
+        diff=compact_diff(files, max_tokens=config.max_diff_tokens, provider=provider),
+        groups=[],
+        context=context,
+    )
+
+
+def generate_message(
+    ai: "AI | DaemonAI",
+    prepared: PreparedChanges,
+    recent_logs: list[str],
+    user_instructions: Optional[str],
+    language: Optional[str],
+    max_concurrency: int,
+) -> str:
+    """
+    Generate one message without feedback, summarizing the groups first
+    with up to `max_concurrency` requests at once.
+    """
+    if prepared.diff is None:
+        return ai.generate_commit_message_from_summaries(
+            recent_logs=recent_logs,
+            summaries=ai.summarize_diffs(prepared.groups, max_concurrency),
+            history=[],
+            user_instructions=user_instructions,
+            language=language,
+        )
+    return ai.generate_commit_message(
+        recent_logs=recent_logs,
+        diff=prepared.diff.text,
+        history=[],
+        user_instructions=user_instructions,
+        language=language,
+        context=prepared.context,
+    )
+
+
+def message_cache_key(
+    config: Config,
+    tree: str,
+    exclude_files: list[str],
+    recent_logs: list[str],
+    user_instructions: Optional[str],
+    language: Optional[str],
+    map_reduce: bool,
+) -> str:
+    """Cache key covering everything that shapes the message for a staged tree."""
+    return cache_key(
+        tree=tree,
+        exclude_files=exclude_files,
+        recent_logs=recent_logs,
+        user_instructions=user_instructions,
+        language=language,
+        provider=config.provider,
+        # Settings that only change how requests are sent are left out
+        provider_config=config.provider_config.model_dump(
+            exclude={
+                "api_key",
+                "concurrency",
+                "max_retries",
+                "requests_per_minute",
+                "timeout",
+            }
+        ),
+        max_diff_tokens=config.max_diff_tokens,
+        max_diff_bytes=config.max_diff_bytes,
+        max_file_tokens=config.max_file_tokens,
+        rename_similarity=config.rename_similarity,
+        context_tokens=config.context_tokens,
+        generated_files=config.generated_files.model_dump(),
+        semantic_diff=config.semantic_diff,
+        map_reduce=map_reduce,
+    )
@@ -0,0 +1,345 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field, replace
+from git_aicommit.classify import matches
+from git_aicommit.diff import FileDiff
+from git_aicommit.git import Git
+
+
+# Affinity two hunks get from where they are, on top of the cosine
+# similarity of the identifiers they change
+SAME_FILE_AFFINITY = 0.4
+SAME_DIRECTORY_AFFINITY = 0.2
+SAME_MODULE_AFFINITY = 0.1
+# Hunks at least this close are proposed for the same commit
+LINK_THRESHOLD = 0.45
+# Identifiers changed in more hunks than this (e.g. `self`, `return`) say
+# nothing about how hunks relate, and would make the pair count quadratic
+MAX_TOKEN_HUNKS = 50
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+# Keywords of common languages and frequent English words, which would
+# otherwise link unrelated hunks in small diffs
+_STOPWORDS = frozenset(
+    """
+    and are async await bool break case catch char class const continue def
+    default del elif else enum except export extends false final finally fn
+    for from func function impl import int interface let match mut new none
+    not null pass private protected pub public return self static str string
+    struct super switch that the this throw true try type use var void while
+    with yield
+    """.split()
+)
+# Header lines of file patches that only apply as a whole
+_WHOLE_FILE_HEADERS = (
+    "new file mode",
+    "deleted file mode",
+    "old mode",
+    "rename from",
+    "copy from",
+)
+
+
+@dataclass
+class PlanUnit:
+    """A single hunk, or a whole file whose changes cannot be split."""
+
+    file: FileDiff
+    hunks: list[list[str]]
+    # Position in the staged diff
+    index: int
+    # Identifiers on changed lines; empty for excluded and binary files
+    tokens: set[str] = field(default_factory=set)
+    excluded: bool = False
+
+    @property
+    def changed_lines(self) -> int:
+        return sum(
+            1 for hunk in self.hunks for line in hunk[1:] if line[:1] in ("+", "-")
+        )
+
+
+@dataclass
+class CommitGroup:
+    """Units proposed to be committed together, in diff order."""
+
+    units: list[PlanUnit]
+
+    @property
+    def paths(self) -> list[str]:
+        return list(dict.fromkeys(unit.file.path for unit in self.units))
+
+    def diff_files(self) -> list[FileDiff]:
+        """Per-file diffs of this group only, with excluded files summarized."""
+        files: list[FileDiff] = []
+        for file, units in self._by_file():
+            hunks = [hunk for unit in units for hunk in unit.hunks]
+            lines = [line for hunk in hunks for line in hunk[1:]]
+            files.append(
+                replace(
+                    file,
+                    hunks=hunks,
+                    additions=sum(1 for line in lines if line.startswith("+")),
+                    deletions=sum(1 for line in lines if line.startswith("-")),
+                    generated=file.generated or units[0].excluded,
+                )
+            )
+        return files
+
+    def patch(self) -> str:
+        """A patch applying exactly the changes of this group."""
+        lines: list[str] = []
+        for file, units in self._by_file():
+            lines.extend(file.header)
+            for unit in units:
+                for hunk in unit.hunks:
+                    lines.extend(hunk)
+        return "\n".join(lines) + "\n"
+
+    def _by_file(self) -> list[tuple[FileDiff, list[PlanUnit]]]:
+        by_file: dict[int, tuple[FileDiff, list[PlanUnit]]] = {}
+        for unit in sorted(self.units, key=lambda unit: unit.index):
+            by_file.setdefault(id(unit.file), (unit.file, []))[1].append(unit)
+        return list(by_file.values())
+
+
+def split_units(files: Iterable[FileDiff], exclude_files: list[str]) -> list[PlanUnit]:
+    """
+    Split a parsed staged patch into units that can be committed on their
+    own: modified text files per hunk, anything else as a whole file.
+    """
+    units: list[PlanUnit] = []
+    for file in files:
+        excluded = any(matches(file.path, pattern) for pattern in exclude_files)
+        whole = (
+            file.binary
+            or not file.hunks
+            or any(line.startswith(_WHOLE_FILE_HEADERS) for line in file.header)
+        )
+        for hunks in [file.hunks] if whole else [[hunk] for hunk in file.hunks]:
+            units.append(
+                PlanUnit(
+                    file=file,
+                    hunks=hunks,
+                    index=len(units),
+                    tokens=set() if excluded else _tokens(hunks),
+                    excluded=excluded,
+                )
+            )
+    return units
+
+
+def cluster_units(units: list[PlanUnit], max_groups: int) -> list[CommitGroup]:
+    """
+    Group units into at most `max_groups` proposed commits, linking units
+    by location and by the identifiers they change (weighted by tf-idf).
+    """
+    if not units:
+        return []
+
+    frequency = Counter(token for unit in units for token in unit.tokens)
+    weights = {
+        token: math.log(1 + len(units) / count)
+        for token, count in frequency.items()
+        if count <= MAX_TOKEN_HUNKS
+    }
+    norms = [
+        math.sqrt(sum(weights.get(token, 0.0) ** 2 for token in unit.tokens))
+        for unit in units
+    ]
+    postings: dict[str, list[int]] = defaultdict(list)
+    for unit in units:
+        for token in unit.tokens:
+            if 1 < frequency[token] <= MAX_TOKEN_HUNKS:
+                postings[token].append(unit.index)
+    dots: dict[tuple[int, int], float] = defaultdict(float)
+    for token, indexes in postings.items():
+        weight = weights[token] ** 2
+        for position, a in enumerate(indexes):
+            for b in indexes[position + 1 :]:
+                dots[a, b] += weight
+
+    clusters = _Clusters(units)
+    for (a, b), dot in dots.items():
+        score = dot / (norms[a] * norms[b]) + _location_affinity(
+            units[a].file.path, units[b].file.path
+        )
+        clusters.score(a, b, score)
+        if score >= LINK_THRESHOLD:
+            clusters.union(a, b)
+
+    for unit in units:
+        if not unit.tokens and clusters.size(unit.index) == 1:
+            clusters.absorb(unit.index, by_location_only=True)
+    while clusters.count > max_groups:
+        clusters.absorb(clusters.smallest(), by_location_only=False)
+
+    return sorted(
+        (CommitGroup(members) for members in clusters.groups()),
+        key=lambda group: group.units[0].index,
+    )
+
+
+def apply_plan(git: Git, groups: list[CommitGroup], messages: list[str]) -> bool:
+    """
+    Commit the groups one after another with `git apply --cached`, leaving
+    the work tree untouched. After a failure the remaining changes are still
+    staged.
+
+    Returns whether every staged change was committed.
+    """
+    staged_tree = git.write_tree()
+    git.read_tree(git.head())
+    try:
+        for group, message in zip(groups, messages):
+            git.apply_to_index(group.patch())
+            git.commit(message)
+        return git.write_tree() == staged_tree
+    finally:
+        git.read_tree(staged_tree)
+
+
+def _tokens(hunks: list[list[str]]) -> set[str]:
+    return {
+        token
+        for hunk in hunks
+        for line in hunk[1:]
+        if line[:1] in ("+", "-")
+        for token in _IDENTIFIER.findall(line)
+        if token.lower() not in _STOPWORDS
+    }
+
+
+def _location_affinity(a: str, b: str) -> float:
+    if a == b:
+        return SAME_FILE_AFFINITY
+    a_parts, b_parts = a.split("/"), b.split("/")
+    if a_parts[:-1] == b_parts[:-1]:
+        return SAME_DIRECTORY_AFFINITY
+    if len(a_parts) > 1 and len(b_parts) > 1 and a_parts[0] == b_parts[0]:
+        return SAME_MODULE_AFFINITY
+    return 0.0
+
+
+class _Clusters:
+    """Union-find over units, tracking the affinity between clusters."""
+
+    def __init__(self, units: list[PlanUnit]):
+        self.units = units
+        self.parent = list(range(len(units)))
+        self.members: dict[int, list[int]] = {
+            unit.index: [unit.index] for unit in units
+        }
+        self.lines = {unit.index: unit.changed_lines for unit in units}
+        # Whether any member changes identifiers
+        self.featured = {unit.index: bool(unit.tokens) for unit in units}
+        self.affinity: dict[int, dict[int, float]] = defaultdict(dict)
+        # Clusters by the files, directories and modules they touch, and back
+        self.clusters_at: dict[str, set[int]] = defaultdict(set)
+        self.locations: dict[int, set[str]] = {}
+        for unit in units:
+            self.locations[unit.index] = set(self._locations(unit.file.path))
+            for location in self.locations[unit.index]:
+                self.clusters_at[location].add(unit.index)
+        self._by_size = [(lines, -index, index) for index, lines in self.lines.items()]
+        heapq.heapify(self._by_size)
+
+    @property
+    def count(self) -> int:
+        return len(self.members)
+
+    def find(self, index: int) -> int:
+        while self.parent[index] != index:
+            self.parent[index] = self.parent[self.parent[index]]
+            index = self.parent[index]
+        return index
+
+    def size(self, index: int) -> int:
+        return len(self.members[self.find(index)])
+
+    def score(self, a: int, b: int, score: float) -> None:
+        a, b = self.find(a), self.find(b)
+        if a != b and score > self.affinity[a].get(b, 0.0):
+            self.affinity[a][b] = self.affinity[b][a] = score
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.members[a] += self.members.pop(b)
+        self.lines[a] += self.lines.pop(b)
+        self.featured[a] = self.featured[a] or self.featured.pop(b)
+        for other, score in self.affinity.pop(b, {}).items():
+            del self.affinity[other][b]
+            if other != a:
+                self.score(a, other, score)
+        for location in self.locations.pop(b):
+            self.clusters_at[location].discard(b)
+            self.clusters_at[location].add(a)
+            self.locations[a].add(location)
+        heapq.heappush(self._by_size, (self.lines[a], -a, a))
+
+    def absorb(self, index: int, by_location_only: bool) -> None:
+        """
+        Merge the cluster of `index` into its closest one.
+
+        The closest cluster shares a file, else a directory, else a module,
+        with identifier affinity breaking ties. Clusters without identifiers
+        only join ones that have some. Unless `by_location_only`, the
+        cluster with the highest affinity overall is the fallback.
+        """
+        root = self.find(index)
+        featured_only = not self.featured[root]
+        for prefix in ("file:", "dir:", "module:"):
+            candidates = {
+                cluster
+                for location in self.locations[root]
+                if location.startswith(prefix)
+                for cluster in self.clusters_at[location]
+                if cluster != root and (self.featured[cluster] or not featured_only)
+            }
+            if candidates:
+                self.union(root, self._best(root, candidates))
+                return
+        if by_location_only:
+            return
+        others = [cluster for cluster in self.members if cluster != root]
+        if others:
+            self.union(root, self._best(root, others))
+
+    def smallest(self) -> int:
+        """The cluster with the fewest changed lines."""
+        while True:
+            lines, _, cluster = heapq.heappop(self._by_size)
+            # Entries of merged clusters, or from before a merge, are stale
+            if self.lines.get(cluster) == lines:
+                return cluster
+
+    def groups(self) -> list[list[PlanUnit]]:
+        return [
+            [self.units[member] for member in sorted(members)]
+            for members in self.members.values()
+        ]
+
+    def _best(self, root: int, candidates: Iterable[int]) -> int:
+        return max(
+            candidates,
+            key=lambda cluster: (
+                self.affinity[root].get(cluster, 0.0),
+                self.lines[cluster],
+                -cluster,
+            ),
+        )
+
+    @staticmethod
+    def _locations(path: str) -> tuple[str, str, str]:
+        parts = path.split("/")
+        directory = "/".join(parts[:-1])
+        module = parts[0] if len(parts) > 1 else ""
+        return f"file:{path}", f"dir:{directory}", f"module:{module}"
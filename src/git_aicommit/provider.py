@@ -1,123 +1,328 @@
-from typing import Protocol
+from typing import TYPE_CHECKING, Callable, Optional, Protocol
 from pydantic import SecretStr
-from langchain_core.language_models import BaseChatModel
-from langchain_aws import ChatBedrockConverse
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
 from git_aicommit.config import Config
 from git_aicommit.error import InvalidConfigurationError
 
+if TYPE_CHECKING:
+    from git_aicommit.ai import PromptCache
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.rate_limiters import BaseRateLimiter
+
 
 class Provider(Protocol):
     name: str
     model_name: str
-    chat_model: BaseChatModel
+    chat_model: "BaseChatModel"
+    # Maximum number of concurrent requests sent to the provider
+    concurrency: int
+    # Retries of rate-limited requests, on top of those of the SDK
+    max_retries: int
+    # Marker for provider-side prompt caching, if the API needs one
+    prompt_cache: "Optional[PromptCache]"
+
+
+# NOTE: Each factory imports its LangChain integration lazily so that only the
+# SDK of the selected provider is loaded.
+PROVIDERS: dict[str, Callable[[Config], Provider]] = {}
+
+
+def register_provider(name: str):
+    def decorator(factory: Callable[[Config], Provider]):
+        PROVIDERS[name] = factory
+        return factory
+
+    return decorator
 
 
 def provider_from_config(config: Config) -> Provider:
-    # Amazon Bedrock
-    if config.provider == "aws-bedrock":
-        assert config.aws_bedrock is not None
-        return AWSBedrockProvider(
-            model=config.aws_bedrock.model,
-            region=config.aws_bedrock.region,
-            temperature=config.aws_bedrock.temperature,
-        )
+    names = [config.provider, *(config.fallback.providers if config.fallback else [])]
+    providers: list[Provider] = []
+    for name in names:
+        factory = PROVIDERS.get(name)
+        if factory is None:
+            raise InvalidConfigurationError(f"Unsupported provider: {name}")
+        providers.append(factory(config))
 
-    # Anthropic
-    elif config.provider == "anthropic":
-        assert config.anthropic is not None
-        return AnthropicProvider(
-            model=config.anthropic.model,
-            api_key=config.anthropic.api_key,
-            temperature=config.anthropic.temperature,
-        )
+    timeouts = [getattr(config, name.replace("-", "_")).timeout for name in names]
+    if len(providers) == 1 and timeouts[0] is None:
+        return providers[0]
+    return FallbackProvider(
+        providers,
+        timeouts=timeouts,
+        hedge_after=config.fallback.hedge_after if config.fallback else None,
+    )
 
-    # Google GenAI
-    elif config.provider == "google-genai":
-        assert config.google_genai is not None
-        return GoogleGenAIProvider(
-            model=config.google_genai.model,
-            api_key=config.google_genai.api_key,
-            temperature=config.google_genai.temperature,
-        )
 
-    # Ollama
-    elif config.provider == "ollama":
-        assert config.ollama is not None
-        return OllamaProvider(
-            model=config.ollama.model,
-            base_url=config.ollama.base_url,
-            temperature=config.ollama.temperature,
-        )
+def _rate_limiter(
+    requests_per_minute: Optional[float], *key: str
+) -> "Optional[BaseRateLimiter]":
+    if requests_per_minute is None:
+        return None
+
+    from git_aicommit.ratelimit import rate_limit_key, rate_limiter
+
+    # NOTE: The limiter is shared by every request made with the same
+    # credentials and model, including those of other processes.
+    return rate_limiter(requests_per_minute, rate_limit_key(*key))
+
+
+# Amazon Bedrock
+@register_provider("aws-bedrock")
+def _aws_bedrock_from_config(config: Config) -> Provider:
+    assert config.aws_bedrock is not None
+    return AWSBedrockProvider(
+        model=config.aws_bedrock.model,
+        region=config.aws_bedrock.region,
+        temperature=config.aws_bedrock.temperature,
+        concurrency=config.aws_bedrock.concurrency,
+        max_retries=config.aws_bedrock.max_retries,
+        rate_limiter=_rate_limiter(
+            config.aws_bedrock.requests_per_minute,
+            "aws-bedrock",
+            config.aws_bedrock.region,
+            config.aws_bedrock.model,
+        ),
+    )
+
+
+# Anthropic
+@register_provider("anthropic")
+def _anthropic_from_config(config: Config) -> Provider:
+    assert config.anthropic is not None
+    return AnthropicProvider(
+        model=config.anthropic.model,
+        api_key=config.anthropic.api_key,
+        temperature=config.anthropic.temperature,
+        concurrency=config.anthropic.concurrency,
+        max_retries=config.anthropic.max_retries,
+        rate_limiter=_rate_limiter(
+            config.anthropic.requests_per_minute,
+            "anthropic",
+            config.anthropic.api_key.get_secret_value(),
+            config.anthropic.model,
+        ),
+    )
 
-    # OpenAI
-    elif config.provider == "openai":
-        assert config.openai is not None
-        return OpenAIProvider(
-            model=config.openai.model,
-            api_key=config.openai.api_key,
-            temperature=config.openai.temperature,
-        )
 
-    else:
-        raise InvalidConfigurationError(f"Unsupported provider: {config.provider}")
+# Google GenAI
+@register_provider("google-genai")
+def _google_genai_from_config(config: Config) -> Provider:
+    assert config.google_genai is not None
+    return GoogleGenAIProvider(
+        model=config.google_genai.model,
+        api_key=config.google_genai.api_key,
+        temperature=config.google_genai.temperature,
+        concurrency=config.google_genai.concurrency,
+        max_retries=config.google_genai.max_retries,
+        rate_limiter=_rate_limiter(
+            config.google_genai.requests_per_minute,
+            "google-genai",
+            config.google_genai.api_key.get_secret_value(),
+            config.google_genai.model,
+        ),
+    )
+
+
+# Ollama
+@register_provider("ollama")
+def _ollama_from_config(config: Config) -> Provider:
+    assert config.ollama is not None
+    return OllamaProvider(
+        model=config.ollama.model,
+        base_url=config.ollama.base_url,
+        temperature=config.ollama.temperature,
+        concurrency=config.ollama.concurrency,
+        max_retries=config.ollama.max_retries,
+        rate_limiter=_rate_limiter(
+            config.ollama.requests_per_minute,
+            "ollama",
+            config.ollama.base_url,
+            config.ollama.model,
+        ),
+    )
+
+
+# OpenAI
+@register_provider("openai")
+def _openai_from_config(config: Config) -> Provider:
+    assert config.openai is not None
+    return OpenAIProvider(
+        model=config.openai.model,
+        api_key=config.openai.api_key,
+        temperature=config.openai.temperature,
+        concurrency=config.openai.concurrency,
+        max_retries=config.openai.max_retries,
+        rate_limiter=_rate_limiter(
+            config.openai.requests_per_minute,
+            "openai",
+            config.openai.api_key.get_secret_value(),
+            config.openai.model,
+        ),
+    )
 
 
 class AWSBedrockProvider:
-    def __init__(self, model: str, region: str, temperature: float):
+    def __init__(
+        self,
+        model: str,
+        region: str,
+        temperature: float,
+        concurrency: int,
+        max_retries: int,
+        rate_limiter: "Optional[BaseRateLimiter]",
+    ):
+        from langchain_aws import ChatBedrockConverse
+
         self.name: str = "aws-bedrock"
         self.model_name: str = model
+        self.concurrency: int = concurrency
+        self.max_retries: int = max_retries
+        # NOTE: Only some Bedrock models accept cache points
+        self.prompt_cache: Optional[PromptCache] = (
+            "cache-point"
+            if any(family in model for family in ("anthropic.claude", "amazon.nova"))
+            else None
+        )
         self.chat_model: BaseChatModel = ChatBedrockConverse(
             model=model,
             region_name=region,
             temperature=temperature,
+            rate_limiter=rate_limiter,
         )
 
 
 class AnthropicProvider:
-    def __init__(self, model: str, api_key: SecretStr, temperature: float):
+    def __init__(
+        self,
+        model: str,
+        api_key: SecretStr,
+        temperature: float,
+        concurrency: int,
+        max_retries: int,
+        rate_limiter: "Optional[BaseRateLimiter]",
+    ):
+        from langchain_anthropic import ChatAnthropic
+
         self.name: str = "anthropic"
         self.model_name: str = model
+        self.concurrency: int = concurrency
+        self.max_retries: int = max_retries
+        self.prompt_cache: Optional[PromptCache] = "cache-control"
         self.chat_model: BaseChatModel = ChatAnthropic(
             model_name=model,
             api_key=api_key,
             temperature=temperature,
+            rate_limiter=rate_limiter,
             timeout=None,
             stop=None,
         )
 
 
 class GoogleGenAIProvider:
-    def __init__(self, model: str, api_key: SecretStr, temperature: float):
+    def __init__(
+        self,
+        model: str,
+        api_key: SecretStr,
+        temperature: float,
+        concurrency: int,
+        max_retries: int,
+        rate_limiter: "Optional[BaseRateLimiter]",
+    ):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         self.name: str = "google-genai"
         self.model_name: str = model
+        self.concurrency: int = concurrency
+        self.max_retries: int = max_retries
+        # NOTE: Repeated prompt prefixes are cached automatically
+        self.prompt_cache: Optional[PromptCache] = None
         self.chat_model: BaseChatModel = ChatGoogleGenerativeAI(
             model=model,
             google_api_key=api_key,
             temperature=temperature,
+            rate_limiter=rate_limiter,
         )
 
 
 class OllamaProvider:
-    def __init__(self, model: str, base_url: str, temperature: float):
+    def __init__(
+        self,
+        model: str,
+        base_url: str,
+        temperature: float,
+        concurrency: int,
+        max_retries: int,
+        rate_limiter: "Optional[BaseRateLimiter]",
+    ):
+        from langchain_ollama import ChatOllama
+
         self.name: str = "ollama"
         self.model_name: str = model
+        self.concurrency: int = concurrency
+        self.max_retries: int = max_retries
+        self.prompt_cache: Optional[PromptCache] = None
         self.chat_model: BaseChatModel = ChatOllama(
             model=model,
             base_url=base_url,
             temperature=temperature,
+            rate_limiter=rate_limiter,
         )
 
 
 class OpenAIProvider:
-    def __init__(self, model: str, api_key: SecretStr, temperature: float):
+    def __init__(
+        self,
+        model: str,
+        api_key: SecretStr,
+        temperature: float,
+        concurrency: int,
+        max_retries: int,
+        rate_limiter: "Optional[BaseRateLimiter]",
+    ):
+        from langchain_openai import ChatOpenAI
+
         self.name: str = "openai"
         self.model_name: str = model
+        self.concurrency: int = concurrency
+        self.max_retries: int = max_retries
+        # NOTE: Repeated prompt prefixes are cached automatically
+        self.prompt_cache: Optional[PromptCache] = None
         self.chat_model: BaseChatModel = ChatOpenAI(
             model=model,
             api_key=api_key,
             temperature=temperature,
+            rate_limiter=rate_limiter,
+        )
+
+
+class FallbackProvider:
+    """
+    Tries the primary provider first and fails over to the next ones on
+    errors or timeouts. Labels and limits follow the primary provider.
+    """
+
+    def __init__(
+        self,
+        providers: list[Provider],
+        timeouts: list[Optional[float]],
+        hedge_after: Optional[float],
+    ):
+        from git_aicommit.fallback import FallbackChatModel
+
+        primary = providers[0]
+        self.name: str = primary.name
+        self.model_name: str = primary.model_name
+        self.concurrency: int = primary.concurrency
+        self.max_retries: int = primary.max_retries
+        # NOTE: A cache marker is only sent if every backend understands it
+        self.prompt_cache: Optional[PromptCache] = (
+            primary.prompt_cache
+            if all(p.prompt_cache == primary.prompt_cache for p in providers)
+            else None
+        )
+        self.chat_model: BaseChatModel = FallbackChatModel(
+            backends=[provider.chat_model for provider in providers],
+            names=[f"{provider.name}/{provider.model_name}" for provider in providers],
+            timeouts=timeouts,
+            hedge_after=hedge_after,
         )
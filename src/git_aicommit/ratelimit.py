@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import random
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from time import sleep, time
+from typing import Any, Optional, TypeVar
+from langchain_core.rate_limiters import BaseRateLimiter, InMemoryRateLimiter
+from git_aicommit.paths import state_directory
+
+
+T = TypeVar("T")
+
+# Backoff for rate-limited requests without a usable Retry-After header
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+# Longer Retry-After values are capped; the request fails instead of
+# hanging for minutes
+MAX_RETRY_AFTER_SECONDS = 60.0
+# 429 Too Many Requests, 503 Service Unavailable, 529 Overloaded (Anthropic)
+RETRYABLE_STATUS_CODES = {429, 503, 529}
+# Error classes of SDKs that do not expose a status code
+_RETRYABLE_ERROR_NAMES = ("RateLimit", "Throttling", "ResourceExhausted")
+# Error codes sent with a 429 that no amount of waiting fixes, e.g. OpenAI's
+# for an exhausted billing quota
+NON_RETRYABLE_ERROR_CODES = {"insufficient_quota"}
+
+
+def rate_limit_path(key: str) -> Path:
+    return state_directory() / "rate-limits" / f"{key}.json"
+
+
+def rate_limit_key(*parts: str) -> str:
+    """Bucket name for an API key and model; the key itself is never stored."""
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class SharedRateLimiter(BaseRateLimiter):
+    """
+    Token bucket shared through a locked JSON file by every process using
+    it, falling back to this process only where the file cannot be used.
+    """
+
+    def __init__(
+        self, path: Path, requests_per_second: float, max_bucket_size: float = 1
+    ):
+        self.path = path
+        self.requests_per_second = requests_per_second
+        self.max_bucket_size = max_bucket_size
+        self._fallback = InMemoryRateLimiter(
+            requests_per_second=requests_per_second, max_bucket_size=max_bucket_size
+        )
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        try:
+            wait = self._reserve(blocking)
+        except OSError:
+            return self._fallback.acquire(blocking=blocking)
+        if wait is None:
+            return False
+        sleep(wait)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        try:
+            wait = self._reserve(blocking)
+        except OSError:
+            return await self._fallback.aacquire(blocking=blocking)
+        if wait is None:
+            return False
+        await _wait(wait)
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every process using the bucket, e.g. after a 429."""
+        try:
+            with self._state() as state:
+                state["blocked_until"] = max(
+                    state.get("blocked_until", 0.0), time() + seconds
+                )
+        except OSError:
+            pass
+
+    def _reserve(self, blocking: bool) -> Optional[float]:
+        """
+        Take a token and return how long to wait before using it, or `None`
+        if none is available right away and `blocking` is not set.
+        """
+        with self._state() as state:
+            now = time()
+            tokens = min(
+                self.max_bucket_size,
+                state.get("tokens", self.max_bucket_size)
+                + (now - state.get("updated_at", now)) * self.requests_per_second,
+            )
+            blocked = max(state.get("blocked_until", 0.0) - now, 0.0)
+            if not blocking and (tokens < 1 or blocked > 0):
+                return None
+            # The bucket may go negative; the deficit is the queue of waiters
+            tokens -= 1
+            state["tokens"], state["updated_at"] = tokens, now
+        return max(blocked, -tokens / self.requests_per_second if tokens < 0 else 0.0)
+
+    @contextmanager
+    def _state(self) -> Iterator[dict[str, Any]]:
+        import fcntl
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), "r+", encoding="utf-8") as f:
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+        finally:
+            # Closing the last descriptor releases the lock
+            os.close(fd)
+
+
+def rate_limiter(
+    requests_per_minute: Optional[float], key: str
+) -> Optional[BaseRateLimiter]:
+    if requests_per_minute is None:
+        return None
+    try:
+        import fcntl  # noqa: F401
+    except ImportError:
+        # Not available on Windows
+        return InMemoryRateLimiter(requests_per_second=requests_per_minute / 60)
+    return SharedRateLimiter(
+        rate_limit_path(key), requests_per_second=requests_per_minute / 60
+    )
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds to wait before retrying a rate-limited request, 0.0 if the
+    provider did not say, or `None` if the error is not worth retrying.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(
+        response, "status_code", None
+    )
+    headers = getattr(response, "headers", None)
+    if isinstance(response, dict):
+        # botocore's ClientError
+        metadata = response.get("ResponseMetadata", {})
+        status = metadata.get("HTTPStatusCode")
+        headers = metadata.get("HTTPHeaders")
+    if status is None and isinstance(getattr(error, "code", None), int):
+        # google-genai's APIError
+        status = getattr(error, "code")
+
+    if status not in RETRYABLE_STATUS_CODES and not any(
+        name in type(error).__name__ for name in _RETRYABLE_ERROR_NAMES
+    ):
+        return None
+    # openai's APIError keeps the `code` and `type` of the error body
+    if (
+        getattr(error, "code", None) in NON_RETRYABLE_ERROR_CODES
+        or getattr(error, "type", None) in NON_RETRYABLE_ERROR_CODES
+    ):
+        return None
+    if not headers:
+        return 0.0
+    try:
+        if "retry-after-ms" in headers:
+            return min(float(headers["retry-after-ms"]) / 1000, MAX_RETRY_AFTER_SECONDS)
+        value = headers.get("retry-after")
+        if value is None:
+            return 0.0
+        try:
+            seconds = float(value)
+        except ValueError:
+            # An HTTP date
+            seconds = (
+                parsedate_to_datetime(value) - datetime.now(timezone.utc)
+            ).total_seconds()
+    except (TypeError, ValueError):
+        return 0.0
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+async def call_with_retry(
+    call: Callable[[], Awaitable[T]],
+    max_retries: int,
+    rate_limiter: Optional[BaseRateLimiter] = None,
+) -> T:
+    """
+    Await `call`, retrying rate-limited and overloaded requests up to
+    `max_retries` times with jittered backoff or the provider's Retry-After.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is None or attempt >= max_retries:
+                raise
+        if delay > 0:
+            # Spread clients that were told the same time
+            delay += random.uniform(0, min(delay * 0.1, 1.0))
+        else:
+            backoff = min(BACKOFF_BASE_SECONDS * 2**attempt, BACKOFF_MAX_SECONDS)
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+        if isinstance(rate_limiter, SharedRateLimiter):
+            rate_limiter.pause(delay)
+        await _wait(delay)
+        attempt += 1
+
+
+async def _wait(seconds: float) -> None:
+    import asyncio
+
+    await asyncio.sleep(seconds)
@@ -0,0 +1,467 @@
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass, field, replace
+from itertools import groupby
+from pathlib import PurePosixPath
+from git_aicommit.diff import FileDiff
+
+
+# Context lines kept around each change; git emits three
+CONTEXT_LINES = 1
+# Shortest run of lines reported as moved rather than removed and added.
+# Shorter runs are as likely to be new code that repeats a few lines.
+MOVED_BLOCK_LINES = 8
+# Moved runs must carry at least this much non-whitespace text, so that
+# closing braces and blank lines are not taken for moved code
+MOVED_BLOCK_CHARS = 160
+# Symbols listed per file
+MAX_SYMBOLS = 15
+
+# Header lines that tell the model something; `index`, `---` and `+++` lines
+# only repeat the path or hold object ids
+_KEPT_HEADER_PREFIXES = (
+    "new file mode",
+    "deleted file mode",
+    "old mode",
+    "new mode",
+    "rename from",
+    "rename to",
+    "copy from",
+    "copy to",
+    "Binary files",
+)
+
+_PYTHON = [r"^\s*(?:async\s+)?def\s+(\w+)", r"^\s*class\s+(\w+)"]
+_JAVASCRIPT = [
+    r"\bfunction\s*\*?\s*(\w+)\s*\(",
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(\w+)",
+    r"^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|\w+\s*=>)",
+    r"^\s*(?:export\s+)?(?:interface|type|enum)\s+(\w+)",
+    r"^\s+(?:(?:public|private|protected|static|async|readonly|get|set)\s+)*(?!(?:if|for|while|switch|catch|return|function)\b)(\w+)\s*\([^)]*\)\s*(?::[^{]+)?\{\s*$",
+]
+_C_FAMILY = [
+    r"^(?:class|struct|union|enum)\s+(\w+)",
+    r"^(?!\s)(?!(?:return|else|typedef)\b)[\w:<>,*&\s]+?[\s*&](\w+(?:::\w+)*)\s*\([^;]*$",
+]
+_JVM = [
+    r"\b(?:class|interface|enum|record|object|trait)\s+(\w+)",
+    r"\bfun\s+(?:<[^>]*>\s*)?(?:\w+\.)?(\w+)\s*\(",
+    r"\bdef\s+(\w+)",
+    r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|synchronized|override|virtual|async)\s+)+[\w<>\[\],.?\s]*?\b(\w+)\s*\(",
+]
+
+# Definition patterns per file extension; the first group is the name
+SYMBOL_PATTERNS: dict[str, list[re.Pattern[str]]] = {
+    extension: [re.compile(pattern) for pattern in patterns]
+    for extensions, patterns in [
+        ((".py", ".pyi"), _PYTHON),
+        ((".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts"), _JAVASCRIPT),
+        (
+            (".go",),
+            [r"^func\s+(?:\([^)]*\)\s*)?(\w+)", r"^type\s+(\w+)"],
+        ),
+        (
+            (".rs",),
+            [
+                r"\bfn\s+(\w+)",
+                r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|union|mod)\s+(\w+)",
+                r"^\s*impl(?:<[^>]*>)?\s+(?:[\w:]+\s+for\s+)?([\w:]+)",
+            ],
+        ),
+        ((".c", ".h", ".cc", ".cpp", ".cxx", ".hpp", ".hh", ".m", ".mm"), _C_FAMILY),
+        ((".java", ".kt", ".kts", ".scala", ".cs"), _JVM),
+        (
+            (".rb",),
+            [r"^\s*def\s+(?:self\.)?(\w+[?!=]?)", r"^\s*(?:class|module)\s+(\w+)"],
+        ),
+        ((".php",), [r"\bfunction\s+(\w+)", r"\b(?:class|interface|trait)\s+(\w+)"]),
+        (
+            (".swift",),
+            [
+                r"\bfunc\s+(\w+)",
+                r"\b(?:class|struct|enum|protocol|extension)\s+(\w+)",
+            ],
+        ),
+    ]
+    for extension in extensions
+}
+
+# Files where leading whitespace is part of the meaning (blocks, nesting,
+# recipe tabs, code blocks), so re-indented lines are real changes
+INDENTATION_SENSITIVE_SUFFIXES = {
+    ".py",
+    ".pyi",
+    ".pyx",
+    ".yml",
+    ".yaml",
+    ".mk",
+    ".mak",
+    ".coffee",
+    ".sass",
+    ".styl",
+    ".pug",
+    ".jade",
+    ".haml",
+    ".slim",
+    ".nim",
+    ".hs",
+    ".elm",
+    ".fs",
+    ".fsi",
+    ".fsx",
+    ".md",
+    ".markdown",
+    ".rst",
+}
+INDENTATION_SENSITIVE_NAMES = {"makefile", "gnumakefile"}
+
+
+# Quoted strings on a single line, with escaped quotes
+_STRING_LITERAL = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`)"""
+)
+_BETWEEN_WORDS = re.compile(r"(?<=\w)\s+(?=\w)")
+
+
+@dataclass
+class _Line:
+    # " ", "+", "-" or "#" for notes inserted by the simplification
+    kind: str
+    text: str
+    # Text without the whitespace between tokens (but with the indentation,
+    # where it matters), used to compare lines across formatting changes
+    normalized: str = ""
+    moved_to: str | None = None
+    moved_from: str | None = None
+
+
+@dataclass
+class _Hunk:
+    file_index: int
+    # Text after the second `@@` of the hunk header, if git found any
+    context: str
+    lines: list[_Line] = field(default_factory=list)
+
+
+def symbol_patterns(path: str) -> list[re.Pattern[str]]:
+    return SYMBOL_PATTERNS.get(PurePosixPath(path).suffix.lower(), [])
+
+
+def indentation_matters(path: str) -> bool:
+    name = PurePosixPath(path)
+    return (
+        name.suffix.lower() in INDENTATION_SENSITIVE_SUFFIXES
+        or name.name.lower() in INDENTATION_SENSITIVE_NAMES
+    )
+
+
+def symbol_name(patterns: list[re.Pattern[str]], line: str) -> str | None:
+    """The name defined on `line`, if it looks like a definition."""
+    for pattern in patterns:
+        match = pattern.search(line)
+        if match:
+            return match.group(1)
+    return None
+
+
+def simplify_files(files: Iterable[FileDiff]) -> list[FileDiff]:
+    """
+    Rewrite per-file diffs into a compact form for the prompt: formatting-only
+    changes and moved lines are dropped, context is trimmed and the changed
+    symbols are listed. Binary, oversized and generated files pass through.
+    """
+    files = list(files)
+    hunks: list[list[_Hunk]] = [
+        _parse_hunks(index, file) if not file.summary_only else []
+        for index, file in enumerate(files)
+    ]
+    _mark_moved_lines(files, [hunk for file_hunks in hunks for hunk in file_hunks])
+
+    result: list[FileDiff] = []
+    for file, file_hunks in zip(files, hunks):
+        if file.summary_only:
+            result.append(file)
+            continue
+        result.append(_simplify_file(file, file_hunks))
+    return result
+
+
+def _parse_hunks(file_index: int, file: FileDiff) -> list[_Hunk]:
+    keep_indentation = indentation_matters(file.path)
+    hunks: list[_Hunk] = []
+    for raw in file.hunks:
+        # `@@ -1,2 +1,3 @@ def enclosing():`
+        parts = raw[0].split("@@", 2)
+        hunk = _Hunk(
+            file_index=file_index,
+            context=parts[2].strip() if len(parts) > 2 else "",
+        )
+        for line in raw[1:]:
+            if line.startswith("\\"):
+                # `\ No newline at end of file`
+                continue
+            kind = line[:1] if line[:1] in ("+", "-") else " "
+            text = line[1:] if line[:1] in ("+", "-", " ") else line
+            hunk.lines.append(
+                _Line(
+                    kind=kind,
+                    text=text,
+                    normalized=_normalize(text, keep_indentation),
+                )
+            )
+        hunks.append(hunk)
+    return hunks
+
+
+def _normalize(text: str, keep_indentation: bool) -> str:
+    """
+    `text` without the whitespace around and between tokens. Whitespace
+    inside string literals is kept, and so is the indentation if
+    `keep_indentation` is set.
+    """
+    if '"' in text or "'" in text or "`" in text:
+        parts = _STRING_LITERAL.split(text)
+        # Every other part is a string literal, kept as is
+        for index in range(0, len(parts), 2):
+            parts[index] = _without_whitespace(parts[index])
+        normalized = "".join(parts)
+    else:
+        normalized = _without_whitespace(text)
+    if keep_indentation and normalized:
+        normalized = text[: len(text) - len(text.lstrip())] + normalized
+    return normalized
+
+
+def _without_whitespace(code: str) -> str:
+    # Whitespace between two words becomes a NUL, which keeps `return x`
+    # apart from `returnx` without being removed along with the rest
+    return "".join(_BETWEEN_WORDS.sub("\0", code).split())
+
+
+def _mark_moved_lines(files: list[FileDiff], hunks: list[_Hunk]) -> None:
+    """Mark removed and added runs of lines that reappear in another hunk."""
+    grams: dict[str, dict[tuple[str, ...], _Hunk]] = {"+": {}, "-": {}}
+    for hunk in hunks:
+        for kind, lines in _changed_runs(hunk):
+            for start in range(len(lines) - MOVED_BLOCK_LINES + 1):
+                gram = tuple(
+                    line.normalized for line in lines[start : start + MOVED_BLOCK_LINES]
+                )
+                if sum(map(len, gram)) >= MOVED_BLOCK_CHARS:
+                    grams[kind].setdefault(gram, hunk)
+
+    for hunk in hunks:
+        for kind, lines in _changed_runs(hunk):
+            counterparts = grams["+" if kind == "-" else "-"]
+            for start in range(len(lines) - MOVED_BLOCK_LINES + 1):
+                window = lines[start : start + MOVED_BLOCK_LINES]
+                other = counterparts.get(tuple(line.normalized for line in window))
+                # A match in the same hunk is an edit in place, not a move
+                if other is None or other is hunk:
+                    continue
+                path = (
+                    "elsewhere in this file"
+                    if other.file_index == hunk.file_index
+                    else files[other.file_index].path
+                )
+                for line in window:
+                    if kind == "-":
+                        line.moved_to = line.moved_to or path
+                    else:
+                        line.moved_from = line.moved_from or path
+
+
+def _changed_runs(hunk: _Hunk) -> list[tuple[str, list[_Line]]]:
+    """Consecutive removed or added lines of a hunk."""
+    runs: list[tuple[str, list[_Line]]] = []
+    previous_kind = None
+    for line in hunk.lines:
+        if line.kind in ("+", "-"):
+            if line.kind == previous_kind:
+                runs[-1][1].append(line)
+            else:
+                runs.append((line.kind, [line]))
+        previous_kind = line.kind
+    return runs
+
+
+def _simplify_file(file: FileDiff, hunks: list[_Hunk]) -> FileDiff:
+    header = [file.header[0]] if file.header else []
+    header += [
+        line for line in file.header[1:] if line.startswith(_KEPT_HEADER_PREFIXES)
+    ]
+    patterns = symbol_patterns(file.path)
+    symbols: dict[str, set[str]] = {}
+    formatting_only = 0
+    rendered: list[list[str]] = []
+    for hunk in hunks:
+        # Each block of changes is compared on its own, so that a line
+        # moved elsewhere in the hunk is still a change
+        if all(
+            "".join(line.normalized for line in removed)
+            == "".join(line.normalized for line in added)
+            for removed, added in _change_blocks(hunk)
+        ):
+            formatting_only += 1
+            continue
+
+        _collapse_moved_runs(hunk)
+        _reindented_as_context(hunk)
+        _collect_symbols(patterns, hunk, symbols)
+        lines = _trim_context(hunk)
+        if lines:
+            # git picks the context with a generic pattern unless a diff
+            # driver is configured, so only recognized definitions are kept
+            enclosing = symbol_name(patterns, hunk.context)
+            rendered.append([f"@@ {enclosing}" if enclosing else "@@", *lines])
+
+    if not rendered and formatting_only:
+        return replace(
+            file,
+            header=[
+                f"# {file.path}: whitespace or formatting changes only, "
+                f"+{file.additions} -{file.deletions} (diff omitted)"
+            ],
+            hunks=[],
+        )
+
+    if symbols:
+        names = [
+            name + (f" ({' '.join(sorted(tags))})" if tags else "")
+            for name, tags in symbols.items()
+        ]
+        if len(names) > MAX_SYMBOLS:
+            names[MAX_SYMBOLS:] = [f"and {len(names) - MAX_SYMBOLS} more"]
+        header.append("# symbols: " + ", ".join(names))
+    if formatting_only:
+        header.append(f"# {formatting_only} hunks with formatting changes only omitted")
+    return replace(file, header=header, hunks=rendered)
+
+
+def _collapse_moved_runs(hunk: _Hunk) -> None:
+    lines: list[_Line] = []
+    for (kind, target), group in groupby(hunk.lines, key=_move_key):
+        if target is None:
+            lines.extend(group)
+            continue
+        direction = "to" if kind == "-" else "from"
+        count = sum(1 for _ in group)
+        lines.append(_Line(kind="#", text=f"{count} lines moved {direction} {target}"))
+    hunk.lines = lines
+
+
+def _move_key(line: _Line) -> tuple[str, str | None]:
+    if line.kind == "-":
+        return line.kind, line.moved_to
+    if line.kind == "+":
+        return line.kind, line.moved_from
+    return line.kind, None
+
+
+def _reindented_as_context(hunk: _Hunk) -> None:
+    """
+    Show line pairs that only differ in whitespace as context lines. A
+    removed line is only paired with the added line at the same position
+    of the same block, so reordered lines stay changes. Lines whose
+    indentation matters never compare equal after re-indenting.
+    """
+    lines: list[_Line] = []
+    block: list[_Line] = []
+    for line in [*hunk.lines, None]:
+        if line is not None and line.kind in ("+", "-"):
+            block.append(line)
+            continue
+        lines.extend(_pair_reindented(block))
+        block = []
+        if line is not None:
+            lines.append(line)
+    hunk.lines = lines
+
+
+def _pair_reindented(block: list[_Line]) -> list[_Line]:
+    removed = [line for line in block if line.kind == "-"]
+    added = [line for line in block if line.kind == "+"]
+    lines: list[_Line] = []
+    pending_removed: list[_Line] = []
+    pending_added: list[_Line] = []
+    for index in range(max(len(removed), len(added))):
+        old = removed[index] if index < len(removed) else None
+        new = added[index] if index < len(added) else None
+        if (
+            old is not None
+            and new is not None
+            and old.normalized
+            and old.normalized == new.normalized
+        ):
+            # The pair splits the block, keeping both sides in order
+            lines += pending_removed + pending_added
+            pending_removed, pending_added = [], []
+            new.kind = " "
+            lines.append(new)
+            continue
+        if old is not None:
+            pending_removed.append(old)
+        if new is not None:
+            pending_added.append(new)
+    return lines + pending_removed + pending_added
+
+
+def _change_blocks(hunk: _Hunk) -> list[tuple[list[_Line], list[_Line]]]:
+    """Removed and added lines of each run of changed lines of a hunk."""
+    blocks: list[tuple[list[_Line], list[_Line]]] = []
+    previous_changed = False
+    for line in hunk.lines:
+        changed = line.kind in ("+", "-")
+        if changed and not previous_changed:
+            blocks.append(([], []))
+        if changed:
+            blocks[-1][0 if line.kind == "-" else 1].append(line)
+        previous_changed = changed
+    return blocks
+
+
+def _collect_symbols(
+    patterns: list[re.Pattern[str]], hunk: _Hunk, symbols: dict[str, set[str]]
+) -> None:
+    if not patterns:
+        return
+    current = symbol_name(patterns, hunk.context)
+    for line in hunk.lines:
+        name = symbol_name(patterns, line.text) if line.kind != "#" else None
+        if name is not None:
+            current = name
+            if line.kind in ("+", "-"):
+                tags = symbols.setdefault(name, set())
+                tags.add("added" if line.kind == "+" else "removed")
+                continue
+        elif line.kind != "#" and line.text[:1] not in ("", " ", "\t"):
+            # Unindented code after a definition is no longer part of it
+            current = None
+        if line.kind in ("+", "-", "#") and current is not None:
+            symbols.setdefault(current, set())
+
+    # A definition that was both removed and added was only edited
+    for tags in symbols.values():
+        if tags == {"added", "removed"}:
+            tags.clear()
+
+
+def _trim_context(hunk: _Hunk) -> list[str]:
+    changed = [i for i, line in enumerate(hunk.lines) if line.kind != " "]
+    if not changed:
+        return []
+    keep = {
+        i
+        for index in changed
+        for i in range(index - CONTEXT_LINES, index + CONTEXT_LINES + 1)
+        if 0 <= i < len(hunk.lines)
+    }
+    lines: list[str] = []
+    previous = None
+    for i in sorted(keep):
+        if previous is not None and i > previous + 1:
+            lines.append("@@")
+        line = hunk.lines[i]
+        lines.append(f"# {line.text}" if line.kind == "#" else line.kind + line.text)
+        previous = i
+    return lines
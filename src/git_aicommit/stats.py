@@ -0,0 +1,172 @@
+import json
+import math
+import os
+import threading
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from copy import copy
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from time import time
+from typing import Any, Optional
+from git_aicommit.paths import state_directory
+
+
+def stats_path() -> Path:
+    """Location of the run log."""
+    return state_directory() / "stats.jsonl"
+
+
+@dataclass
+class RunStats:
+    """
+    Measurements of a single `git aicommit` run.
+
+    Generations may run on several threads at once, so token and latency
+    updates are serialized with a lock.
+    """
+
+    started_at: float = field(default_factory=time)
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    # Wall-clock seconds per phase (config, git, provider, prompt, summarize,
+    # commit)
+    phases: dict[str, float] = field(default_factory=dict)
+    # Latency of every message generation request
+    generation_seconds: list[float] = field(default_factory=list)
+    first_token_seconds: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    diff_bytes: int = 0
+    files: int = 0
+    outcome: Optional[str] = None
+    # Served from the message cache without sending any request; such runs
+    # say nothing about the provider and are left out of its statistics
+    cached: bool = False
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time = time()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time() - start_time
+
+    def add_generation(
+        self, seconds: float, usage: Iterable[Mapping[str, Any]]
+    ) -> None:
+        with self._lock:
+            self.generation_seconds.append(seconds)
+            for u in usage:
+                self.input_tokens += u.get("input_tokens", 0)
+                self.output_tokens += u.get("output_tokens", 0)
+                self.cache_read_tokens += u.get("input_token_details", {}).get(
+                    "cache_read", 0
+                )
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            data = {
+                f.name: copy(getattr(self, f.name))
+                for f in fields(self)
+                if not f.name.startswith("_")
+            }
+        data["total_seconds"] = time() - self.started_at
+        return data
+
+    def save(self, path: Optional[Path] = None) -> None:
+        """Append the run to the log. Failures never affect the run itself."""
+        path = path or stats_path()
+        line = json.dumps(self.to_dict(), ensure_ascii=False) + "\n"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # A single O_APPEND write keeps lines intact across processes
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+def load_runs(path: Optional[Path] = None) -> list[dict[str, Any]]:
+    path = path or stats_path()
+    if not path.is_file():
+        return []
+
+    runs: list[dict[str, Any]] = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                runs.append(json.loads(line))
+            except ValueError:
+                # Skip lines truncated by a crash or a full disk
+                continue
+    return runs
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile; `q` is between 0 and 100."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+@dataclass
+class ModelSummary:
+    provider: str
+    model: str
+    runs: int
+    generation_p50: Optional[float]
+    generation_p95: Optional[float]
+    first_token_p50: Optional[float]
+    first_token_p95: Optional[float]
+    git_p95: Optional[float]
+    total_p95: Optional[float]
+    input_tokens_mean: float
+    output_tokens_mean: float
+
+
+def summarize_runs(runs: list[dict[str, Any]]) -> list[ModelSummary]:
+    """Aggregate latency percentiles and token means per provider and model."""
+    groups: dict[tuple[str, str], list[dict[str, Any]]] = {}
+    for run in runs:
+        if not run.get("provider") or not run.get("model") or run.get("cached"):
+            continue
+        groups.setdefault((run["provider"], run["model"]), []).append(run)
+
+    summaries: list[ModelSummary] = []
+    for (provider, model), group in sorted(groups.items()):
+        generations = [s for run in group for s in run.get("generation_seconds", [])]
+        first_tokens = [
+            run["first_token_seconds"]
+            for run in group
+            if run.get("first_token_seconds") is not None
+        ]
+        gits = [run["phases"]["git"] for run in group if "git" in run.get("phases", {})]
+        totals = [run["total_seconds"] for run in group if "total_seconds" in run]
+        summaries.append(
+            ModelSummary(
+                provider=provider,
+                model=model,
+                runs=len(group),
+                generation_p50=percentile(generations, 50),
+                generation_p95=percentile(generations, 95),
+                first_token_p50=percentile(first_tokens, 50),
+                first_token_p95=percentile(first_tokens, 95),
+                git_p95=percentile(gits, 95),
+                total_p95=percentile(totals, 95),
+                input_tokens_mean=sum(run.get("input_tokens", 0) for run in group)
+                / len(group),
+                output_tokens_mean=sum(run.get("output_tokens", 0) for run in group)
+                / len(group),
+            )
+        )
+    return summaries
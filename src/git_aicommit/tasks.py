@@ -0,0 +1,105 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+_scope: contextvars.ContextVar[Optional["CancelScope"]] = contextvars.ContextVar(
+    "cancel_scope", default=None
+)
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop on a daemon thread that runs every backend request.
+
+    Unlike blocking calls on threads, its tasks can be cancelled, which
+    closes the requests' connections. A single long-lived loop keeps the
+    async HTTP clients that integrations cache usable across requests.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+
+class CancelScope:
+    """
+    Group of requests that are cancelled together.
+
+    Requests started through `run` while the scope is active belong to it;
+    `cancel` stops the ones in flight and makes later ones fail right away
+    with `concurrent.futures.CancelledError`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._futures: set[concurrent.futures.Future[Any]] = set()
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    @contextmanager
+    def active(self) -> Iterator[None]:
+        """Make requests started within, on this thread, belong to the scope."""
+        token = _scope.set(self)
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    def _add(self, future: concurrent.futures.Future[Any]) -> None:
+        with self._lock:
+            if not self._cancelled:
+                self._futures.add(future)
+                return
+        future.cancel()
+
+    def _discard(self, future: concurrent.futures.Future[Any]) -> None:
+        with self._lock:
+            self._futures.discard(future)
+
+
+def run(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run `call` on the event loop and wait for its result.
+
+    The task copies the current context, so tracing settings and usage
+    callbacks reach it. It is cancelled when the current `CancelScope` is,
+    or when the wait is interrupted, e.g. by Ctrl-C.
+    """
+    scope = _scope.get()
+    future = asyncio.run_coroutine_threadsafe(_awaited(call), event_loop())
+    if scope is not None:
+        scope._add(future)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+    finally:
+        if scope is not None:
+            scope._discard(future)
+
+
+async def _awaited(call: Callable[[], Awaitable[T]]) -> T:
+    return await call()
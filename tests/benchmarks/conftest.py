@@ -0,0 +1,180 @@
+import json
+import tracemalloc
+import warnings
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any, Optional
+import pytest
+from click.testing import Result
+from git_aicommit.stats import load_runs
+from tests.repos import make_repo
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+# Allowed growth of metrics other than timings over the baseline. Sizes and
+# counts barely depend on the machine, unlike timings, which are only
+# checked with `--benchmark-check` and within `--baseline-threshold`.
+SIZE_THRESHOLD = 0.1
+# Smaller absolute changes are treated as noise, whatever their percentage
+NOISE_FLOORS = {"_seconds": 0.005, "_bytes": 256 * 1024}
+# Fixture repositories by number of Python modules
+REPO_SIZES = {"small": 10, "medium": 200, "large": 2000}
+# Phases of a run before the first request, as recorded in the run stats
+PHASES = ["config", "git", "provider", "prompt"]
+
+
+class Baseline:
+    """
+    Compares the metrics of one benchmark with those stored for it in
+    `baseline.json`, or records them with `--update-baseline`.
+
+    Metric names end in their unit: `_seconds` for timings, `_bytes` for
+    memory, anything else for sizes and counts. Lower is better for all.
+    Timings are recorded and reported, but only checked when `check_timings`
+    is set.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stored: dict[str, dict[str, float]],
+        threshold: float,
+        update: bool,
+        check_timings: bool = False,
+    ):
+        self.name = name
+        self.stored = stored
+        self.threshold = threshold
+        self.update = update
+        self.check_timings = check_timings
+
+    def check(self, benchmark: Any = None, **metrics: float) -> None:
+        """
+        Check `metrics`, plus the median time of `benchmark` when it was
+        timed, and show them in the benchmark report. Timings are only
+        checked when the benchmark was timed.
+        """
+        if benchmark is not None:
+            if benchmark.stats is not None:
+                metrics = {"median_seconds": benchmark.stats.stats.median, **metrics}
+            else:
+                # With --benchmark-disable, a single run is too noisy to judge
+                metrics = {
+                    metric: value
+                    for metric, value in metrics.items()
+                    if not metric.endswith("_seconds")
+                }
+            benchmark.extra_info.update(metrics)
+
+        if self.update:
+            self.stored[self.name] = {
+                **self.stored.get(self.name, {}),
+                **{metric: round(value, 6) for metric, value in metrics.items()},
+            }
+            return
+
+        reference = self.stored.get(self.name)
+        if reference is None:
+            warnings.warn(f"no baseline for {self.name}; run with --update-baseline")
+            return
+        regressions = [
+            f"{metric}: {value:.6g} (baseline {reference[metric]:.6g})"
+            for metric, value in metrics.items()
+            if metric in reference
+            and (self.check_timings or not metric.endswith("_seconds"))
+            and self._regressed(metric, reference[metric], value)
+        ]
+        if regressions:
+            pytest.fail(f"{self.name} regressed: " + ", ".join(regressions))
+
+    def _regressed(self, metric: str, baseline: float, value: float) -> bool:
+        threshold = self.threshold if metric.endswith("_seconds") else SIZE_THRESHOLD
+        floor = next(
+            (
+                floor
+                for suffix, floor in NOISE_FLOORS.items()
+                if metric.endswith(suffix)
+            ),
+            0.0,
+        )
+        return value > baseline * (1 + threshold) and value - baseline > floor
+
+
+@pytest.fixture(scope="session")
+def stored_baseline(request: pytest.FixtureRequest) -> Iterator[dict[str, Any]]:
+    try:
+        stored = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        stored = {}
+    yield stored
+    if request.config.option.update_baseline:
+        BASELINE_PATH.write_text(
+            json.dumps(stored, indent=2, sort_keys=True) + "\n", encoding="utf-8"
+        )
+
+
+@pytest.fixture
+def baseline(
+    request: pytest.FixtureRequest, stored_baseline: dict[str, Any]
+) -> Baseline:
+    return Baseline(
+        # e.g. `test_root.py::test_root[small]`
+        name=request.node.nodeid.split("/")[-1],
+        stored=stored_baseline,
+        threshold=request.config.option.baseline_threshold,
+        update=request.config.option.update_baseline,
+        check_timings=request.config.option.benchmark_check,
+    )
+
+
+@pytest.fixture(scope="session")
+def repos(tmp_path_factory: pytest.TempPathFactory) -> dict[str, Path]:
+    root = tmp_path_factory.mktemp("repos")
+    return {
+        size: make_repo(root / size, files=files) for size, files in REPO_SIZES.items()
+    }
+
+
+def run_and_check(
+    benchmark, baseline: Baseline, run: Callable[[], Result], phases: list[str]
+) -> None:
+    """Benchmark `run`, then check its phase timings and peak memory."""
+    # The first run builds the history index, which later runs only update
+    run()
+    warm_up_runs = len(load_runs())
+    benchmark(run)
+    runs = load_runs()[warm_up_runs:]
+    metrics = {
+        f"{phase}_seconds": value
+        for phase in phases
+        if (value := median([r["phases"][phase] for r in runs if phase in r["phases"]]))
+        is not None
+    }
+    baseline.check(benchmark, peak_memory_bytes=peak_memory(run), **metrics)
+
+
+def peak_memory(call: Callable[[], Any], rounds: int = 2) -> int:
+    """
+    Peak bytes allocated by Python objects while `call` runs, the lowest of
+    `rounds` runs. Tables shared by the whole interpreter, such as that of
+    interned strings, grow once in a while; a single run may pay for it.
+    """
+    peaks: list[int] = []
+    for _ in range(rounds):
+        tracemalloc.start()
+        try:
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return min(peaks)
+
+
+def median(values: list[float]) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
@@ -0,0 +1,68 @@
+import os
+import shutil
+import time
+from pathlib import Path
+import pytest
+from git_aicommit.config import load_config
+from git_aicommit.paths import cache_directory
+from tests.repos import CONFIG
+
+# Directories between the deepest working directory and the search ceiling
+TREE_DEPTH = 40
+# Latency added to every stat call, like on a network file system
+SLOW_STAT_SECONDS = 0.0002
+
+
+@pytest.fixture
+def deep_tree(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A deep directory tree with config files at the top and halfway down."""
+    monkeypatch.setenv("GIT_AICOMMIT_CONFIG_CEILING", str(tmp_path))
+    (tmp_path / "aicommit.yml").write_text(CONFIG)
+    directory = tmp_path
+    for depth in range(TREE_DEPTH):
+        directory = directory / f"d{depth}"
+        if depth == TREE_DEPTH // 2:
+            directory.mkdir(parents=True)
+            (directory / ".aicommit.yml").write_text("language: English\n")
+    directory.mkdir(parents=True)
+    # Recently modified directories and files are never cached
+    modified = time.time() - 60
+    for path in [
+        directory,
+        *directory.relative_to(tmp_path).parents,
+        *tmp_path.rglob("*aicommit.yml"),
+    ]:
+        os.utime(tmp_path / path, (modified, modified))
+    return directory
+
+
+@pytest.fixture
+def stat_calls(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    """Slows down and counts stat calls, which `Path` methods go through too."""
+    calls = [0]
+    stat = os.stat
+
+    def slow_stat(*args, **kwargs):
+        calls[0] += 1
+        time.sleep(SLOW_STAT_SECONDS)
+        return stat(*args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", slow_stat)
+    return calls
+
+
+@pytest.mark.parametrize("cache", ["miss", "hit"])
+def test_load_config(benchmark, baseline, deep_tree, stat_calls, cache):
+    def clear_cache():
+        if cache == "miss":
+            shutil.rmtree(cache_directory() / "configs", ignore_errors=True)
+
+    load_config(deep_tree)
+    clear_cache()
+    stat_calls[0] = 0
+    config = load_config(deep_tree)
+    stats = stat_calls[0]
+
+    benchmark.pedantic(load_config, args=(deep_tree,), setup=clear_cache, rounds=20)
+    assert config.language == "English"
+    baseline.check(benchmark, stat_calls=stats)
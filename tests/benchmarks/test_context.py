@@ -0,0 +1,24 @@
+import pytest
+from git_aicommit.config import load_config
+from git_aicommit.context import ContextBuilder
+from git_aicommit.diff import estimate_tokens
+from git_aicommit.git import Git
+from git_aicommit.pipeline import collect_changes
+from tests.benchmarks.conftest import REPO_SIZES
+
+CONTEXT_TOKENS = 1000
+
+
+@pytest.mark.parametrize("size", REPO_SIZES)
+def test_build_context(benchmark, baseline, repos, size):
+    """Context for the staged changes, from a new `git cat-file` process."""
+    git = Git(str(repos[size]))
+    files = collect_changes(git, load_config(repos[size]), []).diff_files
+
+    def run() -> str:
+        with ContextBuilder(git) as builder:
+            return builder.build(files, max_tokens=CONTEXT_TOKENS)
+
+    context = benchmark(run)
+    assert 0 < estimate_tokens(context) <= CONTEXT_TOKENS
+    baseline.check(benchmark)
@@ -0,0 +1,25 @@
+from click.testing import Result
+from git_aicommit.daemon import DaemonClient
+from tests.benchmarks.conftest import PHASES, run_and_check
+
+
+def test_daemon_ping(benchmark, baseline, daemon: DaemonClient):
+    """A round trip over the socket, the least a daemon-backed run costs."""
+    status = benchmark(daemon.ping)
+    assert status is not None
+    baseline.check(benchmark)
+
+
+def test_root_daemon(benchmark, baseline, repos, fake_model, daemon, run_cli):
+    """Same as `test_root[medium]`, with the provider kept warm in the daemon."""
+
+    def run() -> Result:
+        result = run_cli(repos["medium"], "--no-cache", "--daemon", keys="q")
+        assert result.exit_code == 1 and "Aborted commit." in result.output
+        return result
+
+    run_and_check(benchmark, baseline, run, PHASES)
+    assert fake_model.requests
+    # The config and provider were loaded once and then reused
+    status = daemon.ping()
+    assert status is not None and status["configs"] == 1
@@ -0,0 +1,55 @@
+from collections.abc import Iterator
+import pytest
+from git_aicommit.diff import (
+    compact_diff,
+    estimate_tokens,
+    parse_diff,
+    tokens_to_chars,
+)
+from tests.benchmarks.conftest import peak_memory
+
+# Synthetic staged diffs by number of files and changed lines per file:
+# about 16 MB across many small files, and 100 MB in a few huge ones
+SYNTHETIC_DIFFS = {"10k-files": (10_000, 20), "100mb": (64, 20_000)}
+MAX_DIFF_TOKENS = 30_000
+
+
+def synthetic_diff(files: int, lines: int) -> Iterator[str]:
+    """Lines of a diff editing every tenth function of `files` modules."""
+    for index in range(files):
+        path = f"src/pkg{index % 50}/module_{index}.py"
+        yield f"diff --git a/{path} b/{path}"
+        yield "index 1234567..89abcde 100644"
+        yield f"--- a/{path}"
+        yield f"+++ b/{path}"
+        for start in range(0, lines, 10):
+            yield f"@@ -{start + 1},10 +{start + 1},10 @@ def function_{start}(value):"
+            for line in range(start, start + 10):
+                sign = "+-  "[line % 4]
+                yield (
+                    f"{sign}    result_{line} = compute(value, {line}) * scale"
+                    f" + offset_{index}  # step {line}"
+                )
+
+
+@pytest.mark.parametrize("size", SYNTHETIC_DIFFS)
+def test_compact_diff(benchmark, baseline, size):
+    """Parsing and compacting a huge diff, read line by line as from git."""
+    files, lines = SYNTHETIC_DIFFS[size]
+
+    def run():
+        return compact_diff(
+            parse_diff(
+                synthetic_diff(files, lines),
+                max_file_chars=tokens_to_chars(MAX_DIFF_TOKENS),
+            ),
+            max_tokens=MAX_DIFF_TOKENS,
+        )
+
+    compacted = benchmark(run)
+    prompt_tokens = estimate_tokens(compacted.text)
+    assert prompt_tokens <= MAX_DIFF_TOKENS
+    assert len(compacted.summarized_files) + len(compacted.truncated_files) > 0
+    baseline.check(
+        benchmark, peak_memory_bytes=peak_memory(run), prompt_tokens=prompt_tokens
+    )
@@ -0,0 +1,118 @@
+import subprocess
+from pathlib import Path
+import pytest
+from git_aicommit.config import load_config
+from git_aicommit.git import Git
+from git_aicommit.pipeline import collect_changes, prepare_changes
+from tests.benchmarks.conftest import REPO_SIZES, peak_memory
+from tests.repos import git, make_repo, module_source
+
+# Sizes in MiB of a generated file staged on its own
+HUGE_FILE_SIZES = {"16mb": 16, "128mb": 128}
+# Files in the directory moved by a single change
+MOVED_FILES = 5000
+# Most a directory move and a few binary files may add to the prompt
+MAX_MOVE_PROMPT_BYTES = 8 * 1024
+# Memory collecting the changes may take, whatever the size of the diff
+MAX_PEAK_MEMORY_BYTES = 4 * 1024 * 1024
+
+
+class CountingPopen(subprocess.Popen):
+    """`Popen` that counts the processes started, `subprocess.run` included."""
+
+    started = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingPopen.started += 1
+        super().__init__(*args, **kwargs)
+
+
+@pytest.mark.parametrize("size", REPO_SIZES)
+def test_collect(benchmark, baseline, repos, monkeypatch, size):
+    """Collecting the staged changes, logs and attributes in one pass."""
+    git = Git(str(repos[size]))
+    config = load_config(repos[size])
+    # The first run builds the history index, which later runs only update
+    collect_changes(git, config, [])
+
+    monkeypatch.setattr(subprocess, "Popen", CountingPopen)
+    CountingPopen.started = 0
+    changes = collect_changes(git, config, [])
+    git_processes = CountingPopen.started
+
+    benchmark(collect_changes, git, config, [])
+    assert changes.diff_files and changes.logs
+    baseline.check(benchmark, git_processes=git_processes)
+
+
+@pytest.fixture(scope="module")
+def huge_file_repos(tmp_path_factory: pytest.TempPathFactory) -> dict[str, Path]:
+    """Small repositories with one huge generated text file staged."""
+    root = tmp_path_factory.mktemp("huge-file-repos")
+    repos: dict[str, Path] = {}
+    for size, megabytes in HUGE_FILE_SIZES.items():
+        repo = make_repo(root / size, files=10, commits=2)
+        line = "+".join(f"value_{index}" for index in range(12)) + "\n"
+        block = line * (1024 * 1024 // len(line))
+        with open(repo / "generated.txt", "w") as f:
+            for _ in range(megabytes):
+                f.write(block)
+        git(repo, "add", "generated.txt")
+        repos[size] = repo
+    return repos
+
+
+@pytest.mark.parametrize("size", HUGE_FILE_SIZES)
+def test_collect_huge_file(benchmark, baseline, huge_file_repos, size):
+    """The diff is read as a stream, so memory stays flat whatever its size."""
+    git = Git(str(huge_file_repos[size]))
+    config = load_config(huge_file_repos[size])
+    collect_changes(git, config, [])
+
+    changes = benchmark(collect_changes, git, config, [])
+    assert changes.diff_truncated or any(f.oversized for f in changes.diff_files)
+    memory = peak_memory(lambda: collect_changes(git, config, []))
+    assert memory < MAX_PEAK_MEMORY_BYTES
+    baseline.check(benchmark, peak_memory_bytes=memory)
+
+
+@pytest.fixture(scope="module")
+def moved_directory_repo(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A repository with a directory of thousands of files moved, and a few
+    binary files changed."""
+    repo = make_repo(tmp_path_factory.mktemp("moved") / "repo", files=10, commits=2)
+    git(repo, "reset", "-q", "--hard")
+    (repo / "lib").mkdir()
+    for index in range(MOVED_FILES):
+        (repo / "lib" / f"module_{index}.py").write_text(module_source(index, 0, 2))
+    for index in range(3):
+        (repo / f"image_{index}.png").write_bytes(bytes(range(256)) * (index + 1))
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "feat: add library")
+    git(repo, "mv", "lib", "vendor")
+    for index in range(3):
+        (repo / f"image_{index}.png").write_bytes(bytes(range(256)) * (index + 2))
+    git(repo, "add", "-A")
+    return repo
+
+
+def test_collect_moved_directory(benchmark, baseline, moved_directory_repo):
+    """Pure renames collapse to one line per moved directory."""
+    git = Git(str(moved_directory_repo))
+    config = load_config(moved_directory_repo)
+
+    def run() -> str:
+        changes = collect_changes(git, config, [])
+        prepared = prepare_changes(
+            git, changes.diff_files, changes.attributes, config, config.provider
+        )
+        assert prepared.diff is not None
+        return prepared.diff.text
+
+    run()
+    prompt = benchmark(run)
+    prompt_bytes = len(prompt.encode("utf-8"))
+    assert f"# lib/ -> vendor/: {MOVED_FILES} files renamed" in prompt
+    assert "image_0.png: binary file changed, 256 B -> 512 B (+256 B)" in prompt
+    assert prompt_bytes < MAX_MOVE_PROMPT_BYTES
+    baseline.check(benchmark, prompt_bytes=prompt_bytes)
@@ -0,0 +1,47 @@
+from collections.abc import Iterator
+from git_aicommit.diff import parse_diff
+from git_aicommit.plan import cluster_units, split_units
+
+# Staged files and hunks per file, 2,000 hunks in all
+PLAN_FILES = 400
+PLAN_HUNKS_PER_FILE = 5
+# Unrelated changes mixed in the staged diff
+PLAN_FEATURES = 100
+MAX_COMMITS = 5
+
+
+def mixed_diff() -> Iterator[str]:
+    """
+    Lines of a diff whose hunks each belong to one of several features,
+    told apart by the identifiers they change, spread over many packages.
+    """
+    for index in range(PLAN_FILES):
+        path = f"src/pkg{index % 20}/module_{index}.py"
+        yield f"diff --git a/{path} b/{path}"
+        yield "index 1234567..89abcde 100644"
+        yield f"--- a/{path}"
+        yield f"+++ b/{path}"
+        for hunk in range(PLAN_HUNKS_PER_FILE):
+            feature = (index * PLAN_HUNKS_PER_FILE + hunk) % PLAN_FEATURES
+            start = hunk * 40 + 1
+            yield f"@@ -{start},5 +{start},5 @@ def handler_{index}_{hunk}(request):"
+            yield f"     context = load_context_{index}(request)"
+            yield f"-    value = feature_{feature}_legacy(context, limit_{feature})"
+            yield f"+    value = feature_{feature}_client.fetch(context, limit_{feature})"
+            yield f"+    record_{feature}_metric(value, module_{index})"
+            yield "     return value"
+
+
+def test_cluster_units(benchmark, baseline):
+    """Grouping thousands of staged hunks locally, before any model call."""
+    files = list(parse_diff(mixed_diff()))
+
+    def run():
+        return cluster_units(split_units(files, []), max_groups=MAX_COMMITS)
+
+    groups = benchmark(run)
+    assert sum(len(group.units) for group in groups) == (
+        PLAN_FILES * PLAN_HUNKS_PER_FILE
+    )
+    assert len(groups) == MAX_COMMITS
+    baseline.check(benchmark)
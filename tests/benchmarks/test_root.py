@@ -0,0 +1,108 @@
+import time
+from collections.abc import Callable
+from typing import Any
+import pytest
+from click.testing import Result
+from git_aicommit.provider import PROVIDERS
+from git_aicommit.stats import load_runs
+from tests.benchmarks.conftest import PHASES, REPO_SIZES, median, run_and_check
+from tests.fakes import FakeChatModel, FakeProvider
+
+# Simulated time to import a provider SDK and create its client
+PROVIDER_SETUP_SECONDS = 0.1
+# Simulated time for the model to reply
+MODEL_LATENCY_SECONDS = 0.2
+
+
+class SerialFuture:
+    """Stands in for a background future, running `fn` only once awaited."""
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+
+    def result(self) -> Any:
+        return self.fn()
+
+
+@pytest.mark.parametrize("size", REPO_SIZES)
+def test_root(benchmark, baseline, repos, fake_model, run_cli, size):
+    """The whole `git aicommit` flow up to the prompt, with an instant model."""
+
+    def run() -> Result:
+        result = run_cli(repos[size], "--no-cache", keys="q")
+        assert result.exit_code == 1 and "Aborted commit." in result.output
+        return result
+
+    run_and_check(benchmark, baseline, run, PHASES)
+    assert fake_model.requests
+
+
+def test_root_stream(benchmark, baseline, repos, fake_model: FakeChatModel, run_cli):
+    """Streaming a reply word by word, including the time to the first token."""
+    fake_model.responses = ["feat(pkg0): scale values by the new default factor"]
+    fake_model.latency = 0.02
+    fake_model.token_latency = 0.002
+
+    def run() -> Result:
+        result = run_cli(repos["medium"], "--no-cache", "--stream", keys="q")
+        assert "scale values by the new default factor" in result.output
+        return result
+
+    run_and_check(benchmark, baseline, run, PHASES)
+    first_token = median(
+        [r["first_token_seconds"] for r in load_runs() if r.get("first_token_seconds")]
+    )
+    assert first_token is not None and first_token < 0.02 + 0.5
+
+
+def test_root_overlap(benchmark, baseline, repos, run_cli, monkeypatch):
+    """
+    Time to the first message with a slow provider setup and model, compared
+    with setting up the provider only after collecting the git data.
+    """
+    model = FakeChatModel(latency=MODEL_LATENCY_SECONDS)
+
+    def build_provider(config) -> FakeProvider:
+        time.sleep(PROVIDER_SETUP_SECONDS)
+        return FakeProvider(model)
+
+    monkeypatch.setitem(PROVIDERS, "openai", build_provider)
+
+    def run() -> Result:
+        result = run_cli(repos["medium"], "--no-cache", keys="q")
+        assert result.exit_code == 1 and "Aborted commit." in result.output
+        return result
+
+    # The first run builds the history index, which later runs only update
+    run()
+    start = len(load_runs())
+    benchmark(run)
+    overlapped = load_runs()[start:]
+    with monkeypatch.context() as serial:
+        serial.setattr("git_aicommit.cli.main.in_background", SerialFuture)
+        for _ in overlapped:
+            run()
+    serial_runs = load_runs()[start + len(overlapped) :]
+
+    def first_message(runs: list[dict[str, Any]]) -> float:
+        value = median(
+            [
+                sum(r["phases"][phase] for phase in PHASES) + r["generation_seconds"][0]
+                for r in runs
+            ]
+        )
+        assert value is not None
+        return value
+
+    def provider_wait(runs: list[dict[str, Any]]) -> float:
+        value = median([r["phases"]["provider"] for r in runs])
+        assert value is not None
+        return value
+
+    # Part of the setup is hidden behind the git phase
+    assert provider_wait(overlapped) < provider_wait(serial_runs)
+    baseline.check(
+        benchmark,
+        first_message_seconds=first_message(overlapped),
+        serial_first_message_seconds=first_message(serial_runs),
+    )
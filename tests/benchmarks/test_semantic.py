@@ -0,0 +1,76 @@
+from collections.abc import Iterator
+import pytest
+from git_aicommit.config import load_config
+from git_aicommit.diff import FileDiff, estimate_tokens, parse_diff
+from git_aicommit.git import Git
+from git_aicommit.pipeline import collect_changes
+from git_aicommit.semantic import simplify_files
+
+# Files in the synthetic corpus of reformatted and moved C code
+REFORMAT_FILES = 200
+
+
+def reformat_diff() -> Iterator[str]:
+    """
+    Lines of a diff where each C file is re-indented, gets one real edit
+    and hands a function over to the next file.
+    """
+    for index in range(REFORMAT_FILES):
+        path = f"src/driver_{index}.c"
+        moved = [
+            f"static int helper_{index}(struct device *dev)",
+            "{",
+            "    int flags = read_register(dev, REG_FLAGS);",
+            "    if (flags < 0)",
+            "        return flags;",
+            f"    flags &= FLAG_{index} | FLAG_ENABLED;",
+            "    write_register(dev, REG_FLAGS, flags);",
+            '    dev_dbg(dev, "helper flags: %d\\n", flags);',
+            "    return flags;",
+            "}",
+        ]
+        yield f"diff --git a/{path} b/{path}"
+        yield "index 1234567..89abcde 100644"
+        yield f"--- a/{path}"
+        yield f"+++ b/{path}"
+        yield f"@@ -1,12 +1,12 @@ int probe_{index}(struct device *dev)"
+        yield " {"
+        for line in range(8):
+            yield f"-  setup(dev, {line});"
+            yield f"+    setup(dev,  {line});"
+        yield f"-  return {index};"
+        yield f"+  return {index} + 1;"
+        yield " }"
+        yield "@@ -40,11 +40,1 @@"
+        yield " /* helpers */"
+        yield from ("-" + line for line in moved)
+        yield "@@ -60,1 +50,11 @@"
+        yield " /* imported helpers */"
+        previous = (index - 1) % REFORMAT_FILES
+        yield from ("+" + line.replace(f"_{index}", f"_{previous}") for line in moved)
+
+
+@pytest.fixture
+def corpora(repos) -> dict[str, list[FileDiff]]:
+    git = Git(str(repos["large"]))
+    return {
+        "python-repo": collect_changes(git, load_config(repos["large"]), []).diff_files,
+        "c-reformat": list(parse_diff(reformat_diff())),
+    }
+
+
+@pytest.mark.parametrize("corpus", ["python-repo", "c-reformat"])
+def test_simplify_files(benchmark, baseline, corpora, corpus):
+    """Token reduction and throughput of the diff simplification."""
+    files = corpora[corpus]
+    raw_tokens = estimate_tokens("\n".join(file.render() for file in files))
+
+    simplified = benchmark(simplify_files, files)
+    tokens = estimate_tokens("\n".join(file.render() for file in simplified))
+    assert tokens < raw_tokens
+    if benchmark.stats is not None:
+        lines = sum(len(hunk) for file in files for hunk in file.hunks)
+        benchmark.extra_info["lines_per_second"] = round(
+            lines / benchmark.stats.stats.median
+        )
+    baseline.check(benchmark, token_ratio=tokens / raw_tokens)
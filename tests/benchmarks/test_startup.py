@@ -0,0 +1,77 @@
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from tests.repos import git, make_repo
+
+# Modules that must not be loaded until a provider is needed
+HEAVY_MODULES = ["halo", "langchain_core", "langsmith", "prompt_toolkit"]
+
+
+def import_seconds(module: str) -> float:
+    """Cumulative import time of `module` in a fresh interpreter, best of 5."""
+    timings = []
+    for _ in range(5):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+        # `import time: self [us] | cumulative | imported package`
+        [cumulative] = [
+            int(line.split("|")[1])
+            for line in stderr.splitlines()
+            if line.split("|")[-1].strip() == module
+        ]
+        timings.append(cumulative / 1e6)
+    return min(timings)
+
+
+def test_import_time(baseline):
+    baseline.check(import_seconds=import_seconds("git_aicommit.cli"))
+
+
+def test_no_heavy_imports():
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, git_aicommit.cli; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    assert not set(HEAVY_MODULES) & set(loaded)
+
+
+@pytest.fixture(scope="module")
+def clean_repo(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    repo = make_repo(tmp_path_factory.mktemp("clean") / "repo", files=10, commits=2)
+    git(repo, "commit", "-q", "-m", "feat: commit staged changes")
+    return repo
+
+
+def test_no_staged_changes(benchmark, baseline, clean_repo):
+    """Wall-clock time of a fresh `git aicommit` with nothing to commit."""
+
+    def run() -> str:
+        return subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from git_aicommit.cli import root; "
+                "root(standalone_mode=False); print(' '.join(sys.modules))",
+            ],
+            cwd=clean_repo,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+    output = benchmark(run)
+    assert "No staged changes found." in output
+    # Nothing is done towards a request
+    assert not set(HEAVY_MODULES) & set(output.split())
+    baseline.check(benchmark)
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+import pytest
+from click.testing import CliRunner, Result
+from git_aicommit.daemon import DaemonClient, serve
+from git_aicommit.provider import PROVIDERS
+from tests.fakes import FakeChatModel, FakeProvider
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("baseline", "benchmark baselines")
+    group.addoption(
+        "--update-baseline",
+        action="store_true",
+        help="Store the metrics of the benchmarks that ran as the new baseline.",
+    )
+    group.addoption(
+        "--benchmark-check",
+        action="store_true",
+        help="Also check timings against the baseline. They depend on the "
+        "machine, so only compare with a baseline recorded on the same one.",
+    )
+    group.addoption(
+        "--baseline-threshold",
+        type=float,
+        default=1.0,
+        help="Allowed slowdown over the baseline timings with --benchmark-check, "
+        "e.g. 1.0 for twice as slow (default: 1.0).",
+    )
+
+
+@pytest.fixture(autouse=True)
+def isolated_environment(
+    tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Keep every test away from the user's config, cache, state and daemon."""
+    home = tmp_path_factory.mktemp("home")
+    for name in ("XDG_CACHE_HOME", "XDG_CONFIG_HOME", "XDG_STATE_HOME"):
+        monkeypatch.setenv(name, str(home / name.lower()))
+    runtime = home / "runtime"
+    runtime.mkdir(mode=0o700)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(runtime))
+    monkeypatch.setenv("GIT_AICOMMIT_CONFIG_CEILING", str(home.parent))
+    monkeypatch.delenv("GIT_AICOMMIT_LANGSMITH_PROJECT", raising=False)
+    monkeypatch.delenv("GIT_AICOMMIT_DEBUG", raising=False)
+
+
+@pytest.fixture
+def fake_model(monkeypatch: pytest.MonkeyPatch) -> FakeChatModel:
+    """A `FakeChatModel` that every provider named `openai` is built around."""
+    model = FakeChatModel()
+    monkeypatch.setitem(PROVIDERS, "openai", lambda config: FakeProvider(model))
+    return model
+
+
+@pytest.fixture
+def daemon(fake_model: FakeChatModel) -> Iterator[DaemonClient]:
+    """A daemon serving from a thread, so that it answers with the fake model."""
+    thread = threading.Thread(target=serve, kwargs={"idle_timeout": 600})
+    thread.start()
+    client = DaemonClient()
+    while client.ping() is None:
+        assert thread.is_alive()
+        time.sleep(0.01)
+    yield client
+    client.stop()
+    thread.join()
+
+
+@pytest.fixture
+def run_cli(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Iterator[Callable[..., Result]]:
+    """
+    Run the CLI in a repository, answering the interactive prompt with
+    `keys` (e.g. "q" to quit, "c" to commit).
+    """
+    from git_aicommit.cli import root
+
+    def run(repo: Path, *args: str, keys: str = "q") -> Result:
+        pressed = iter(keys)
+        monkeypatch.chdir(repo)
+        monkeypatch.setattr("readchar.readkey", lambda: next(pressed))
+        return CliRunner().invoke(root, list(args), catch_exceptions=False)
+
+    yield run
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Any, Optional
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import ConfigDict, Field, PrivateAttr
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model for tests and benchmarks.
+
+    Replies with `responses` in turn (repeating the last one) after
+    `latency` seconds, streamed word by word `token_latency` seconds apart.
+    Entries of `errors` are raised by the first calls instead, one each.
+    Every request is recorded, along with how many ran at the same time.
+
+    Subclasses can override `reply` and `delay` to answer depending on the
+    request.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    responses: list[str] = Field(default_factory=lambda: ["feat: update fixtures"])
+    latency: float = 0.0
+    token_latency: float = 0.0
+    errors: list[BaseException] = Field(default_factory=list)
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _requests: list[list[BaseMessage]] = PrivateAttr(default_factory=list)
+    _active: int = PrivateAttr(default=0)
+    _peak_active: int = PrivateAttr(default=0)
+    _cancelled: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def requests(self) -> list[list[BaseMessage]]:
+        """Messages of every request, in the order they were received."""
+        return list(self._requests)
+
+    @property
+    def peak_active(self) -> int:
+        """Most requests in flight at the same time."""
+        return self._peak_active
+
+    @property
+    def cancelled(self) -> int:
+        """Requests cancelled while they were waiting for their reply."""
+        return self._cancelled
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._start(messages)
+        try:
+            time.sleep(self.delay(messages) + self.token_latency * len(text.split()))
+        finally:
+            self._finish()
+        return self._result(messages, text)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._start(messages)
+        try:
+            await asyncio.sleep(
+                self.delay(messages) + self.token_latency * len(text.split())
+            )
+        except asyncio.CancelledError:
+            with self._lock:
+                self._cancelled += 1
+            raise
+        finally:
+            self._finish()
+        return self._result(messages, text)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text = self._start(messages)
+        try:
+            time.sleep(self.delay(messages))
+            for token in _tokens(text):
+                time.sleep(self.token_latency)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        finally:
+            self._finish()
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        text = self._start(messages)
+        try:
+            await asyncio.sleep(self.delay(messages))
+            for token in _tokens(text):
+                await asyncio.sleep(self.token_latency)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        except asyncio.CancelledError:
+            with self._lock:
+                self._cancelled += 1
+            raise
+        finally:
+            self._finish()
+
+    def with_structured_output(  # type: ignore[override]
+        self, schema: Any, *, include_raw: bool = False, **kwargs: Any
+    ) -> Runnable[LanguageModelInput, Any]:
+        """Parse the reply into the only field of `schema`."""
+        [field_name] = schema.model_fields
+
+        def parse(message: BaseMessage) -> Any:
+            parsed = schema(**{field_name: message.text})
+            if include_raw:
+                return {"raw": message, "parsed": parsed, "parsing_error": None}
+            return parsed
+
+        async def aparse(input: LanguageModelInput) -> Any:
+            return parse(await self.ainvoke(input))
+
+        return RunnableLambda(lambda input: parse(self.invoke(input)), afunc=aparse)
+
+    def reply(self, messages: list[BaseMessage], index: int) -> str:
+        """Reply to the `index`th request (counting from 0)."""
+        return self.responses[min(index, len(self.responses) - 1)]
+
+    def delay(self, messages: list[BaseMessage]) -> float:
+        """Seconds before the reply to `messages` starts."""
+        return self.latency
+
+    def _start(self, messages: list[BaseMessage]) -> str:
+        with self._lock:
+            self._requests.append(list(messages))
+            index = len(self._requests) - 1
+            if self.errors:
+                raise self.errors.pop(0)
+            self._active += 1
+            self._peak_active = max(self._peak_active, self._active)
+        return self.reply(messages, index)
+
+    def _finish(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def _result(self, messages: list[BaseMessage], text: str) -> ChatResult:
+        prompt = "".join(message.text for message in messages)
+        message = AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": len(text.split()),
+                "total_tokens": len(prompt) // 4 + len(text.split()),
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeProvider:
+    """`Provider` around a `FakeChatModel`, registered in place of a real one."""
+
+    def __init__(
+        self,
+        chat_model: BaseChatModel,
+        name: str = "openai",
+        concurrency: int = 4,
+        max_retries: int = 0,
+        prompt_cache: Any = None,
+    ):
+        self.name = name
+        self.model_name = "fake"
+        self.chat_model = chat_model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.prompt_cache = prompt_cache
+
+
+def _tokens(text: str) -> Iterator[str]:
+    """Words with their following whitespace, which join back into `text`."""
+    start = 0
+    for index, char in enumerate(text):
+        if char.isspace() and index + 1 < len(text) and not text[index + 1].isspace():
+            yield text[start : index + 1]
+            start = index + 1
+    if start < len(text):
+        yield text[start:]
@@ -0,0 +1,99 @@
+import os
+import subprocess
+from pathlib import Path
+
+# Identity and settings for fixture repositories, independent of the
+# user's git configuration
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Fixture",
+    "GIT_AUTHOR_EMAIL": "fixture@example.com",
+    "GIT_AUTHOR_DATE": "2025-01-01T00:00:00Z",
+    "GIT_COMMITTER_NAME": "Fixture",
+    "GIT_COMMITTER_EMAIL": "fixture@example.com",
+    "GIT_COMMITTER_DATE": "2025-01-01T00:00:00Z",
+    "GIT_CONFIG_GLOBAL": os.devnull,
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+CONFIG = """provider: openai
+openai:
+  model: fake
+  api-key: fake
+"""
+
+
+def git(repo: Path, *args: str, input: str | None = None) -> str:
+    return subprocess.run(
+        ["git", *args],
+        cwd=repo,
+        env={**os.environ, **GIT_ENV},
+        input=input,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+def module_source(index: int, version: int, functions: int) -> str:
+    """A Python module whose function bodies depend on `version`."""
+    lines = [f'"""Module {index}."""', "", "import math", ""]
+    for function in range(functions):
+        lines += [
+            "",
+            f"def function_{index}_{function}(value, scale={version + 1}):",
+            f'    """Scale `value` for case {function}."""',
+            f"    result = math.sqrt(abs(value)) * scale + {function * version}",
+            "    if result > 100:",
+            "        return result / 2",
+            "    return result",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def make_repo(
+    path: Path, files: int, functions: int = 8, commits: int = 20, config: str = CONFIG
+) -> Path:
+    """
+    Create a repository of `files` Python modules under a few packages,
+    with `commits` commits of history and a mixed set of staged changes:
+    edited functions, a new module, a deleted one and a rename.
+
+    The config file is committed, so it never shows up in the staged diff.
+    """
+    path.mkdir(parents=True)
+    git(path, "init", "-q", "-b", "main")
+    # For commits made by git-aicommit itself
+    git(path, "config", "user.name", GIT_ENV["GIT_AUTHOR_NAME"])
+    git(path, "config", "user.email", GIT_ENV["GIT_AUTHOR_EMAIL"])
+    (path / "aicommit.yml").write_text(config)
+    paths = [f"pkg{index % 8}/module_{index}.py" for index in range(files)]
+    for relative in paths:
+        (path / relative).parent.mkdir(exist_ok=True)
+
+    for commit in range(commits):
+        # Each commit touches a different slice of the modules
+        touched = [
+            index for index in range(files) if commit == 0 or index % commits == commit
+        ] or [commit % files]
+        for index in touched:
+            (path / paths[index]).write_text(module_source(index, commit, functions))
+        git(path, "add", "-A")
+        scope = f"pkg{commit % 8}"
+        git(
+            path,
+            "commit",
+            "-q",
+            "-m",
+            f"feat({scope}): update {scope} modules #{commit}",
+        )
+
+    for index, relative in enumerate(paths):
+        if index % 3 == 0:
+            (path / relative).write_text(module_source(index, commits, functions))
+    (path / "pkg0" / "added.py").write_text(module_source(files, 0, functions))
+    if files > 2:
+        git(path, "rm", "-q", paths[1])
+        git(path, "mv", paths[2], "pkg0/renamed.py")
+    git(path, "add", "-A")
+    return path
@@ -0,0 +1,98 @@
+import threading
+from pathlib import Path
+import pytest
+from git_aicommit import batch as batch_module
+from git_aicommit.batch import run_batch
+from git_aicommit.config import load_config
+from git_aicommit.pipeline import collect_changes
+from tests.fakes import FakeChatModel, FakeProvider
+from tests.repos import git, make_repo
+
+
+def batch(repos: list[Path], model: FakeChatModel, commit: bool) -> dict[str, dict]:
+    results = run_batch(
+        repos,
+        provider=FakeProvider(model),
+        config=load_config(repos[0]),
+        exclude_files=[],
+        commit=commit,
+    )
+    return {Path(result["repo"]).name: result for result in results}
+
+
+def test_generates_for_every_repository(tmp_path: Path):
+    repos = [make_repo(tmp_path / name, files=3, commits=2) for name in ("a", "b")]
+    model = FakeChatModel()
+
+    results = batch(repos, model, commit=False)
+
+    assert {name: result["message"] for name, result in results.items()} == {
+        "a": "feat: update fixtures",
+        "b": "feat: update fixtures",
+    }
+    assert not any(result["cached"] for result in results.values())
+    assert len(model.requests) == 2
+
+
+def test_failed_commit_of_a_cached_message_does_not_stop_the_batch(tmp_path: Path):
+    repos = [make_repo(tmp_path / name, files=3, commits=2) for name in ("a", "b")]
+    batch(repos, FakeChatModel(), commit=False)
+    hook = repos[0] / ".git" / "hooks" / "pre-commit"
+    hook.write_text("#!/bin/sh\nexit 1\n")
+    hook.chmod(0o755)
+    model = FakeChatModel()
+
+    results = batch(repos, model, commit=True)
+
+    assert set(results) == {"a", "b"}
+    assert "error" in results["a"]
+    assert results["b"]["cached"] and results["b"]["committed"]
+    assert git(repos[1], "log", "-1", "--format=%s").strip() == "feat: update fixtures"
+    assert model.requests == []
+
+
+def test_results_are_yielded_while_others_are_collected(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    repos = [make_repo(tmp_path / name, files=3, commits=2) for name in ("a", "b")]
+    released = threading.Event()
+    waited: list[bool] = []
+
+    def slow_collect_changes(git, *args):
+        if git.path.name == "b":
+            # Finishes only once the result for `a` has been consumed
+            waited.append(released.wait(timeout=5))
+        return collect_changes(git, *args)
+
+    monkeypatch.setattr(batch_module, "collect_changes", slow_collect_changes)
+    results = run_batch(
+        repos,
+        provider=FakeProvider(FakeChatModel()),
+        config=load_config(repos[0]),
+        exclude_files=[],
+    )
+
+    first = next(results)
+    released.set()
+    rest = list(results)
+
+    assert Path(first["repo"]).name == "a"
+    assert [Path(result["repo"]).name for result in rest] == ["b"]
+    assert waited == [True]
+
+
+def test_same_repository_given_twice_runs_once(tmp_path: Path):
+    repo = make_repo(tmp_path / "a", files=3, commits=2)
+    model = FakeChatModel()
+
+    results = list(
+        run_batch(
+            [repo, repo / ".." / "a"],
+            provider=FakeProvider(model),
+            config=load_config(repo),
+            exclude_files=[],
+        )
+    )
+
+    assert [result["repo"] for result in results] == [str(repo)]
+    assert len(model.requests) == 1
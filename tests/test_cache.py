@@ -0,0 +1,152 @@
+import os
+import time
+from pathlib import Path
+import pytest
+from git_aicommit.cache import MessageCache, cache_key
+from git_aicommit.config import Config
+from git_aicommit.pipeline import message_cache_key
+
+TREE = "4b825dc642cb6eb9a060e54bf8d69288fbc4904d"
+
+
+def config(openai: dict | None = None, **settings: object) -> Config:
+    return Config.model_validate(
+        {
+            "provider": "openai",
+            "openai": {"model": "gpt-4.1", "api-key": "secret", **(openai or {})},
+            **settings,
+        }
+    )
+
+
+def key(config: Config, **parts: object) -> str:
+    arguments: dict = {
+        "tree": TREE,
+        "exclude_files": ["uv.lock"],
+        "recent_logs": ["feat: earlier"],
+        "user_instructions": None,
+        "language": None,
+        "map_reduce": False,
+        **parts,
+    }
+    return message_cache_key(config, **arguments)
+
+
+def set_mtime(path: Path, seconds_ago: float) -> None:
+    mtime = time.time() - seconds_ago
+    os.utime(path, (mtime, mtime))
+
+
+def test_key_does_not_depend_on_the_order_of_its_parts():
+    assert cache_key(a=1, b=[2, 3]) == cache_key(b=[2, 3], a=1)
+    assert cache_key(a=1, b=[2, 3]) != cache_key(a=1, b=[3, 2])
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"openai": {"api-key": "rotated"}},
+        {"openai": {"concurrency": 1}},
+        {"openai": {"max-retries": 0}},
+        {"openai": {"requests-per-minute": 60}},
+        {"openai": {"timeout": 5}},
+        {"stream": True},
+        {"stats": False},
+        {"daemon": True},
+    ],
+)
+def test_key_ignores_settings_that_only_change_how_requests_are_sent(settings):
+    assert key(config(**settings)) == key(config())
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"openai": {"model": "gpt-4.1-mini"}},
+        {"openai": {"temperature": 0.7}},
+        {"max-diff-tokens": 1000},
+        {"context-tokens": 500},
+        {"semantic-diff": True},
+        {"generated-files": {"exclude": ["dist/**"]}},
+    ],
+)
+def test_key_changes_with_settings_that_shape_the_message(settings):
+    assert key(config(**settings)) != key(config())
+
+
+@pytest.mark.parametrize(
+    "parts",
+    [
+        {"tree": "0" * 40},
+        {"exclude_files": []},
+        {"recent_logs": ["feat: later"]},
+        {"user_instructions": "Use the imperative mood."},
+        {"language": "Japanese"},
+        {"map_reduce": True},
+    ],
+)
+def test_key_changes_with_the_staged_changes_and_options(parts):
+    assert key(config(), **parts) != key(config())
+
+
+def test_returns_messages_for_the_key_newest_first(tmp_path: Path):
+    cache = MessageCache(tmp_path)
+    cache.add("a", "feat: first")
+    cache.add("b", "feat: other key")
+    cache.add("a", "feat: second")
+    first, second = sorted(tmp_path.glob("a.*.json"), key=lambda p: p.read_text())
+    set_mtime(first, 10)
+    set_mtime(second, 5)
+
+    assert cache.get("a") == ["feat: second", "feat: first"]
+    assert cache.get("c") == []
+
+
+def test_evicts_the_oldest_entries_beyond_the_cap(tmp_path: Path):
+    cache = MessageCache(tmp_path, max_entries=3)
+    for number in range(3):
+        cache.add(f"key{number}", f"feat: #{number}")
+        set_mtime(next(tmp_path.glob(f"key{number}.*.json")), 100 - number)
+
+    cache.add("key3", "feat: #3")
+
+    assert cache.stats().entries == 3
+    assert cache.get("key0") == []
+    assert [cache.get(f"key{number}") for number in (1, 2, 3)] == [
+        ["feat: #1"],
+        ["feat: #2"],
+        ["feat: #3"],
+    ]
+
+
+def test_expired_entries_are_misses_and_evicted(tmp_path: Path):
+    cache = MessageCache(tmp_path, max_age_seconds=60)
+    cache.add("a", "feat: old")
+    set_mtime(next(tmp_path.glob("a.*.json")), 120)
+
+    assert cache.get("a") == []
+    cache.evict()
+    assert cache.stats().entries == 0
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b'{"message": "feat: trunc',
+        b"",
+        b"\xff\xfe not utf-8",
+        b"[]",
+        b"{}",
+        b'{"message": 1}',
+        b'"feat: not an object"',
+    ],
+)
+def test_skips_malformed_entries(tmp_path: Path, content: bytes):
+    cache = MessageCache(tmp_path)
+    cache.add("a", "feat: valid")
+    (tmp_path / "a.malformed.json").write_bytes(content)
+
+    assert cache.get("a") == ["feat: valid"]
+    cache.add("a", "feat: another")
+    assert sorted(cache.get("a")) == ["feat: another", "feat: valid"]
+    assert cache.clear() == 3
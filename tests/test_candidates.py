@@ -0,0 +1,143 @@
+import time
+from collections.abc import Callable
+from pathlib import Path
+import pytest
+from git_aicommit.ai import AI
+from git_aicommit.candidates import Candidates
+from git_aicommit.daemon import DaemonAI, DaemonClient
+from git_aicommit.fallback import FallbackChatModel
+from tests.fakes import FakeChatModel
+from tests.repos import CONFIG
+
+
+def generator(ai: AI | DaemonAI, finished: list[str]) -> Callable[[int], str]:
+    """Generate for any variant, noting messages whose generation returned."""
+
+    def generate(variant: int) -> str:
+        message = ai.generate_commit_message([], "+a = 1", [])
+        finished.append(message)
+        return message
+
+    return generate
+
+
+def wait_for(condition: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_runs_at_most_concurrency_at_once():
+    model = FakeChatModel(latency=0.05)
+    finished: list[str] = []
+    pool = Candidates(generator(AI(model), finished), concurrency=2)
+
+    pool.submit(5)
+    for _ in range(5):
+        pool.wait_next()
+
+    assert len(pool.messages) == len(pool.elapsed_seconds) == 5
+    assert model.peak_active == 2
+    assert pool.pending == 0
+
+
+def test_skips_failures_while_others_are_pending():
+    model = FakeChatModel(
+        responses=["feat: second"], errors=[ConnectionError("connection reset")]
+    )
+    pool = Candidates(generator(AI(model), []), concurrency=1)
+
+    pool.submit(2)
+
+    assert pool.wait_next() == "feat: second"
+    assert pool.pending == 0
+
+
+def test_raises_the_last_error_when_all_fail():
+    model = FakeChatModel(
+        errors=[ConnectionError("connection reset"), ConnectionError("timed out")]
+    )
+    pool = Candidates(generator(AI(model), []), concurrency=1)
+
+    pool.submit(2)
+
+    with pytest.raises(ConnectionError, match="timed out"):
+        pool.wait_next()
+    with pytest.raises(RuntimeError, match="No pending candidates"):
+        pool.wait_next()
+
+
+def test_cancel_stops_requests_in_flight():
+    model = FakeChatModel(latency=5)
+    finished: list[str] = []
+    pool = Candidates(generator(AI(model), finished), concurrency=2)
+    pool.submit(3)
+    wait_for(lambda: len(model.requests) == 2)
+
+    pool.cancel()
+
+    wait_for(lambda: model.cancelled == 2)
+    assert pool.pending == 0
+    # The queued third never started, and no generation returned a message
+    time.sleep(0.05)
+    assert len(model.requests) == 2
+    assert not finished
+
+
+def test_cancel_stops_a_streamed_request():
+    model = FakeChatModel(responses=["feat: one two three"], token_latency=5)
+    partials: list[str] = []
+    ai = AI(model)
+    pool = Candidates(
+        lambda _: ai.generate_commit_message(
+            [], "+a = 1", [], on_token=partials.append
+        ),
+        concurrency=1,
+    )
+    pool.submit()
+    wait_for(lambda: len(model.requests) == 1)
+
+    pool.cancel()
+
+    wait_for(lambda: model.cancelled == 1)
+    assert not partials
+
+
+def test_cancel_stops_every_fallback_backend():
+    primary = FakeChatModel(latency=5)
+    secondary = FakeChatModel(latency=5)
+    model = FallbackChatModel(
+        backends=[primary, secondary],
+        names=["primary", "secondary"],
+        timeouts=[None, None],
+        hedge_after=0.01,
+    )
+    finished: list[str] = []
+    pool = Candidates(generator(AI(model), finished), concurrency=1)
+    pool.submit()
+    wait_for(lambda: len(secondary.requests) == 1)
+
+    pool.cancel()
+
+    wait_for(lambda: primary.cancelled == secondary.cancelled == 1)
+    assert not finished
+
+
+def test_cancel_stops_the_daemon_request(
+    daemon: DaemonClient, fake_model: FakeChatModel, tmp_path: Path
+):
+    (tmp_path / "aicommit.yml").write_text(CONFIG)
+    fake_model.latency = 5
+    finished: list[str] = []
+    pool = Candidates(
+        generator(DaemonAI(daemon, cwd=tmp_path), finished), concurrency=1
+    )
+    pool.submit()
+    wait_for(lambda: len(fake_model.requests) == 1)
+
+    pool.cancel()
+
+    # The daemon notices the closed connection and cancels its request
+    wait_for(lambda: fake_model.cancelled == 1)
+    assert not finished
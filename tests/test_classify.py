@@ -0,0 +1,128 @@
+from pathlib import Path
+import pytest
+from git_aicommit.classify import GENERATED_ATTRIBUTES, classify_files, matches
+from git_aicommit.config import GeneratedFilesConfig
+from git_aicommit.diff import FileDiff
+from git_aicommit.git import Git
+from tests.repos import git
+
+
+def file_diff(path: str, **fields) -> FileDiff:
+    return FileDiff(
+        path=path,
+        header=[f"diff --git a/{path} b/{path}"],
+        hunks=[["@@ -1 +1 @@", "-a = 1", "+a = 2"]],
+        additions=1,
+        deletions=1,
+        **fields,
+    )
+
+
+@pytest.mark.parametrize(
+    ("path", "pattern", "expected"),
+    [
+        ("dist/app.min.js", "*.min.js", True),
+        ("app.min.js", "*.min.js", True),
+        ("src/app.js", "*.min.js", False),
+        ("api/service_pb2.py", "*_pb2.py", True),
+        ("src/vendor/lib/a.go", "**/vendor/**", True),
+        ("vendor/lib/a.go", "**/vendor/**", True),
+        ("src/vendored.go", "**/vendor/**", False),
+        ("docs/api.md", "docs/*.md", True),
+        ("src/docs/api.md", "docs/*.md", False),
+    ],
+)
+def test_matches_like_gitignore(path, pattern, expected):
+    assert matches(path, pattern) is expected
+
+
+def test_classify_excludes_and_summarizes_by_pattern():
+    config = GeneratedFilesConfig(exclude=["*.lock"], summarize=["fixtures/**"])
+    files = [
+        file_diff("src/main.py"),
+        file_diff("poetry.lock"),
+        file_diff("fixtures/data.json"),
+        file_diff("static/app.min.js"),
+    ]
+
+    classified = classify_files(files, {}, config)
+
+    assert [(file.path, file.generated) for file in classified] == [
+        ("src/main.py", False),
+        ("fixtures/data.json", True),
+        ("static/app.min.js", True),
+    ]
+    assert not classified[1].hunks and not classified[1].header
+
+
+@pytest.mark.parametrize(
+    ("attributes", "expected"),
+    [
+        ({"linguist-generated": "set"}, True),
+        ({"linguist-generated": "true"}, True),
+        ({"linguist-vendored": "set"}, True),
+        ({"diff": "unset"}, True),
+        ({"linguist-generated": "unspecified"}, False),
+        ({"diff": "unspecified"}, False),
+    ],
+)
+def test_classify_by_attributes(attributes, expected):
+    [file] = classify_files(
+        [file_diff("src/schema.py")],
+        {"src/schema.py": attributes},
+        GeneratedFilesConfig(),
+    )
+
+    assert file.generated is expected
+
+
+def test_generated_false_overrides_patterns():
+    [file] = classify_files(
+        [file_diff("web/app.min.js")],
+        {"web/app.min.js": {"linguist-generated": "false"}},
+        GeneratedFilesConfig(),
+    )
+
+    assert not file.generated
+
+
+def test_classify_by_size_and_line_length():
+    config = GeneratedFilesConfig.model_validate(
+        {"max-lines": 100, "max-line-length": 200}
+    )
+    files = [
+        file_diff("small.py"),
+        file_diff("large.py"),
+        file_diff("minified.py", longest_line=201),
+    ]
+    files[1].additions = 100
+
+    classified = classify_files(files, {}, config)
+
+    assert [file.generated for file in classified] == [False, True, True]
+
+
+def test_summary_only_files_are_left_alone():
+    [file] = classify_files(
+        [file_diff("image.png", binary=True)], {}, GeneratedFilesConfig()
+    )
+
+    assert file.binary and not file.generated
+
+
+def test_check_attributes_reads_index(tmp_path: Path):
+    git(tmp_path, "init", "-q")
+    (tmp_path / ".gitattributes").write_text(
+        "gen/* linguist-generated\nthird_party/** linguist-vendored\n*.bin -diff\n"
+    )
+    git(tmp_path, "add", ".gitattributes")
+    paths = ["gen/schema.py", "third_party/lib/a.c", "data.bin", "src/main.py"]
+
+    attributes = Git(str(tmp_path)).check_attributes(paths, GENERATED_ATTRIBUTES)
+    files = classify_files(
+        [file_diff(path) for path in paths], attributes, GeneratedFilesConfig()
+    )
+
+    assert attributes["gen/schema.py"]["linguist-generated"] == "set"
+    assert attributes["data.bin"]["diff"] == "unset"
+    assert [file.generated for file in files] == [True, True, True, False]
@@ -0,0 +1,94 @@
+import os
+import time
+from pathlib import Path
+import pytest
+from git_aicommit import config as config_module
+from git_aicommit.config import load_config
+from git_aicommit.paths import cache_directory
+from tests.repos import CONFIG
+
+
+def make_old(*paths: Path) -> None:
+    """Date `paths` back, since recently modified ones are never cached."""
+    modified = time.time() - 60
+    for path in paths:
+        os.utime(path, (modified, modified))
+
+
+@pytest.fixture
+def tree(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A working directory below a config file with an API key, and one without."""
+    monkeypatch.setenv("GIT_AICOMMIT_CONFIG_CEILING", str(tmp_path))
+    (tmp_path / "aicommit.yml").write_text(CONFIG)
+    (tmp_path / "project").mkdir()
+    (tmp_path / "project" / ".aicommit.yml").write_text("language: English\n")
+    (tmp_path / "project" / "src").mkdir()
+    make_old(
+        tmp_path / "aicommit.yml",
+        tmp_path / "project" / ".aicommit.yml",
+        tmp_path / "project" / "src",
+        tmp_path / "project",
+        tmp_path,
+    )
+    return tmp_path / "project" / "src"
+
+
+@pytest.fixture
+def parsed(monkeypatch: pytest.MonkeyPatch) -> list[Path]:
+    """Config files parsed, in order."""
+    paths: list[Path] = []
+    load_yaml = config_module._load_yaml
+
+    def recording_load_yaml(config_path: Path):
+        paths.append(config_path)
+        return load_yaml(config_path)
+
+    monkeypatch.setattr(config_module, "_load_yaml", recording_load_yaml)
+    return paths
+
+
+def test_hit_only_parses_the_files_with_api_keys(tree: Path, parsed: list[Path]):
+    loaded = load_config(tree)
+    parsed.clear()
+
+    cached = load_config(tree)
+
+    assert cached == loaded
+    assert cached.language == "English"
+    assert parsed == [tree.parent.parent / "aicommit.yml"]
+
+
+def test_api_keys_are_not_cached(tree: Path):
+    load_config(tree)
+
+    [entry] = (cache_directory() / "configs").iterdir()
+    assert "fake" not in entry.read_text().replace('"model": "fake"', "")
+
+
+def test_edited_config_file_is_reloaded(tree: Path):
+    load_config(tree)
+    config_path = tree.parent / ".aicommit.yml"
+    config_path.write_text("language: Japanese\n")
+    make_old(config_path)
+
+    assert load_config(tree).language == "Japanese"
+
+
+def test_caches_with_a_directory_that_cannot_be_stated(
+    tree: Path, parsed: list[Path], monkeypatch: pytest.MonkeyPatch
+):
+    blocked = str(tree.parent)
+    stat = os.stat
+
+    def failing_stat(path, *args, **kwargs):
+        if os.fspath(path) == blocked:
+            raise PermissionError(13, "Permission denied", blocked)
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", failing_stat)
+    load_config(tree)
+    parsed.clear()
+
+    assert load_config(tree).language == "English"
+    # Only the file with the API key was parsed again
+    assert parsed == [tree.parent.parent / "aicommit.yml"]
@@ -0,0 +1,53 @@
+from git_aicommit.diff import FileDiff, collapse_renames, parse_diff
+
+
+def rename(old_path: str, path: str, *lines: str) -> list[str]:
+    return [
+        f"diff --git a/{old_path} b/{path}",
+        *lines,
+        f"rename from {old_path}",
+        f"rename to {path}",
+    ]
+
+
+def collapse(*lines: list[str]) -> list[FileDiff]:
+    return collapse_renames(parse_diff(line for file in lines for line in file))
+
+
+def test_moved_directory_takes_one_line():
+    [collapsed] = collapse(
+        rename("lib/a.py", "vendor/a.py", "similarity index 100%"),
+        rename("lib/b.py", "vendor/b.py", "similarity index 100%"),
+    )
+
+    assert collapsed.header == ["# lib/ -> vendor/: 2 files renamed without changes"]
+
+
+def test_mode_change_keeps_its_own_entry():
+    collapsed = collapse(
+        rename("lib/a.py", "vendor/a.py", "similarity index 100%"),
+        rename(
+            "lib/run.sh",
+            "vendor/run.sh",
+            "old mode 100644",
+            "new mode 100755",
+            "similarity index 100%",
+        ),
+        rename("lib/b.py", "vendor/b.py", "similarity index 100%"),
+    )
+
+    assert [file.path for file in collapsed] == ["vendor/", "vendor/run.sh"]
+    assert collapsed[0].header == ["# lib/ -> vendor/: 2 files renamed without changes"]
+    assert "new mode 100755" in collapsed[1].render()
+
+
+def test_edited_rename_keeps_its_own_entry():
+    collapsed = collapse(
+        rename("lib/a.py", "vendor/a.py", "similarity index 100%"),
+        rename("lib/b.py", "vendor/b.py", "similarity index 90%")
+        + ["--- a/lib/b.py", "+++ b/vendor/b.py", "@@ -1 +1 @@", "-x = 1", "+x = 2"],
+    )
+
+    assert [file.path for file in collapsed] == ["vendor/a.py", "vendor/b.py"]
+    assert collapsed[0].header == ["# lib/a.py -> vendor/a.py: renamed without changes"]
+    assert collapsed[1].hunks == [["@@ -1 +1 @@", "-x = 1", "+x = 2"]]
@@ -0,0 +1,170 @@
+import asyncio
+import time
+import pytest
+from langchain_core.messages import HumanMessage
+from git_aicommit.ai import Commit
+from langchain_core.messages import BaseMessage
+from git_aicommit.fallback import Decision, FallbackChatModel, recording_decisions
+from tests.fakes import FakeChatModel
+
+MESSAGES = [HumanMessage("<diff>+a = 1</diff>")]
+
+
+def fallback(
+    *backends: FakeChatModel, timeouts=None, hedge_after=None
+) -> FallbackChatModel:
+    return FallbackChatModel(
+        backends=list(backends),
+        names=[f"backend{index}" for index in range(len(backends))],
+        timeouts=timeouts or [None] * len(backends),
+        hedge_after=hedge_after,
+    )
+
+
+def decided(model: FallbackChatModel) -> tuple[BaseMessage, Decision]:
+    """The reply to `MESSAGES` and the decision behind it."""
+    with recording_decisions() as decisions:
+        reply = model.invoke(MESSAGES)
+    [decision] = decisions
+    return reply, decision
+
+
+def streamed(model: FallbackChatModel) -> tuple[list[tuple[float, str]], Decision]:
+    """Chunks of the reply to `MESSAGES` with when they arrived, and the decision."""
+
+    async def collect() -> list[tuple[float, str]]:
+        start = time.monotonic()
+        return [
+            (time.monotonic() - start, chunk.text)
+            async for chunk in model.astream(MESSAGES)
+        ]
+
+    with recording_decisions() as decisions:
+        chunks = asyncio.run(collect())
+    [decision] = decisions
+    return chunks, decision
+
+
+def wait_cancelled(model: FakeChatModel) -> int:
+    """Cancellation lands on the event loop thread shortly after the race."""
+    deadline = time.monotonic() + 1
+    while not model.cancelled and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return model.cancelled
+
+
+def test_primary_answers():
+    primary = FakeChatModel(responses=["feat: primary"])
+    secondary = FakeChatModel(responses=["feat: secondary"])
+
+    reply, decision = decided(fallback(primary, secondary))
+
+    assert reply.text == "feat: primary"
+    assert not secondary.requests
+    assert decision.backend == "backend0"
+    assert not decision.notes and not decision.hedged
+
+
+def test_fails_over_on_error():
+    primary = FakeChatModel(errors=[ConnectionError("connection reset")])
+    secondary = FakeChatModel(responses=["feat: secondary"])
+
+    reply, decision = decided(fallback(primary, secondary))
+
+    assert reply.text == "feat: secondary"
+    assert decision.backend == "backend1"
+    assert decision.notes == ["backend0 failed: connection reset"]
+
+
+def test_fails_over_on_timeout_and_cancels_the_primary():
+    primary = FakeChatModel(responses=["feat: primary"], latency=5)
+    secondary = FakeChatModel(responses=["feat: secondary"])
+    start = time.monotonic()
+
+    reply, decision = decided(fallback(primary, secondary, timeouts=[0.05, None]))
+
+    assert reply.text == "feat: secondary"
+    assert time.monotonic() - start < 1
+    assert decision.notes == ["backend0 timed out after 0.05s"]
+    assert wait_cancelled(primary) == 1
+
+
+def test_hedge_cancels_the_loser():
+    primary = FakeChatModel(responses=["feat: primary"], latency=5)
+    secondary = FakeChatModel(responses=["feat: secondary"], latency=0.01)
+
+    reply, decision = decided(fallback(primary, secondary, hedge_after=0.05))
+
+    assert reply.text == "feat: secondary"
+    assert decision.hedged
+    assert decision.notes == ["backend0 slower than 0.05s, hedged with backend1"]
+    assert wait_cancelled(primary) == 1
+    assert not secondary.cancelled
+
+
+def test_no_hedge_when_primary_is_fast():
+    primary = FakeChatModel(responses=["feat: primary"], latency=0.01)
+    secondary = FakeChatModel(responses=["feat: secondary"])
+
+    fallback(primary, secondary, hedge_after=0.5).invoke(MESSAGES)
+
+    assert not secondary.requests
+
+
+def test_raises_the_last_error():
+    primary = FakeChatModel(errors=[ConnectionError("connection reset")])
+    secondary = FakeChatModel(latency=5)
+
+    with pytest.raises(TimeoutError, match="backend1 timed out after 0.05s"):
+        fallback(primary, secondary, timeouts=[None, 0.05]).invoke(MESSAGES)
+    assert wait_cancelled(secondary) == 1
+
+
+def test_structured_output_fails_over():
+    primary = FakeChatModel(errors=[ConnectionError("connection reset")])
+    secondary = FakeChatModel(responses=["feat: secondary"])
+
+    with recording_decisions() as decisions:
+        commit = (
+            fallback(primary, secondary).with_structured_output(Commit).invoke(MESSAGES)
+        )
+
+    assert commit == Commit(message="feat: secondary")
+    assert [decision.backend for decision in decisions] == ["backend1"]
+
+
+def test_streams_chunks_as_they_arrive():
+    primary = FakeChatModel(
+        responses=["feat: stream through fallbacks"], token_latency=0.05
+    )
+    secondary = FakeChatModel(responses=["feat: secondary"])
+
+    chunks, decision = streamed(fallback(primary, secondary, timeouts=[1, None]))
+
+    assert "".join(text for _, text in chunks) == "feat: stream through fallbacks"
+    assert len([text for _, text in chunks if text]) == 4
+    # The first chunk is passed on before the backend finished its reply
+    assert chunks[0][0] < chunks[-1][0] - 0.1
+    assert decision.backend == "backend0"
+    assert not secondary.requests
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    primary = FakeChatModel(errors=[ConnectionError("connection reset")])
+    secondary = FakeChatModel(responses=["feat: secondary"])
+
+    chunks, decision = streamed(fallback(primary, secondary))
+
+    assert "".join(text for _, text in chunks) == "feat: secondary"
+    assert decision.notes == ["backend0 failed: connection reset"]
+
+
+def test_hedged_stream_cancels_the_loser():
+    primary = FakeChatModel(responses=["feat: primary"], latency=5)
+    secondary = FakeChatModel(responses=["feat: secondary"], token_latency=0.01)
+
+    chunks, decision = streamed(fallback(primary, secondary, hedge_after=0.05))
+
+    assert "".join(text for _, text in chunks) == "feat: secondary"
+    assert decision.hedged
+    assert wait_cancelled(primary) == 1
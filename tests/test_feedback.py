@@ -0,0 +1,45 @@
+from collections.abc import Callable
+from pathlib import Path
+import pytest
+from click.testing import Result
+from git_aicommit.cli.main import MAX_FEEDBACK_ITEMS
+from tests.fakes import FakeChatModel
+from tests.repos import make_repo
+
+ROUNDS = MAX_FEEDBACK_ITEMS + 5
+
+
+def feedback(round: int) -> str:
+    return f"feedback #{round:02d}: " + ", ".join(["mention the scaling factor"] * 4)
+
+
+def test_regenerating_sends_a_bounded_conversation(
+    tmp_path: Path,
+    fake_model: FakeChatModel,
+    run_cli: Callable[..., Result],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    repo = make_repo(tmp_path / "repo", files=3, commits=2)
+    fake_model.responses = [
+        f"feat: attempt #{round:02d}" for round in range(ROUNDS + 1)
+    ]
+    answers = iter(feedback(round) for round in range(ROUNDS))
+    monkeypatch.setattr("git_aicommit.prompt.prompt", lambda message: next(answers))
+
+    result = run_cli(repo, "--no-cache", keys="r" * ROUNDS + "q")
+
+    assert result.exit_code == 1 and "Aborted commit." in result.output
+    requests = fake_model.requests
+    assert len(requests) == ROUNDS + 1
+    # Every round sends the prompt, the latest message and the feedback
+    assert len({len(request) for request in requests[1:]}) == 1
+    sizes = [sum(len(message.text) for message in request) for request in requests]
+    assert len(set(sizes[MAX_FEEDBACK_ITEMS:])) == 1
+
+    last = "".join(message.text for message in requests[-1])
+    assert f"feat: attempt #{ROUNDS - 1:02d}" in last
+    assert "feat: attempt #00" not in last
+    # Only the latest feedback items are kept
+    assert f"<item>{feedback(ROUNDS - 1)}</item>" in last
+    assert f"<item>{feedback(ROUNDS - MAX_FEEDBACK_ITEMS)}</item>" in last
+    assert f"<item>{feedback(ROUNDS - MAX_FEEDBACK_ITEMS - 1)}</item>" not in last
@@ -0,0 +1,56 @@
+from pathlib import Path
+import pytest
+from git_aicommit import git as git_module
+from git_aicommit.config import load_config
+from git_aicommit.diff import FileDiff, parse_diff, tokens_to_chars
+from git_aicommit.git import Git
+from git_aicommit.pipeline import DIFF_READ_AHEAD, collect_changes
+from tests.repos import CONFIG, make_repo
+
+MAX_DIFF_TOKENS = 500
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    """Far more staged changes than `max-diff-tokens` can show."""
+    return make_repo(
+        tmp_path / "repo",
+        files=60,
+        commits=2,
+        config=CONFIG + f"max-diff-tokens: {MAX_DIFF_TOKENS}\nmax-file-tokens: 4000\n",
+    )
+
+
+@pytest.fixture
+def parsed(monkeypatch: pytest.MonkeyPatch) -> list[FileDiff]:
+    """Files parsed from the diff, in order."""
+    files: list[FileDiff] = []
+
+    def recording_parse_diff(lines, **kwargs):
+        for file in parse_diff(lines, **kwargs):
+            files.append(file)
+            yield file
+
+    monkeypatch.setattr(git_module, "parse_diff", recording_parse_diff)
+    return files
+
+
+def test_diff_is_read_up_to_the_budget(repo: Path, parsed: list[FileDiff]):
+    config = load_config(repo)
+
+    changes = collect_changes(Git(str(repo)), config, [])
+
+    max_chars = tokens_to_chars(MAX_DIFF_TOKENS, config.provider) * DIFF_READ_AHEAD
+    assert changes.diff_truncated
+    assert sum(file.size for file in parsed[:-1]) <= max_chars
+    assert len(parsed) < len(changes.files) // 2
+    # The files never read are still listed
+    assert {file.path for file in changes.diff_files} == set(changes.staged_files)
+    assert all(file.oversized for file in changes.diff_files[len(parsed) :])
+
+
+def test_map_reduce_reads_the_whole_diff(repo: Path, parsed: list[FileDiff]):
+    changes = collect_changes(Git(str(repo)), load_config(repo), [], map_reduce=True)
+
+    assert not changes.diff_truncated
+    assert len(parsed) == len(changes.files)
@@ -0,0 +1,99 @@
+from pathlib import Path
+import pytest
+from git_aicommit import history
+from git_aicommit.git import Git
+from git_aicommit.history import HistoryIndex
+from tests.repos import git, make_repo
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    return make_repo(tmp_path / "repo", files=3, commits=4)
+
+
+@pytest.fixture
+def index(tmp_path: Path) -> HistoryIndex:
+    return HistoryIndex(tmp_path / "history.sqlite3")
+
+
+def commit(repo: Path, message: str, *args: str) -> None:
+    (repo / "notes.txt").write_text(message)
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", message, *args)
+
+
+def messages(index: HistoryIndex) -> list[str]:
+    return index.select([], max_count=100)
+
+
+def test_indexes_new_commits_after_a_fast_forward(repo: Path, index: HistoryIndex):
+    index.update(Git(str(repo)))
+
+    commit(repo, "feat: first")
+    commit(repo, "feat: second")
+
+    assert index.update(Git(str(repo))) == 2
+    assert messages(index)[:3] == [
+        "feat: second",
+        "feat: first",
+        "feat(pkg3): update pkg3 modules #3",
+    ]
+    assert index.head() == git(repo, "rev-parse", "HEAD").strip()
+
+
+def test_drops_commits_left_behind_by_an_amend(repo: Path, index: HistoryIndex):
+    commit(repo, "feat: typo")
+    index.update(Git(str(repo)))
+
+    git(repo, "commit", "-q", "--amend", "-m", "feat: fixed")
+
+    assert index.update(Git(str(repo))) == 1
+    assert "feat: fixed" in messages(index)
+    assert "feat: typo" not in messages(index)
+
+
+def test_drops_commits_left_behind_by_a_rebase(repo: Path, index: HistoryIndex):
+    git(repo, "stash", "-q")
+    git(repo, "checkout", "-q", "-b", "topic", "HEAD~1")
+    commit(repo, "feat: topic")
+    index.update(Git(str(repo)))
+
+    git(repo, "rebase", "-q", "main")
+
+    # The rebased commit, and the one of `main` it now sits on
+    assert index.update(Git(str(repo))) == 2
+    assert messages(index).count("feat: topic") == 1
+    assert messages(index)[:2] == ["feat: topic", "feat(pkg3): update pkg3 modules #3"]
+
+
+def test_switching_to_an_orphan_branch_replaces_the_history(
+    repo: Path, index: HistoryIndex
+):
+    index.update(Git(str(repo)))
+
+    git(repo, "checkout", "-q", "--orphan", "other")
+    commit(repo, "chore: start over")
+
+    assert index.update(Git(str(repo))) == 1
+    assert messages(index) == ["chore: start over"]
+
+
+def test_moves_beyond_a_batch_only_index_the_most_recent_commits(
+    repo: Path, index: HistoryIndex, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(history, "INDEX_BATCH", 2)
+    index.update(Git(str(repo)))
+    assert len(messages(index)) == 2
+
+    git(repo, "checkout", "-q", "--orphan", "other")
+    for number in range(3):
+        commit(repo, f"chore: orphan #{number}")
+
+    # Neither side of the move is read in full, and nothing is dropped
+    assert index.update(Git(str(repo))) == 2
+    assert messages(index) == [
+        "chore: orphan #2",
+        "chore: orphan #1",
+        "feat(pkg3): update pkg3 modules #3",
+        "feat(pkg2): update pkg2 modules #2",
+    ]
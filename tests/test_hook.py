@@ -0,0 +1,231 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+import pytest
+from click.testing import Result
+from langchain_core.messages import BaseMessage
+from git_aicommit import hook
+from git_aicommit.hook import (
+    SCISSORS,
+    fill_message_file,
+    pending,
+    should_fill,
+    wait_pending,
+)
+from git_aicommit.provider import PROVIDERS
+from tests.fakes import FakeChatModel, FakeProvider
+from tests.repos import git, make_repo
+
+COMMENTS = "\n# Please enter the commit message for your changes.\n"
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    return make_repo(tmp_path / "repo", files=3, commits=2)
+
+
+@pytest.fixture
+def message_file(repo: Path) -> Path:
+    path = repo / ".git" / "COMMIT_EDITMSG"
+    path.write_text(COMMENTS)
+    return path
+
+
+@pytest.fixture
+def run_watch(
+    run_cli: Callable[..., Result], monkeypatch: pytest.MonkeyPatch
+) -> Callable[[Path], Result]:
+    """Run `watch` for a single settled index, generating on this thread."""
+    monkeypatch.setattr(
+        hook, "watch_index", lambda index_path, on_settled, **kwargs: on_settled()
+    )
+    return lambda repo: run_cli(repo, "watch")
+
+
+@pytest.mark.parametrize("source", [None, "", "template"])
+def test_fills_commits_without_a_message(source: str | None):
+    assert should_fill(source)
+
+
+@pytest.mark.parametrize("source", ["message", "merge", "squash", "commit"])
+def test_leaves_given_messages_alone(source: str):
+    assert not should_fill(source)
+
+
+def test_puts_the_message_above_the_comments(message_file: Path):
+    assert fill_message_file(message_file, "feat: add tests")
+
+    assert message_file.read_text() == "feat: add tests\n" + COMMENTS
+
+
+def test_ignores_the_diff_of_a_verbose_commit(message_file: Path):
+    message_file.write_text(f"{COMMENTS}{SCISSORS}\ndiff --git a/x b/x\n+x\n")
+
+    assert fill_message_file(message_file, "feat: add tests")
+
+    assert message_file.read_text().startswith("feat: add tests\n")
+
+
+def test_keeps_a_message_already_in_the_file(message_file: Path):
+    message_file.write_text("fix: from a template\n" + COMMENTS)
+
+    assert not fill_message_file(message_file, "feat: add tests")
+
+    assert message_file.read_text() == "fix: from a template\n" + COMMENTS
+
+
+def test_waits_until_the_message_is_no_longer_pending(tmp_path: Path):
+    released = threading.Event()
+
+    def generate() -> None:
+        with pending(tmp_path, "tree"):
+            released.wait()
+
+    thread = threading.Thread(target=generate)
+    thread.start()
+    while not (tmp_path / "tree").exists():
+        time.sleep(0.005)
+    threading.Timer(0.3, released.set).start()
+
+    wait_pending(tmp_path, "tree")
+
+    assert released.is_set()
+    thread.join()
+
+
+def exited_pid() -> int:
+    """The process id of a process that has exited."""
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+def test_does_not_wait_for_the_marker_of_an_exited_process(tmp_path: Path):
+    (tmp_path / "tree").write_text(str(exited_pid()))
+
+    start = time.monotonic()
+    wait_pending(tmp_path, "tree")
+
+    assert time.monotonic() - start < hook.POLL_INTERVAL_SECONDS
+
+
+def test_does_not_wait_for_a_stale_marker(tmp_path: Path):
+    marker = tmp_path / "tree"
+    marker.write_text(str(os.getpid()))
+    old = time.time() - hook.MAX_PENDING_AGE_SECONDS - 1
+    os.utime(marker, (old, old))
+
+    start = time.monotonic()
+    wait_pending(tmp_path, "tree")
+
+    assert time.monotonic() - start < hook.POLL_INTERVAL_SECONDS
+
+
+def test_hook_generates_itself_when_the_watcher_is_slow(
+    repo: Path,
+    message_file: Path,
+    fake_model: FakeChatModel,
+    run_cli,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(hook, "MAX_PENDING_WAIT_SECONDS", 0.3)
+    tree = git(repo, "write-tree").strip()
+    pending_directory = repo / ".git" / "aicommit" / "pending"
+
+    with pending(pending_directory, tree):
+        start = time.monotonic()
+        result = run_cli(repo, "hook", "run", str(message_file))
+
+    assert result.exit_code == 0
+    assert message_file.read_text().startswith("feat: update fixtures\n")
+    assert time.monotonic() - start < 2
+
+
+def test_hook_fills_the_message_file(
+    repo: Path, message_file: Path, fake_model: FakeChatModel, run_cli
+):
+    result = run_cli(repo, "hook", "run", str(message_file))
+
+    assert result.exit_code == 0
+    assert message_file.read_text() == "feat: update fixtures\n" + COMMENTS
+    assert len(fake_model.requests) == 1
+
+
+@pytest.mark.parametrize("source", ["message", "merge", "squash", "commit"])
+def test_hook_skips_commits_with_a_message(
+    repo: Path, message_file: Path, fake_model: FakeChatModel, run_cli, source: str
+):
+    result = run_cli(repo, "hook", "run", str(message_file), source, "HEAD")
+
+    assert result.exit_code == 0
+    assert message_file.read_text() == COMMENTS
+    assert fake_model.requests == []
+
+
+def test_hook_never_fails_the_commit(
+    repo: Path, message_file: Path, fake_model: FakeChatModel, run_cli
+):
+    fake_model.errors = [ConnectionError("connection refused")]
+
+    result = run_cli(repo, "hook", "run", str(message_file))
+
+    assert result.exit_code == 0
+    assert "git-aicommit: connection refused" in result.output
+    assert message_file.read_text() == COMMENTS
+
+
+def test_hook_never_fails_the_commit_on_ctrl_c(
+    repo: Path, message_file: Path, run_cli, monkeypatch: pytest.MonkeyPatch
+):
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr("git_aicommit.cli.hook.collect_changes", interrupt)
+
+    result = run_cli(repo, "hook", "run", str(message_file))
+
+    assert result.exit_code == 0
+    assert "git-aicommit: Interrupted." in result.output
+    assert message_file.read_text() == COMMENTS
+
+
+def test_hook_uses_the_message_of_the_watcher(
+    repo: Path, message_file: Path, fake_model: FakeChatModel, run_cli, run_watch
+):
+    fake_model.responses = ["feat: from the watcher", "feat: from the hook"]
+
+    assert "ready in" in run_watch(repo).output
+    result = run_cli(repo, "hook", "run", str(message_file))
+
+    assert result.exit_code == 0
+    assert message_file.read_text().startswith("feat: from the watcher\n")
+    assert len(fake_model.requests) == 1
+
+
+class RestagingChatModel(FakeChatModel):
+    """Stages another change while the first message is generated."""
+
+    repo: Path
+
+    def reply(self, messages: list[BaseMessage], index: int) -> str:
+        if index == 0:
+            (self.repo / "pkg0" / "late.py").write_text("LATE = True\n")
+            git(self.repo, "add", "-A")
+        return f"feat: attempt #{index}"
+
+
+def test_watcher_discards_messages_for_changes_staged_meanwhile(
+    repo: Path, message_file: Path, run_cli, run_watch, monkeypatch: pytest.MonkeyPatch
+):
+    model = RestagingChatModel(repo=repo)
+    monkeypatch.setitem(PROVIDERS, "openai", lambda config: FakeProvider(model))
+
+    assert "discarded" in run_watch(repo).output
+    run_cli(repo, "hook", "run", str(message_file))
+
+    assert message_file.read_text().startswith("feat: attempt #1\n")
+    assert len(model.requests) == 2
@@ -0,0 +1,102 @@
+import re
+from langchain_core.messages import BaseMessage
+from git_aicommit.ai import AI
+from git_aicommit.config import Config
+from git_aicommit.diff import estimate_tokens, group_files, parse_diff
+from git_aicommit.pipeline import PreparedChanges, generate_message
+from tests.fakes import FakeChatModel
+
+
+class EchoModel(FakeChatModel):
+    """Summarizes each diff by its file name; later diffs answer sooner."""
+
+    def reply(self, messages: list[BaseMessage], index: int) -> str:
+        match = re.search(r"b/(\S+)", messages[-1].text)
+        return f"changed {match.group(1)}" if match else "feat: combine summaries"
+
+    def delay(self, messages: list[BaseMessage]) -> float:
+        match = re.search(r"file_(\d+)", messages[-1].text)
+        return self.latency * (10 - int(match.group(1))) / 10 if match else 0.0
+
+
+def file_diff(index: int, lines: int = 20) -> list[str]:
+    return [
+        f"diff --git a/file_{index}.py b/file_{index}.py",
+        f"--- a/file_{index}.py",
+        f"+++ b/file_{index}.py",
+        f"@@ -1,{lines} +1,{lines} @@",
+        *(f"+value_{index}_{line} = {line}" for line in range(lines)),
+    ]
+
+
+def test_summaries_keep_diff_order():
+    model = EchoModel(latency=0.05)
+    diffs = [f"diff --git a/file_{i}.py b/file_{i}.py\n+x" for i in range(6)]
+
+    summaries = AI(model).summarize_diffs(diffs, max_concurrency=6)
+
+    assert summaries == [f"changed file_{i}.py" for i in range(6)]
+
+
+def test_summaries_respect_max_concurrency():
+    model = EchoModel(latency=0.05)
+    diffs = [f"diff --git a/file_{i}.py b/file_{i}.py\n+x" for i in range(8)]
+
+    AI(model).summarize_diffs(diffs, max_concurrency=3)
+
+    assert len(model.requests) == 8
+    assert model.peak_active == 3
+
+
+def test_generate_message_reduces_summaries_in_order():
+    model = EchoModel(latency=0.02)
+    groups = [f"diff --git a/file_{i}.py b/file_{i}.py\n+x" for i in range(4)]
+
+    message = generate_message(
+        AI(model),
+        PreparedChanges(diff=None, groups=groups, context=None),
+        recent_logs=["feat: earlier change"],
+        user_instructions=None,
+        language=None,
+        max_concurrency=2,
+    )
+
+    assert message == "feat: combine summaries"
+    assert len(model.requests) == 5
+    reduce_prompt = model.requests[-1][-1].text
+    positions = [reduce_prompt.index(f"changed file_{i}.py") for i in range(4)]
+    assert positions == sorted(positions)
+
+
+def test_group_files_fit_budget_in_diff_order():
+    lines = [line for index in range(10) for line in file_diff(index)]
+    files = parse_diff(lines)
+
+    groups = group_files(files, max_tokens=400)
+
+    assert len(groups) > 1
+    assert all(estimate_tokens(group) <= 400 for group in groups)
+    names = re.findall(r"diff --git a/(\S+)", "\n".join(groups))
+    assert names == [f"file_{index}.py" for index in range(10)]
+
+
+def test_group_files_truncates_oversized_file():
+    files = parse_diff(file_diff(0, lines=2000) + file_diff(1))
+
+    groups = group_files(files, max_tokens=500)
+
+    assert all(estimate_tokens(group) <= 500 for group in groups)
+    assert "file_1.py" in groups[-1]
+
+
+def test_map_reduce_config_keeps_provider_concurrency():
+    config = Config(
+        **{
+            "provider": "openai",
+            "openai": {"model": "fake", "api-key": "fake", "concurrency": 2},
+            "map-reduce": True,
+        }
+    )
+
+    assert config.map_reduce
+    assert config.provider_config.concurrency == 2
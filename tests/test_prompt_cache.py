@@ -0,0 +1,76 @@
+from typing import Any
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from git_aicommit.ai import AI
+from git_aicommit.provider import FallbackProvider
+from tests.fakes import FakeChatModel, FakeProvider
+
+
+def generate(ai: AI, history: list, stream: bool = False) -> str:
+    return ai.generate_commit_message(
+        recent_logs=["feat: earlier change"],
+        diff="diff --git a/a.py b/a.py\n+a = 1",
+        history=history,
+        on_token=(lambda message: None) if stream else None,
+    )
+
+
+def blocks(message: BaseMessage) -> list[dict[str, Any]]:
+    assert isinstance(message.content, list)
+    return [block for block in message.content if isinstance(block, dict)]
+
+
+def test_no_marker_sends_plain_text():
+    model = FakeChatModel()
+
+    generate(AI(model), [])
+
+    [_, human] = model.requests[0]
+    assert isinstance(human.content, str)
+    assert "<recent-logs>" in human.content and "<diff>" in human.content
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_cache_control_marks_last_block(stream):
+    model = FakeChatModel()
+
+    generate(AI(model, prompt_cache="cache-control"), [], stream=stream)
+
+    [_, human] = model.requests[0]
+    logs, changes = blocks(human)
+    assert logs["text"].startswith("<recent-logs>") and "cache_control" not in logs
+    assert changes["text"].startswith("<diff>")
+    assert changes["cache_control"] == {"type": "ephemeral"}
+
+
+def test_cache_point_appends_block():
+    model = FakeChatModel()
+
+    generate(AI(model, prompt_cache="cache-point"), [])
+
+    [_, human] = model.requests[0]
+    assert [block.get("type") for block in blocks(human)] == ["text", "text", None]
+    assert blocks(human)[-1] == {"cachePoint": {"type": "default"}}
+
+
+def test_prefix_is_stable_across_regenerate_rounds():
+    model = FakeChatModel(responses=["feat: first", "feat: second"])
+    ai = AI(model, prompt_cache="cache-control")
+
+    first = generate(ai, [])
+    generate(ai, [AIMessage(first), HumanMessage("<feedback>Be shorter</feedback>")])
+
+    first_request, second_request = model.requests
+    assert len(second_request) == len(first_request) + 2
+    assert second_request[:2] == first_request
+
+
+def test_fallback_keeps_marker_only_when_shared():
+    anthropic = FakeProvider(FakeChatModel(), "anthropic", prompt_cache="cache-control")
+    bedrock = FakeProvider(FakeChatModel(), "aws-bedrock", prompt_cache="cache-point")
+
+    shared = FallbackProvider([anthropic, anthropic], [None, None], None)
+    mixed = FallbackProvider([anthropic, bedrock], [None, None], None)
+
+    assert shared.prompt_cache == "cache-control"
+    assert mixed.prompt_cache is None
@@ -0,0 +1,179 @@
+import asyncio
+import subprocess
+import sys
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Optional
+import pytest
+from git_aicommit import ratelimit
+from git_aicommit.ai import AI
+from git_aicommit.ratelimit import (
+    MAX_RETRY_AFTER_SECONDS,
+    SharedRateLimiter,
+    call_with_retry,
+    retry_after,
+)
+from tests.fakes import FakeChatModel
+
+
+class Response:
+    def __init__(self, status_code: int, headers: Optional[dict[str, str]] = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class APIError(Exception):
+    """Shaped like the errors of the openai and anthropic SDKs."""
+
+    def __init__(
+        self,
+        status_code: int,
+        headers: Optional[dict[str, str]] = None,
+        code: Optional[str] = None,
+    ):
+        super().__init__(f"Error code: {status_code}")
+        self.response = Response(status_code, headers)
+        self.status_code = status_code
+        self.code = code
+
+
+class ClientError(Exception):
+    """Shaped like botocore's."""
+
+    def __init__(self, status_code: int, headers: dict[str, str]):
+        super().__init__("ThrottlingException")
+        self.response: dict[str, Any] = {
+            "ResponseMetadata": {
+                "HTTPStatusCode": status_code,
+                "HTTPHeaders": headers,
+            }
+        }
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (APIError(429), 0.0),
+        (APIError(503), 0.0),
+        (APIError(529), 0.0),
+        (APIError(429, {"retry-after": "7"}), 7.0),
+        (APIError(429, {"retry-after-ms": "250"}), 0.25),
+        (APIError(429, {"retry-after": "3600"}), MAX_RETRY_AFTER_SECONDS),
+        (APIError(429, {"retry-after": "soon"}), 0.0),
+        (ClientError(429, {"retry-after": "2"}), 2.0),
+        (ResourceExhausted("quota"), 0.0),
+        (APIError(400), None),
+        (APIError(500), None),
+        (APIError(429, code="insufficient_quota"), None),
+        (ValueError("bad"), None),
+    ],
+)
+def test_retry_after(error, expected):
+    assert retry_after(error) == expected
+
+
+def test_retry_after_http_date():
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=20))
+
+    delay = retry_after(APIError(429, {"retry-after": date}))
+
+    assert delay is not None and 15 < delay <= 20
+
+
+@pytest.fixture
+def sleeps(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    delays: list[float] = []
+
+    async def wait(seconds: float) -> None:
+        delays.append(seconds)
+
+    monkeypatch.setattr(ratelimit, "sleep", delays.append)
+    monkeypatch.setattr(ratelimit, "_wait", wait)
+    return delays
+
+
+def test_call_with_retry_honors_retry_after(sleeps):
+    errors = [APIError(429, {"retry-after": "5"}), APIError(503)]
+
+    async def call() -> str:
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert asyncio.run(call_with_retry(call, max_retries=2)) == "ok"
+    assert len(sleeps) == 2
+    # Jittered by up to 10%, then the second backoff step without a header
+    assert 5 <= sleeps[0] <= 5.5
+    assert 1 <= sleeps[1] <= 2
+
+
+def test_call_with_retry_gives_up(sleeps):
+    model = FakeChatModel(errors=[APIError(429), APIError(429)])
+
+    with pytest.raises(APIError):
+        AI(model, max_retries=1).generate_commit_message([], "+a = 1", [])
+    assert len(model.requests) == 2 and len(sleeps) == 1
+
+
+def test_exhausted_quota_is_not_retried(sleeps):
+    model = FakeChatModel(errors=[APIError(429, code="insufficient_quota")])
+
+    with pytest.raises(APIError):
+        AI(model, max_retries=3).generate_commit_message([], "+a = 1", [])
+    assert len(model.requests) == 1 and not sleeps
+
+
+def test_retry_pauses_shared_limiter(sleeps, tmp_path: Path):
+    limiter = SharedRateLimiter(tmp_path / "bucket.json", requests_per_second=100)
+    other = SharedRateLimiter(tmp_path / "bucket.json", requests_per_second=100)
+    model = FakeChatModel(errors=[APIError(429, {"retry-after": "30"})])
+    model.rate_limiter = limiter
+
+    AI(model, max_retries=1).generate_commit_message([], "+a = 1", [])
+
+    assert not other.acquire(blocking=False)
+
+
+def test_shared_limiter_is_shared_between_instances(tmp_path: Path):
+    path = tmp_path / "bucket.json"
+    first = SharedRateLimiter(path, requests_per_second=1)
+    second = SharedRateLimiter(path, requests_per_second=1)
+
+    assert first.acquire(blocking=False)
+    assert not second.acquire(blocking=False)
+    wait = second._reserve(blocking=True)
+    assert wait is not None and 0.9 < wait <= 1
+
+
+def test_shared_limiter_is_shared_between_processes(tmp_path: Path):
+    path = tmp_path / "bucket.json"
+    assert SharedRateLimiter(path, requests_per_second=1).acquire(blocking=False)
+
+    acquired = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from pathlib import Path; "
+            "from git_aicommit.ratelimit import SharedRateLimiter; "
+            "print(SharedRateLimiter(Path(sys.argv[1]), 1).acquire(blocking=False))",
+            str(path),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+    assert acquired == "False"
+
+
+def test_shared_limiter_falls_back_to_process(tmp_path: Path):
+    (tmp_path / "file").write_text("")
+    limiter = SharedRateLimiter(tmp_path / "file" / "bucket.json", 1000)
+
+    assert limiter.acquire()
+    assert limiter._fallback.available_tokens < 1
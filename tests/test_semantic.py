@@ -0,0 +1,272 @@
+import pytest
+from git_aicommit.diff import FileDiff, parse_diff
+from git_aicommit.semantic import (
+    indentation_matters,
+    simplify_files,
+    symbol_name,
+    symbol_patterns,
+)
+
+
+def file_diff(path: str, *hunks: list[str]) -> FileDiff:
+    lines = [
+        f"diff --git a/{path} b/{path}",
+        "index 1234567..89abcde 100644",
+        f"--- a/{path}",
+        f"+++ b/{path}",
+    ]
+    for hunk in hunks:
+        lines += hunk
+    [file] = parse_diff(lines)
+    return file
+
+
+def simplify(*files: FileDiff) -> list[FileDiff]:
+    return simplify_files(list(files))
+
+
+def test_formatting_only_hunk_is_omitted():
+    file = file_diff(
+        "src/main.c",
+        [
+            "@@ -1,3 +1,3 @@",
+            " int main(void) {",
+            "-  return  0;",
+            "+    return 0;",
+            " }",
+        ],
+    )
+
+    [simplified] = simplify(file)
+
+    assert simplified.header == [
+        "# src/main.c: whitespace or formatting changes only, +1 -1 (diff omitted)"
+    ]
+    assert not simplified.hunks
+
+
+def test_reflowed_call_is_formatting_only():
+    file = file_diff(
+        "src/app.js",
+        [
+            "@@ -1,2 +1,1 @@",
+            "-render(items,",
+            "-       options);",
+            "+render(items, options);",
+        ],
+    )
+
+    [simplified] = simplify(file)
+
+    assert not simplified.hunks
+
+
+def test_whitespace_inside_strings_is_a_change():
+    file = file_diff(
+        "src/app.js", ["@@ -1 +1 @@", '-const sep = ", ";', '+const sep = ",";']
+    )
+
+    [simplified] = simplify(file)
+
+    assert simplified.hunks == [["@@", '-const sep = ", ";', '+const sep = ",";']]
+
+
+def test_reindented_lines_become_context():
+    file = file_diff(
+        "src/lock.c",
+        [
+            "@@ -1,4 +1,4 @@ void release(void)",
+            " {",
+            "-  unlock(m);",
+            "-  count--;",
+            "+    unlock(m);",
+            "+    count -= 1;",
+            " }",
+        ],
+    )
+
+    [simplified] = simplify(file)
+
+    assert simplified.hunks == [
+        ["@@ release", "     unlock(m);", "-  count--;", "+    count -= 1;", " }"]
+    ]
+
+
+def test_swapped_lines_stay_changes():
+    hunk = [
+        "@@ -1,4 +1,4 @@",
+        " {",
+        "-    unlock(m);",
+        "-    free(p);",
+        "+    free(p);",
+        "+    unlock(m);",
+        " }",
+    ]
+
+    [simplified] = simplify(file_diff("src/lock.c", hunk))
+
+    assert simplified.hunks == [["@@", *hunk[1:]]]
+
+
+def test_line_moved_within_hunk_is_a_change():
+    hunk = [
+        "@@ -1,4 +1,4 @@",
+        "-    close(fd);",
+        "     flush(fd);",
+        "     sync();",
+        "+    close(fd);",
+    ]
+
+    [simplified] = simplify(file_diff("src/io.c", hunk))
+
+    assert simplified.hunks == [["@@", *hunk[1:]]]
+
+
+@pytest.mark.parametrize("path", ["tool.py", "ci.yml", "Makefile", "docs/guide.md"])
+def test_indentation_changes_count_where_it_matters(path):
+    hunk = ["@@ -1,2 +1,2 @@", " if ready:", "-    start()", "+        start()"]
+
+    [simplified] = simplify(file_diff(path, hunk))
+
+    assert indentation_matters(path)
+    assert simplified.hunks == [["@@", *hunk[1:]]]
+
+
+MOVED_BLOCK = [
+    "def parse_header(line):",
+    "    if ':' not in line:",
+    "        raise ValueError(f'malformed header: {line!r}')",
+    "    name, value = line.split(':', 1)",
+    "    name = name.strip().lower()",
+    "    if not name:",
+    "        raise ValueError('empty header name')",
+    "    return name, value.strip()",
+]
+
+
+def test_moved_block_is_replaced_by_a_note():
+    source = file_diff(
+        "src/http/client.py",
+        [
+            "@@ -10,10 +10,2 @@",
+            " import re",
+            *("-" + line for line in MOVED_BLOCK),
+            " ",
+        ],
+    )
+    target = file_diff(
+        "src/http/headers.py",
+        ["@@ -1,1 +1,9 @@", " import re", *("+" + line for line in MOVED_BLOCK)],
+    )
+
+    simplified_source, simplified_target = simplify(source, target)
+
+    assert simplified_source.hunks == [
+        ["@@", " import re", "# 8 lines moved to src/http/headers.py", " "]
+    ]
+    assert simplified_target.hunks == [
+        ["@@", " import re", "# 8 lines moved from src/http/client.py"]
+    ]
+
+
+def test_short_repeated_block_is_kept():
+    # Rewriting one function while adding another that repeats a few of its
+    # old lines is new code, not a move
+    block = MOVED_BLOCK[3:6]
+    source = file_diff(
+        "src/http/client.py",
+        [
+            "@@ -10,5 +10,3 @@",
+            " import re",
+            *("-" + line for line in block),
+            "+    return line.partition(':')[::2]",
+            " ",
+        ],
+    )
+    target = file_diff(
+        "src/http/headers.py",
+        [
+            "@@ -1,1 +1,5 @@",
+            " import re",
+            "+def header_name(line):",
+            *("+" + line for line in block),
+        ],
+    )
+
+    simplified_source, simplified_target = simplify(source, target)
+
+    assert simplified_source.hunks == [["@@", *source.hunks[0][1:]]]
+    assert simplified_target.hunks == [["@@", *target.hunks[0][1:]]]
+
+
+def test_symbols_are_listed():
+    file = file_diff(
+        "src/shapes.py",
+        [
+            "@@ -1,9 +1,9 @@",
+            " class Circle:",
+            "     def area(self):",
+            "-        return 3.14 * self.r ** 2",
+            "+        return math.pi * self.r ** 2",
+            " ",
+            "-def old_helper():",
+            "-    pass",
+            "+def new_helper():",
+            "+    pass",
+        ],
+    )
+
+    [simplified] = simplify(file)
+
+    assert simplified.header[-1] == (
+        "# symbols: area, old_helper (removed), new_helper (added)"
+    )
+
+
+@pytest.mark.parametrize(
+    ("path", "line", "name"),
+    [
+        ("a.py", "    async def fetch(self, url):", "fetch"),
+        ("a.py", "class Parser(Base):", "Parser"),
+        ("a.ts", "export const load = async (id: string) => {", "load"),
+        ("a.js", "function* walk(tree) {", "walk"),
+        ("a.go", "func (s *Server) Serve(l net.Listener) error {", "Serve"),
+        ("a.rs", "pub fn parse(input: &str) -> Result<Ast> {", "parse"),
+        ("a.c", "static int read_config(const char *path)", "read_config"),
+        ("a.java", "    public static void main(String[] args) {", "main"),
+        ("a.rb", "  def self.build!", "build!"),
+        ("a.py", "    return parse(value)", None),
+        ("a.c", "    if (ready(x))", None),
+        ("a.txt", "def looks_like_python():", None),
+    ],
+)
+def test_symbol_name(path, line, name):
+    assert symbol_name(symbol_patterns(path), line) == name
+
+
+def test_context_is_cut_to_one_line():
+    file = file_diff(
+        "src/config.js",
+        [
+            "@@ -1,7 +1,7 @@ function load(path) {",
+            "   const a = 1;",
+            "   const b = 2;",
+            "   const c = 3;",
+            "-  return read(path);",
+            "+  return readFile(path);",
+            "   // done",
+            " }",
+        ],
+    )
+
+    [simplified] = simplify(file)
+
+    assert simplified.hunks == [
+        [
+            "@@ load",
+            "   const c = 3;",
+            "-  return read(path);",
+            "+  return readFile(path);",
+            "   // done",
+        ]
+    ]